@@ -2,26 +2,99 @@
 # >> IMPORTS
 # =============================================================================
 # Python
-import cPickle as pickle
+import os
 
 # discover_win
 from database import Database
 
 
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def analyse_binary(file_path, backend=None):
+    """Analyse a binary and save its database.
+
+    :param str file_path: Path to save the database at.
+    :param backends.Backend backend: The backend that provides the binary.
+        Defaults to the binary that is currently opened in IDA.
+    :rtype: Database
+    """
+    database = Database(backend)
+    print 'Strings:', len(database.strings)
+    print 'Functions:', len(database.functions)
+    database.save(file_path)
+    return database
+
+
+def update_binary(file_path, backend=None):
+    """Update a previously saved database after the binary changed.
+
+    :param str file_path: Path of the saved database. The updated database
+        is saved at the same path.
+    :param backends.Backend backend: The backend that provides the binary.
+        Defaults to the binary that is currently opened in IDA.
+    :return: A tuple with the updated database and its
+        :class:`database.DatabaseChanges`.
+    :rtype: tuple
+    """
+    database = Database.load(file_path)
+    changes = database.update(backend)
+    print 'Strings:', len(database.strings)
+    print 'Functions:', len(database.functions)
+    if changes:
+        database.save(file_path)
+
+    return database, changes
+
+
+def split_stale_results(results, linux_changes=None, windows_changes=None):
+    """Split discovered functions into still valid and stale ones.
+
+    A result is stale if its Windows function or its Linux symbol has been
+    affected by an update of the databases.
+
+    :param iterable results: Tuples that start with the ea of a Windows
+        function and its Linux symbol, e.g. the records of a discovered
+        database. They are returned unchanged.
+    :param database.DatabaseChanges linux_changes: Changes of the Linux
+        database or None if it didn't change.
+    :param database.DatabaseChanges windows_changes: Changes of the Windows
+        database or None if it didn't change.
+    :return: A tuple with a list of the valid and a list of the stale
+        results.
+    :rtype: tuple
+    """
+    stale_symbols = linux_changes.stale_symbols if linux_changes else ()
+    stale_eas = windows_changes.stale_eas if windows_changes else ()
+    valid = []
+    stale = []
+    for result in results:
+        ea, symbol = result[:2]
+        if ea in stale_eas or symbol in stale_symbols:
+            stale.append(result)
+        else:
+            valid.append(result)
+
+    return valid, stale
+
+
 # =============================================================================
 # >> MAIN
 # =============================================================================
 def main():
-    """Ask for a file, analyse the currently opened database and save it."""
+    """Ask for a file, analyse the currently opened database and save it.
+
+    If the file already exists, it is updated incrementally.
+    """
     file_path = AskFile(1, '*.db', 'Select a destination for the database')
     if file_path is None:
         print 'Script has been cancelled.'
         return
 
-    database = Database()
-    print 'Strings:', len(database.strings)
-    print 'Functions:', len(database.functions)
-    database.save(file_path)
+    if os.path.isfile(file_path):
+        update_binary(file_path)
+    else:
+        analyse_binary(file_path)
 
 
 if __name__ == '__main__':
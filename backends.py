@@ -0,0 +1,322 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import json
+import marshal
+from abc import ABCMeta
+from abc import abstractmethod
+from contextlib import contextmanager
+from hashlib import sha1
+
+# discover_win
+from extraction import MIN_STRING_LENGTH
+from extraction import assemble
+from extraction import extract_binary
+from extraction import extract_summary
+from extraction import find_callers
+
+# IDA
+try:
+    import idaapi
+
+    from idc import Batch
+    from idc import GetFunctionName
+    from idc import MakeName
+except ImportError:
+    # Already reported by the extraction module
+    pass
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Encoding of the strings and names in stand-in JSON files. It maps every
+#: byte to a single code point.
+JSON_ENCODING = 'latin-1'
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class Backend(object):
+    """Everything the pipeline needs from a disassembler."""
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def extract(self, eas=None):
+        """Extract the strings and functions of the binary.
+
+        :param iterable eas: If given, only these functions are extracted.
+        :return: See :func:`extraction.extract_binary`.
+        :rtype: tuple
+        """
+
+    @abstractmethod
+    def extract_summary(self):
+        """Extract the strings and the checksums of all functions. Only the
+        strings that are referenced by a function are required.
+
+        :return: See :func:`extraction.extract_summary`.
+        :rtype: tuple
+        """
+
+    @abstractmethod
+    def find_callers(self, eas):
+        """Return all functions that call one of the given functions.
+
+        :param iterable eas: Start addresses of the called functions.
+        :rtype: set
+        """
+
+    @abstractmethod
+    def get_function_name(self, ea):
+        """Return the current name of a function.
+
+        :param int ea: Start address of the function.
+        :rtype: str
+        """
+
+    @abstractmethod
+    def set_function_name(self, ea, name):
+        """Rename a function.
+
+        :param int ea: Start address of the function.
+        :param str name: The new name of the function.
+        """
+
+    @contextmanager
+    def suspend_updates(self):
+        """Return a context manager that suspends all updates of the
+        disassembler while many functions are renamed.
+
+        The default implementation doesn't suspend anything.
+        """
+        yield
+
+
+class IdaBackend(Backend):
+    """Accesses the binary that is currently opened in IDA."""
+
+    def extract(self, eas=None):
+        """.. seealso:: :meth:`Backend.extract`"""
+        return extract_binary(eas)
+
+    def extract_summary(self):
+        """.. seealso:: :meth:`Backend.extract_summary`"""
+        return extract_summary()
+
+    def find_callers(self, eas):
+        """.. seealso:: :meth:`Backend.find_callers`"""
+        return find_callers(eas)
+
+    def get_function_name(self, ea):
+        """.. seealso:: :meth:`Backend.get_function_name`"""
+        return GetFunctionName(ea)
+
+    def set_function_name(self, ea, name):
+        """.. seealso:: :meth:`Backend.set_function_name`"""
+        MakeName(ea, name)
+
+    @contextmanager
+    def suspend_updates(self):
+        """.. seealso:: :meth:`Backend.suspend_updates`
+
+        The auto-analysis is disabled and the batch mode suppresses all
+        dialogs. The views are refreshed once at the end.
+        """
+        auto_enabled = idaapi.enable_auto(False)
+        batch = Batch(1)
+        try:
+            yield
+        finally:
+            Batch(batch)
+            idaapi.enable_auto(auto_enabled)
+            idaapi.refresh_lists()
+            idaapi.refresh_idaview_anyway()
+
+
+class StandInBackend(Backend):
+    """A pure Python stand-in for IDA.
+
+    It is fed with an already known call graph, so the pipeline can run on
+    build servers, in benchmarks and in tests without IDA.
+
+    Strings and names are stored with the :data:`JSON_ENCODING`, so
+    arbitrary bytes survive the round trip. The JSON format looks like this
+    (eas are integers)::
+
+        {
+            "strings": {"<string ea>": "<str>", ...},
+            "functions": [
+                {
+                    "ea": <function ea>,
+                    "name": "<symbol>",
+                    "demangled_name": "<demangled name>",
+                    "strings": [<string ea>, ...],
+                    "calls": [<function ea>, ...],
+                    "code": "<normalized code>"
+                },
+                ...
+            ]
+        }
+
+    The code of a function is optional. It is only used to create the
+    fingerprints of the functions.
+    """
+
+    def __init__(self, strings, functions):
+        """Initialize the object.
+
+        :param dict strings: {<string ea>: <str>, ...}
+        :param iterable functions: Tuples with the ea, symbol, demangled name,
+            string eas, called function eas and optionally the normalized
+            code of every function.
+        """
+        #: {<string ea>: <str>, ...}
+        self.strings = dict(strings)
+
+        #: {<function ea>: <symbol>, ...}
+        self.names = {}
+
+        #: {<function ea>: (<demangled name>, <string eas>, <called eas>,
+        #:      <normalized code or None>)}
+        self.functions = {}
+
+        for function in functions:
+            ea, name, demangled_name, string_eas, calls = function[:5]
+            code = function[5] if len(function) > 5 else None
+            self.names[ea] = name
+            self.functions[ea] = (
+                demangled_name, tuple(string_eas), tuple(calls), code)
+
+    @classmethod
+    def from_json(cls, file_path):
+        """Create a backend from a JSON file.
+
+        :param str file_path: Path of the JSON file.
+        :rtype: StandInBackend
+        """
+        with open(file_path, 'rb') as f:
+            data = json.load(f)
+
+        return cls(
+            ((int(ea), _to_bytes(string))
+                for ea, string in data['strings'].iteritems()),
+            ((function['ea'], _to_bytes(function['name']),
+                _to_bytes(function.get('demangled_name') or function['name']),
+                function.get('strings', ()), function.get('calls', ()),
+                function.get('code') and _to_bytes(function['code']))
+                for function in data['functions']))
+
+    def to_json(self, file_path):
+        """Save the backend including the current function names to a JSON
+        file.
+
+        :param str file_path: Path of the JSON file.
+        """
+        functions = []
+        for ea, (demangled_name, string_eas, calls, code) in sorted(
+                self.functions.iteritems()):
+            function = {
+                'ea': ea,
+                'name': self.names[ea],
+                'demangled_name': demangled_name,
+                'strings': list(string_eas),
+                'calls': list(calls),
+            }
+            if code is not None:
+                function['code'] = code
+
+            functions.append(function)
+
+        data = {
+            'strings': dict(
+                (str(ea), string) for ea, string in self.strings.iteritems()),
+            'functions': functions,
+        }
+        with open(file_path, 'wb') as f:
+            json.dump(data, f, encoding=JSON_ENCODING)
+
+    def extract(self, eas=None):
+        """.. seealso:: :meth:`Backend.extract`
+
+        The same rules as for IDA apply: ``_ZThn`` thunks are ignored, calls
+        must target the start of another function and only strings that are
+        referenced by a function and have at least
+        :data:`extraction.MIN_STRING_LENGTH` characters are kept.
+        """
+        strings = self.strings
+        symbols = self._get_symbols()
+        if eas is not None:
+            eas = set(eas)
+
+        demangled_names = {}
+        string_eas = {}
+        xref_from_eas = {}
+        code_hashes = {}
+        for ea in symbols:
+            if eas is not None and ea not in eas:
+                continue
+
+            demangled_name, function_strings, calls, code = self.functions[ea]
+            demangled_names[ea] = demangled_name
+            if code is not None:
+                code_hashes[ea] = sha1(code).digest()
+
+            string_eas[ea] = set(
+                string_ea for string_ea in function_strings
+                if string_ea in strings and
+                len(strings[string_ea]) >= MIN_STRING_LENGTH)
+            xref_from_eas[ea] = set(
+                call for call in calls if call in symbols and call != ea)
+
+        checksums = dict(
+            (ea, self._get_checksum(ea)) for ea in demangled_names)
+        return assemble(
+            strings, symbols, demangled_names, string_eas, xref_from_eas,
+            code_hashes, checksums, eas)
+
+    def extract_summary(self):
+        """.. seealso:: :meth:`Backend.extract_summary`"""
+        return dict(self.strings), dict(
+            (ea, self._get_checksum(ea)) for ea in self._get_symbols())
+
+    def find_callers(self, eas):
+        """.. seealso:: :meth:`Backend.find_callers`"""
+        eas = set(eas)
+        return set(
+            ea for ea in self._get_symbols()
+            if ea not in eas and not eas.isdisjoint(self.functions[ea][2]))
+
+    def _get_symbols(self):
+        """Return the symbols of all functions that are not ignored.
+
+        :return: {<function ea>: <symbol>, ...}
+        :rtype: dict
+        """
+        return dict(
+            (ea, name) for ea, name in self.names.iteritems()
+            if not name.startswith('_ZThn'))
+
+    def _get_checksum(self, ea):
+        """Return a checksum of everything that is known about a function."""
+        return sha1(marshal.dumps(
+            (self.names[ea],) + self.functions[ea])).digest()
+
+    def get_function_name(self, ea):
+        """.. seealso:: :meth:`Backend.get_function_name`"""
+        return self.names[ea]
+
+    def set_function_name(self, ea, name):
+        """.. seealso:: :meth:`Backend.set_function_name`"""
+        self.names[ea] = name
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _to_bytes(text):
+    """Convert a string that has been read from a JSON file back to bytes."""
+    return text.encode(JSON_ENCODING)
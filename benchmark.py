@@ -0,0 +1,226 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import json
+import os
+import sys
+import time
+from tempfile import mkstemp
+from argparse import ArgumentParser
+from hashlib import sha1
+from random import Random
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+# discover_win
+from create_discover_database import Search
+from database import Database
+from database import open_databases
+from database import save_databases
+from instrumentation import Instrumentation
+from synthetic import generate_pair
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def run_benchmark(
+        function_count, renamed_fraction=0.0, seed=0, processes=1,
+        fuzzy_threshold=None, **options):
+    """Generate a binary pair and time every stage of the pipeline on it.
+
+    Like in the pipeline, the cleaned up databases are saved and mapped
+    again before the discovery starts.
+
+    :param int function_count: Number of functions of each binary.
+    :param float renamed_fraction: Fraction of the Windows functions that
+        have already been renamed before the discovery starts.
+    :param int seed: Seed of the random number generator.
+    :param int processes: Number of processes that compute the string sets.
+    :param float fuzzy_threshold: Minimum similarity of fuzzy matches. The
+        fuzzy search is disabled if None.
+    :param options: Further options for :func:`synthetic.generate_pair`.
+    :return: The report of the benchmark.
+    :rtype: dict
+    """
+    report = {
+        'parameters': dict(
+            options, function_count=function_count,
+            renamed_fraction=renamed_fraction, seed=seed,
+            processes=processes, fuzzy_threshold=fuzzy_threshold),
+        'stages': {},
+    }
+    stages = report['stages']
+
+    linux_backend, windows_backend, truth = generate_pair(
+        function_count, seed=seed, **options)
+
+    with _Timer(stages, 'analyse'):
+        linux_db = Database(linux_backend)
+        windows_db = Database(windows_backend)
+
+    with _Timer(stages, 'cleanup'):
+        linux_db.cleanup(windows_db)
+
+    handle, file_path = mkstemp(suffix='.db')
+    os.close(handle)
+    try:
+        with _Timer(stages, 'save'):
+            save_databases(file_path, (linux_db, windows_db))
+
+        with _Timer(stages, 'open'):
+            linux_db, windows_db = open_databases(file_path)
+
+        result = _discover(
+            stages, linux_db, windows_db, truth, renamed_fraction, seed,
+            processes, fuzzy_threshold)
+    finally:
+        os.remove(file_path)
+
+    # The single xref search is also part of the time of the other stages
+    report['search'] = result.pop('search')
+    report['results'] = result
+    report['peak_memory_kb'] = _get_peak_memory()
+    return report
+
+
+def _discover(
+        stages, linux_db, windows_db, truth, renamed_fraction, seed,
+        processes, fuzzy_threshold):
+    """Discover the Windows functions and compare them with the truth."""
+    # Simulate functions whose names are already known
+    random = Random(seed)
+    for ea in random.sample(
+            sorted(truth), int(len(truth) * renamed_fraction)):
+        windows_db.get_function(ea).rename(
+            linux_db.get_function_by_symbol(truth[ea]))
+
+    instrumentation = Instrumentation()
+    with _Timer(stages, 'index'):
+        search = Search(
+            linux_db, windows_db, instrumentation, processes, fuzzy_threshold)
+
+    with _Timer(stages, 'discover'):
+        result = sorted(search.discover())
+
+    wrong = sum(1 for ea, symbol in result if truth[ea] != symbol)
+
+    # {<stage>: {'found': <int>, 'wrong': <int>}, ...}
+    by_stage = {}
+    for ea, symbol in result:
+        counts = by_stage.setdefault(
+            search.provenance[ea].stage, {'found': 0, 'wrong': 0})
+        counts['found'] += 1
+        counts['wrong'] += truth[ea] != symbol
+
+    return {
+        'found': len(result),
+        'correct': len(result) - wrong,
+        'wrong': wrong,
+        'stages': by_stage,
+        'digest': sha1(repr(result)).hexdigest(),
+        'search': instrumentation.to_dict(),
+    }
+
+
+def _get_peak_memory():
+    """Return the peak memory usage of this process in KB or None if it is
+    not available on this platform."""
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Reported in bytes instead of KB
+        return usage // 1024
+
+    return usage
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class _Timer(object):
+    """Adds the time of a with block to a stage of a report."""
+
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stage = self.stages.setdefault(self.name, {'seconds': 0, 'calls': 0})
+        stage['seconds'] += time.time() - self.start
+        stage['calls'] += 1
+        stage['peak_memory_kb'] = _get_peak_memory()
+
+
+# =============================================================================
+# >> MAIN
+# =============================================================================
+def main(args=None):
+    """Run the benchmarks with the given command line arguments."""
+    parser = ArgumentParser(
+        description='Benchmark the pipeline on synthetic binaries.')
+    parser.add_argument(
+        '--functions', type=int, action='append',
+        help='Number of functions per binary. Can be given multiple times.')
+    parser.add_argument(
+        '--string-density', type=float, default=1.0,
+        help='Average number of strings per function.')
+    parser.add_argument(
+        '--xref-degree', type=float, default=3.0,
+        help='Average number of called functions per function.')
+    parser.add_argument(
+        '--inlining-noise', type=float, default=0.05,
+        help='Probability that a call is inlined on Windows.')
+    parser.add_argument(
+        '--renamed-fraction', type=float, default=0.0,
+        help='Fraction of Windows functions that are already renamed.')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help='Seed of the random number generator.')
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help='Number of processes that compute the string sets.')
+    parser.add_argument(
+        '--fuzzy-threshold', type=float,
+        help='Minimum Jaccard similarity of fuzzy matches. Fuzzy matching '
+             'is disabled if not given.')
+    parser.add_argument(
+        '--output', help='Path to save the JSON report at.')
+    namespace = parser.parse_args(args)
+
+    # The progress of the pipeline goes to stderr, so the report can be
+    # read from stdout.
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        reports = [
+            run_benchmark(
+                function_count, namespace.renamed_fraction, namespace.seed,
+                namespace.processes, namespace.fuzzy_threshold,
+                string_density=namespace.string_density,
+                xref_degree=namespace.xref_degree,
+                inlining_noise=namespace.inlining_noise)
+            for function_count in namespace.functions or (10000,)]
+    finally:
+        sys.stdout = stdout
+
+    data = json.dumps(reports, indent=4, sort_keys=True)
+    if namespace.output is None:
+        print data
+    else:
+        with open(namespace.output, 'wb') as f:
+            f.write(data)
+
+
+if __name__ == '__main__':
+    main()
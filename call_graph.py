@@ -0,0 +1,234 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from array import array
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Index of the callers in :attr:`CallGraph.edges`
+CALLERS = 0
+
+#: Index of the callees in :attr:`CallGraph.edges`
+CALLEES = 1
+
+#: Value of a correspondence vector for functions without a match
+NO_MATCH = -1
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class CallGraph(object):
+    """The call graph of a database in compressed sparse row format.
+
+    Functions are identified by their position in the sorted list of
+    function eas. The neighbours of the function at position ``i`` are the
+    positions ``indices[indptr[i]:indptr[i + 1]]``.
+
+    The graph of a :class:`database.MappedDatabase` is taken straight from
+    the mapped file, whose functions are stored in the same order. Its
+    function objects are only created when they are accessed.
+    """
+
+    def __init__(self, database):
+        """Build the call graph of a database.
+
+        :param Database database: The database.
+        """
+        layout = getattr(database, 'layout', None)
+        if layout is None:
+            eas = sorted(database.functions)
+
+            #: Functions of the database ordered by their position
+            self.functions = [database.functions[ea] for ea in eas]
+        else:
+            eas = layout.unpack('function_eas', 'Q')
+            self.functions = _MappedPositions(database.functions)
+
+        #: {<function ea>: <position>, ...}
+        self.positions = dict((ea, index) for index, ea in enumerate(eas))
+
+        #: Tuples with the indptr and indices arrays of the callers and the
+        #: callees of all functions
+        if layout is None:
+            self.edges = (
+                self._build_edges('xref_to_eas'),
+                self._build_edges('xref_from_eas'))
+        else:
+            self.edges = (
+                _unpack_edges(layout, 'xrefs_to', 'xref_to_offsets'),
+                _unpack_edges(layout, 'xrefs_from', 'xref_from_offsets'))
+
+    def __len__(self):
+        """Return the number of functions."""
+        return len(self.functions)
+
+    def _build_edges(self, attr):
+        """Return the compressed sparse rows of an xref attribute.
+
+        :param str attr: Name of the attribute with the xref eas.
+        :rtype: tuple
+        """
+        positions = self.positions
+        indptr = array('l', [0])
+        indices = array('l')
+        for func in self.functions:
+            indices.extend(
+                positions[ea] for ea in getattr(func, attr)
+                if ea in positions)
+            indptr.append(len(indices))
+
+        return indptr, indices
+
+    def get_position(self, func):
+        """Return the position of a function.
+
+        :param Function func: A function of the database.
+        :rtype: int
+        """
+        return self.positions[func.ea]
+
+    def new_correspondence(self):
+        """Return a vector that maps every position to :data:`NO_MATCH`.
+
+        :rtype: array.array
+        """
+        return array('l', [NO_MATCH]) * len(self.functions)
+
+
+class _MappedPositions(object):
+    """The functions of a mapped database ordered by their position.
+
+    Functions are created on their first access.
+    """
+
+    def __init__(self, functions):
+        """Initialize the object.
+
+        :param database._MappedFunctions functions: Functions of the mapped
+            database.
+        """
+        self._functions = functions
+        self._count = len(functions)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._count:
+            raise IndexError(position)
+
+        return self._functions.get_by_index(position)
+
+    def __iter__(self):
+        return self._functions.itervalues()
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _unpack_edges(layout, name, offsets_name):
+    """Return the compressed sparse rows of an xref section of a mapped
+    database.
+
+    The stored rows already contain the function indexes, which are the
+    positions of the functions.
+
+    :param storage.DatabaseLayout layout: Layout of the mapped database.
+    :param str name: Name of the section with the indexes.
+    :param str offsets_name: Name of the section with the row offsets.
+    :rtype: tuple
+    """
+    return (
+        array('l', layout.unpack(offsets_name, 'I')),
+        array('l', layout.unpack(name, 'I')))
+
+
+def iter_matched_neighbours(graph, position, matches):
+    """Iterate over the callers and callees of a function that have a
+    match.
+
+    :param CallGraph graph: The call graph of the function.
+    :param int position: Position of the function.
+    :param array.array matches: Correspondence vector of the graph.
+    :return: A generator that yields tuples with the direction
+        (:data:`CALLERS` or :data:`CALLEES`), the position of the neighbour
+        and the position of its match.
+    :rtype: generator
+    """
+    for direction in (CALLERS, CALLEES):
+        indptr, indices = graph.edges[direction]
+        for neighbour in indices[indptr[position]:indptr[position + 1]]:
+            match = matches[neighbour]
+            if match != NO_MATCH:
+                yield direction, neighbour, match
+
+
+def find_single_neighbours(
+        linux_graph, windows_graph, linux_matches, windows_matches, pairs):
+    """Return the neighbours of matched pairs that can be matched as well.
+
+    For both directions of every pair, the functions must have the same
+    number of neighbours, every matched Windows neighbour must correspond
+    to a Linux neighbour and exactly one neighbour must be left on both
+    sides. These are matched with each other.
+
+    :param CallGraph linux_graph: Call graph of the Linux database.
+    :param CallGraph windows_graph: Call graph of the Windows database.
+    :param array.array linux_matches: Positions of the matched Windows
+        functions of all Linux functions or :data:`NO_MATCH`.
+    :param array.array windows_matches: Positions of the matched Linux
+        functions of all Windows functions or :data:`NO_MATCH`.
+    :param iterable pairs: Tuples with the positions of a matched Linux and
+        Windows function.
+    :return: A tuple with a list and the number of compared neighbours. The
+        list contains tuples with the positions of a Linux and a Windows
+        function, the position of the Windows function of the pair they have
+        been found by and its number of neighbours in that direction. A
+        function can be part of several tuples.
+    :rtype: tuple
+    """
+    result = []
+    comparisons = 0
+    for direction in (CALLERS, CALLEES):
+        linux_indptr, linux_indices = linux_graph.edges[direction]
+        windows_indptr, windows_indices = windows_graph.edges[direction]
+        for linux_pos, windows_pos in pairs:
+            linux_start = linux_indptr[linux_pos]
+            linux_stop = linux_indptr[linux_pos + 1]
+            windows_start = windows_indptr[windows_pos]
+            windows_stop = windows_indptr[windows_pos + 1]
+            length = linux_stop - linux_start
+            if length == 0 or length != windows_stop - windows_start:
+                continue
+
+            comparisons += length
+            linux_neighbours = set(linux_indices[linux_start:linux_stop])
+            windows_neighbour = NO_MATCH
+            for neighbour in windows_indices[windows_start:windows_stop]:
+                match = windows_matches[neighbour]
+                if match == NO_MATCH:
+                    if windows_neighbour != NO_MATCH:
+                        # Multiple not matched neighbours
+                        break
+
+                    windows_neighbour = neighbour
+                elif match in linux_neighbours:
+                    linux_neighbours.discard(match)
+                else:
+                    # The neighbours disagree
+                    break
+            else:
+                if windows_neighbour == NO_MATCH or len(linux_neighbours) != 1:
+                    continue
+
+                linux_neighbour, = linux_neighbours
+                if linux_matches[linux_neighbour] == NO_MATCH:
+                    result.append((
+                        linux_neighbour, windows_neighbour, windows_pos,
+                        length))
+
+    return result, comparisons
@@ -0,0 +1,178 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+from collections import namedtuple
+from hashlib import sha1
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: First field of the first line of every checkpoint file
+MAGIC = 'discover_win checkpoint 4'
+
+#: Number of bytes that are hashed at once by :func:`get_database_digest`
+DIGEST_CHUNK_SIZE = 1 << 20
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+#: State of a search at the end of an iteration of the discover loop.
+#:
+#: - iteration: Number of completed iterations.
+#: - result_count: Number of results that have been written to the
+#:   discovered database so far.
+#: - queued_eas: Sorted eas of the queued Windows functions.
+#: - dirty_positions: Sorted positions of the first Linux function of every
+#:   dirty string set.
+#: - done: Whether the search has been completed.
+#: - group_positions: Like dirty_positions, but for the candidate groups
+#:   whose call graph evidence changed.
+CheckpointState = namedtuple(
+    'CheckpointState',
+    'iteration result_count queued_eas dirty_positions done '
+    'group_positions')
+
+
+class CheckpointWriter(object):
+    """Appends the state of a search to a checkpoint file.
+
+    Every state is a single line, so writing a checkpoint is cheap and an
+    interrupted write never damages the previous checkpoints.
+    :func:`load_checkpoint` ignores an incomplete last line.
+    """
+
+    def __init__(
+            self, file_path, linux_count, windows_count, database_digest,
+            append=False):
+        """Open the checkpoint file.
+
+        :param str file_path: Path of the checkpoint file.
+        :param int linux_count: Number of Linux functions.
+        :param int windows_count: Number of Windows functions.
+        :param str database_digest: Digest of the searched database file
+            (see :func:`get_database_digest`).
+        :param bool append: If True, the checkpoints are appended to an
+            existing file that has been written for the same databases.
+            Otherwise, the file is created from scratch.
+        """
+        if append:
+            self._file = open(file_path, 'r+b')
+
+            # Drop an incomplete last line
+            self._file.seek(self._file.read().rfind('\n') + 1)
+            self._file.truncate()
+        else:
+            self._file = open(file_path, 'wb')
+            self._file.write(
+                _format_header(linux_count, windows_count, database_digest))
+            self._sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, state):
+        """Append a checkpoint.
+
+        :param CheckpointState state: State of the search.
+        """
+        self._file.write('{0}\t{1}\t{2:d}\t{3}\t{4}\t{5}\n'.format(
+            state.iteration, state.result_count, state.done,
+            _format_hex_list(state.queued_eas),
+            _format_hex_list(state.dirty_positions),
+            _format_hex_list(state.group_positions)))
+        self._sync()
+
+    def _sync(self):
+        """Make sure the written data survives a crash."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Close the file."""
+        self._file.close()
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def get_database_digest(file_path):
+    """Return the hexadecimal SHA-1 digest of a database file.
+
+    The digest is stored in the header of a checkpoint file, so a search is
+    never resumed on a database that has changed since the checkpoint,
+    even if it still has the same number of functions. The content is
+    hashed instead of comparing the modification time, because the cleaned
+    up database is written again on every run of the pipeline.
+
+    :param str file_path: Path of the database file.
+    :rtype: str
+    """
+    digest = sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), ''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def load_checkpoint(file_path, linux_count, windows_count, database_digest):
+    """Return the last checkpoint of a checkpoint file.
+
+    :param str file_path: Path of the checkpoint file.
+    :param int linux_count: Number of Linux functions.
+    :param int windows_count: Number of Windows functions.
+    :param str database_digest: Digest of the searched database file
+        (see :func:`get_database_digest`).
+    :return: The last complete state or None if the file doesn't exist, has
+        been written for other databases or doesn't contain a checkpoint.
+    :rtype: CheckpointState
+    """
+    if not os.path.isfile(file_path):
+        return None
+
+    header = _format_header(linux_count, windows_count, database_digest)
+    state = None
+    with open(file_path, 'rb') as f:
+        if f.readline() != header:
+            return None
+
+        for line in f:
+            # The last line is incomplete if the search has been killed
+            # while writing it
+            if not line.endswith('\n'):
+                break
+
+            (iteration, result_count, done, queued_eas, dirty_positions,
+                group_positions) = line[:-1].split('\t')
+            state = CheckpointState(
+                int(iteration), int(result_count),
+                _parse_hex_list(queued_eas), _parse_hex_list(dirty_positions),
+                bool(int(done)), _parse_hex_list(group_positions))
+
+    return state
+
+
+def _format_header(linux_count, windows_count, database_digest):
+    """Return the first line of a checkpoint file."""
+    return '{0}\t{1}\t{2}\t{3}\n'.format(
+        MAGIC, linux_count, windows_count, database_digest)
+
+
+def _format_hex_list(values):
+    """Return the numbers as comma separated hexadecimal numbers."""
+    return ','.join('{0:x}'.format(value) for value in values)
+
+
+def _parse_hex_list(text):
+    """Return the list of comma separated hexadecimal numbers."""
+    if not text:
+        return []
+
+    return [int(value, 16) for value in text.split(',')]
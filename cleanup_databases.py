@@ -1,11 +1,29 @@
 # =============================================================================
 # >> IMPORTS
 # =============================================================================
-# Python
-import cPickle as pickle
-
 # discover_win
 from database import Database
+from database import save_databases
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def cleanup_databases(linux_db_path, windows_db_path, cleaned_up_path):
+    """Cleanup the Linux and Windows database and save them to a single
+    file.
+
+    :param str linux_db_path: Path of the Linux database.
+    :param str windows_db_path: Path of the Windows database.
+    :param str cleaned_up_path: Path to save the cleaned up databases at.
+    """
+    linux_db = Database.load(linux_db_path)
+    windows_db = Database.load(windows_db_path)
+    linux_db.cleanup(windows_db)
+
+    print 'Saving cleaned databases...'
+    save_databases(cleaned_up_path, (linux_db, windows_db))
+    print 'Done!'
 
 
 # =============================================================================
@@ -18,28 +36,18 @@ def main():
     if linux_db_path is None:
         return
 
-    linux_db = Database.load(linux_db_path)
-
     # Step 2 - Windows file
     windows_db_path = AskFile(0, '*.db', 'Select the Windows database')
     if windows_db_path is None:
         return
 
-    windows_db = Database.load(windows_db_path)
-
     # Step 3 - Shared cleaned up file
     cleaned_up_path = AskFile(1, '*.db', 'Select the cleaned up database')
     if cleaned_up_path is None:
         return
 
-    linux_db.cleanup(windows_db)
-
-    # Step 4 - Save cleaned up databases
-    print 'Saving cleaned databases...'
-    with open(cleaned_up_path, 'wb') as f:
-        pickle.dump((linux_db, windows_db), f)
-
-    print 'Done!'
+    # Step 4 - Cleanup and save the databases
+    cleanup_databases(linux_db_path, windows_db_path, cleaned_up_path)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -2,7 +2,34 @@
 # >> IMPORTS
 # =============================================================================
 # Python
-import cPickle as pickle
+import os
+from itertools import islice
+
+# discover_win
+from call_graph import CALLEES
+from call_graph import CALLERS
+from call_graph import CallGraph
+from call_graph import NO_MATCH
+from call_graph import find_single_neighbours
+from call_graph import iter_matched_neighbours
+from checkpoint import CheckpointState
+from checkpoint import CheckpointWriter
+from checkpoint import get_database_digest
+from checkpoint import load_checkpoint
+from database import open_databases
+from fuzzy import LshIndex
+from fuzzy import jaccard
+from graph_signatures import CONFIDENCES
+from graph_signatures import GraphSignatures
+from graph_signatures import find_unique_matches
+from instrumentation import Instrumentation
+from instrumentation import timed
+from match_cache import MatchCache
+from provenance import Provenance
+from provenance import anchor_confidence
+from results import ResultWriter
+from results import read_records
+from sharding import compute_string_buckets
 
 
 # =============================================================================
@@ -11,15 +38,410 @@ import cPickle as pickle
 class Search(object):
     """A class that implements various search mechanisms."""
 
-    def __init__(self, linux_db, windows_db):
+    def __init__(
+            self, linux_db, windows_db, instrumentation=None, processes=1,
+            fuzzy_threshold=None, result_writer=None, linux_reference=None,
+            checkpoint_writer=None, previous_provenance=None):
         """Initialize the object.
 
         :param Database linux_db: Linux database.
         :param Database windows_db: Windows database.
+        :param Instrumentation instrumentation: Collects the timers and
+            counters of the search. A new one is created if not given.
+        :param int processes: Number of processes that compute the string
+            sets of the functions. More than one process requires databases
+            that have been opened with :func:`database.open_databases`.
+            The result is the same for any number of processes.
+        :param float fuzzy_threshold: Minimum Jaccard similarity of the
+            functions renamed by :meth:`_fuzzy_match_search`. The fuzzy
+            search is disabled if None.
+        :param results.ResultWriter result_writer: If given, every renamed
+            Windows function and its provenance is written to it as soon as
+            it is found. This includes the functions that have been renamed
+            before.
+        :param multi_target.LinuxReference linux_reference: If given, the
+            Linux indexes are taken from it instead of being built again.
+            The Linux database must be the one of the reference. Only the
+            Windows database has to be cleaned up, the strings of the Linux
+            functions are reduced to the strings of the Windows database on
+            the fly. Sharding is not supported in that case, so processes
+            must be 1.
+        :param checkpoint.CheckpointWriter checkpoint_writer: If given, the
+            state of the search is saved after every iteration of the
+            discover loop. Requires a result writer.
+        :param dict previous_provenance: The provenance of functions that
+            have been renamed before ({<Windows function ea>:
+            <provenance.Provenance>, ...}), e.g. by an interrupted search.
+            Other renamed functions get a "previous" provenance.
         """
+        if checkpoint_writer is not None and result_writer is None:
+            raise ValueError('Checkpoints require a result writer.')
+
+        if processes > 1 and linux_reference is not None:
+            raise ValueError(
+                'Sharding is not supported with a Linux reference.')
+
         self.linux_db = linux_db
         self.windows_db = windows_db
 
+        #: Minimum similarity of fuzzy matches or None
+        self.fuzzy_threshold = fuzzy_threshold
+
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+
+        #: Timers and counters of the search
+        self.instrumentation = instrumentation
+
+        #: Receives the results while they are found or None
+        self.result_writer = result_writer
+
+        #: Receives the state after every iteration or None
+        self.checkpoint_writer = checkpoint_writer
+
+        #: {<Windows function ea>: <provenance.Provenance>, ...}
+        self.provenance = {}
+
+        #: Current iteration of the discover loop
+        self.iteration = 0
+
+        # True if the search has been restored from a completed search
+        self._done = False
+
+        # The keys of the indexes are the frozensets of strings or their
+        # digests if the sets have been computed by worker processes.
+        # {<string set>: [<Linux position>, ...]} in ascending order
+        self._linux_string_index = {}
+
+        # {<string set>: set([<not renamed Windows Function>, ...])}
+        self._windows_string_index = {}
+
+        # {<indexed Windows Function>: <string set>, ...}
+        self._windows_string_keys = {}
+
+        # String sets whose Windows bucket became unique or whose Linux
+        # functions have been matched since the last search
+        self._dirty_string_sets = set()
+
+        # A string set with several not renamed Windows functions or several
+        # Linux functions is a candidate group. These are the groups whose
+        # candidates or their matched neighbours changed since the last
+        # candidate group search.
+        self._dirty_groups = set()
+
+        # Not renamed Windows functions with a newly renamed caller. Only
+        # these can yield new results in the multiple xrefs search.
+        self._queued_functions = set()
+
+        #: The shared Linux indexes or None
+        self.linux_reference = linux_reference
+
+        if linux_reference is None:
+            # Degree signatures don't change, so they are shared by all
+            # passes of the structural search.
+            self._graph_signatures = GraphSignatures()
+            self._linux_graph = CallGraph(linux_db)
+
+            # The databases have been cleaned up against each other
+            self._shared_texts = None
+        else:
+            self._graph_signatures = GraphSignatures(
+                linux_reference.degree_signatures)
+            self._linux_graph = linux_reference.graph
+            self._shared_texts = frozenset(windows_db.strings.itervalues())
+
+        # Call graphs and correspondence vectors of the single xref search
+        self._windows_graph = CallGraph(windows_db)
+        self._linux_matches = self._linux_graph.new_correspondence()
+        self._windows_matches = self._windows_graph.new_correspondence()
+
+        # Positions of the Linux and Windows functions that have been renamed
+        # since the last single xref search
+        self._new_pairs = []
+
+        if processes > 1 and linux_reference is None:
+            self._build_sharded_string_index(processes)
+        else:
+            self._build_string_index()
+
+        # String sets of the Linux functions by their position in the call
+        # graph or None
+        self._linux_string_keys = linux_keys = [None] * len(self._linux_graph)
+        for key, positions in self._linux_string_index.iteritems():
+            for position in positions:
+                linux_keys[position] = key
+
+        if previous_provenance is None:
+            previous_provenance = {}
+
+        for windows_func in windows_db.iter_renamed_functions():
+            self._add_result(windows_func, previous_provenance.get(
+                windows_func.ea, Provenance('previous', 0, None, 1, 1.0)))
+            self._queue_neighbours(windows_func)
+            try:
+                linux_func = linux_db.get_function_by_symbol(
+                    windows_func.symbol)
+            except ValueError:
+                continue
+
+            linux_pos = self._linux_graph.get_position(linux_func)
+            if self._linux_matches[linux_pos] == NO_MATCH:
+                self._add_match(
+                    linux_pos, self._windows_graph.get_position(windows_func))
+
+    def restore(self, state):
+        """Continue an interrupted search from a checkpoint.
+
+        The functions of the checkpoint's results must have been renamed
+        before the search has been created. The search continues with the
+        iteration after the checkpoint.
+
+        :param checkpoint.CheckpointState state: The checkpoint.
+        """
+        self.iteration = state.iteration
+        self._done = state.done
+        get_function = self.windows_db.get_function
+        self._queued_functions = set(
+            get_function(ea) for ea in state.queued_eas)
+        linux_keys = self._linux_string_keys
+        self._dirty_string_sets = set(
+            linux_keys[position] for position in state.dirty_positions)
+        self._dirty_groups = set(
+            linux_keys[position] for position in state.group_positions)
+
+        # The renamed functions haven't been indexed, so the buckets they
+        # have emptied don't exist
+        windows_index = self._windows_string_index
+        for key in self._dirty_string_sets:
+            windows_index.setdefault(key, set())
+
+        # The neighbours of the renamed pairs have already been searched
+        self._new_pairs = []
+
+    def _save_checkpoint(self, done=False):
+        """Save the state of the search at the end of an iteration.
+
+        :param bool done: Whether the search has been completed.
+        """
+        if self.checkpoint_writer is None:
+            return
+
+        # The checkpoint refers to the results, so they must be on disk
+        # first.
+        self.result_writer.flush()
+        linux_index = self._linux_string_index
+        self.checkpoint_writer.write(CheckpointState(
+            self.iteration, self.result_writer.count,
+            sorted(func.ea for func in self._queued_functions),
+            sorted(linux_index[key][0] for key in self._dirty_string_sets),
+            done,
+            sorted(linux_index[key][0] for key in self._dirty_groups)))
+
+    def _build_string_index(self):
+        """Index the Linux and not renamed Windows functions by their string
+        sets.
+
+        Only string sets that exist in both databases are indexed, because
+        no other set can ever produce a match.
+        """
+        linux_index = self._linux_string_index
+        if self.linux_reference is None:
+            linux_string_sets = self.linux_db.iter_string_sets()
+        else:
+            shared_texts = self._shared_texts
+            get_position = self._linux_graph.get_position
+            linux_string_sets = (
+                (get_position(linux_func), strings & shared_texts)
+                for strings, linux_func
+                in self.linux_reference.string_funcs)
+
+        for position, key in linux_string_sets:
+            if not key:
+                # No need to compare functions, which don't contain strings.
+                # We would get tons of multi-matches, but not a single result.
+                continue
+
+            linux_index.setdefault(key, []).append(position)
+
+        # Only the Windows functions of shared string sets are created
+        windows_index = self._windows_string_index
+        windows_functions = self._windows_graph.functions
+        for position, key in self.windows_db.iter_string_sets():
+            if key not in linux_index:
+                continue
+
+            # Skip already renamed functions
+            windows_func = windows_functions[position]
+            if windows_func.renamed:
+                continue
+
+            windows_index.setdefault(key, set()).add(windows_func)
+            self._windows_string_keys[windows_func] = key
+
+        self._dirty_string_sets.update(windows_index)
+
+    def _build_sharded_string_index(self, processes):
+        """Index the functions like :meth:`_build_string_index`, but let
+        worker processes bucket the functions of both databases.
+
+        The string sets are replaced by keys that are equal if, and only if,
+        the string sets are equal. The buckets of the workers are merged in
+        the order of the function indexes, which are the positions of the
+        mapped call graphs, so the search gives the same result. Only the
+        Windows functions of buckets that exist in both databases are
+        created here.
+
+        :param int processes: Number of worker processes.
+        """
+        linux_buckets, windows_buckets = compute_string_buckets(
+            (self.linux_db, self.windows_db), processes)
+        self._linux_string_index = linux_index = linux_buckets
+
+        windows_index = self._windows_string_index
+        get_function = self.windows_db.functions.get_by_index
+        for key, indexes in windows_buckets.iteritems():
+            if key not in linux_index:
+                continue
+
+            for index in indexes:
+                windows_func = get_function(index)
+                if windows_func.renamed:
+                    continue
+
+                windows_index.setdefault(key, set()).add(windows_func)
+                self._windows_string_keys[windows_func] = key
+
+        self._dirty_string_sets.update(windows_index)
+
+    def _rename(self, windows_func, linux_func, provenance):
+        """Rename a Windows function and update the string set index.
+
+        :param Function windows_func: Windows function to rename.
+        :param Function linux_func: The Linux equivalent of the function.
+        :param provenance.Provenance provenance: How the function has been
+            matched.
+        :return: False if the pair has been rejected, because one of the
+            functions has already been matched with another function.
+        :rtype: bool
+        """
+        # The correspondence vectors must stay one-to-one, otherwise two
+        # Windows functions would get the same symbol.
+        linux_pos = self._linux_graph.get_position(linux_func)
+        windows_pos = self._windows_graph.get_position(windows_func)
+        if (self._linux_matches[linux_pos] != NO_MATCH or
+                self._windows_matches[windows_pos] != NO_MATCH):
+            self.instrumentation.count('rejected_matches')
+            return False
+
+        key = self._windows_string_keys.pop(windows_func, None)
+        if key is not None:
+            self._windows_string_index[key].discard(windows_func)
+            self._mark_changed_bucket(key)
+
+        key = self._linux_string_keys[linux_pos]
+        if key is not None:
+            self._mark_changed_bucket(key)
+
+        windows_func.rename(linux_func)
+        self._queue_neighbours(windows_func)
+        self._add_match(linux_pos, windows_pos)
+        self._add_result(windows_func, provenance)
+        return True
+
+    def _mark_changed_bucket(self, key):
+        """Mark a string set that lost a candidate as dirty.
+
+        A Windows bucket with a single function is left to the string match
+        search, which passes it on to the candidate group search if several
+        Linux functions are still free. Buckets with several Windows
+        functions go to the candidate group search right away, because fewer
+        candidates might tell the others apart. Emptied buckets are not
+        marked, because they can't produce a match anymore.
+
+        :param key: The string set.
+        """
+        functions = self._windows_string_index.get(key, ())
+        if len(functions) > 1:
+            self._dirty_groups.add(key)
+        elif functions:
+            self._dirty_string_sets.add(key)
+
+    def _add_result(self, windows_func, provenance):
+        """Remember the provenance of a renamed function and pass it to the
+        result writer.
+
+        :param Function windows_func: The renamed Windows function.
+        :param provenance.Provenance provenance: How the function has been
+            matched.
+        """
+        self.provenance[windows_func.ea] = provenance
+        if self.result_writer is not None:
+            self.result_writer.write(
+                windows_func.ea, windows_func.symbol, provenance)
+
+    def _add_match(self, linux_pos, windows_pos):
+        """Update the correspondence vectors and queue the pair for the next
+        single xref search.
+
+        Both functions must not have been matched yet.
+
+        :param int linux_pos: Position of the Linux function.
+        :param int windows_pos: Position of the renamed Windows function.
+        """
+        self._linux_matches[linux_pos] = windows_pos
+        self._windows_matches[windows_pos] = linux_pos
+        self._new_pairs.append((linux_pos, windows_pos))
+        self._mark_candidate_groups(linux_pos, windows_pos)
+
+    def _mark_candidate_groups(self, linux_pos, windows_pos):
+        """Mark the candidate groups of the neighbours of a new pair as
+        dirty, because their call graph evidence changed.
+
+        :param int linux_pos: Position of the Linux function of the pair.
+        :param int windows_pos: Position of the Windows function of the pair.
+        """
+        windows_index = self._windows_string_index
+        windows_keys = self._windows_string_keys
+        linux_index = self._linux_string_index
+        linux_keys = self._linux_string_keys
+        windows_functions = self._windows_graph.functions
+        dirty_groups = self._dirty_groups
+        for direction in (CALLERS, CALLEES):
+            indptr, indices = self._windows_graph.edges[direction]
+            for neighbour in indices[
+                    indptr[windows_pos]:indptr[windows_pos + 1]]:
+                key = windows_keys.get(windows_functions[neighbour])
+                if key is not None and (
+                        len(windows_index[key]) > 1 or
+                        len(linux_index[key]) > 1):
+                    dirty_groups.add(key)
+
+            indptr, indices = self._linux_graph.edges[direction]
+            for neighbour in indices[indptr[linux_pos]:indptr[linux_pos + 1]]:
+                key = linux_keys[neighbour]
+                if key is None:
+                    continue
+
+                count = len(windows_index.get(key, ()))
+                if count > 1 or count and len(linux_index[key]) > 1:
+                    dirty_groups.add(key)
+
+    def _queue_neighbours(self, windows_func):
+        """Queue the functions whose evidence changed by renaming the given
+        Windows function.
+
+        Its callers are checked by the next :meth:`_single_xref_search`
+        and its string set peers are covered by the dirty string sets. Its
+        callees gained a renamed caller, which is what the multiple xrefs
+        search looks at.
+
+        :param Function windows_func: The renamed Windows function.
+        """
+        queued_functions = self._queued_functions
+        for func in windows_func.xrefs_from:
+            if not func.renamed:
+                queued_functions.add(func)
+
     def discover(self):
         """Discover Windows functions.
 
@@ -29,21 +451,47 @@ class Search(object):
         if not self.windows_db.functions:
             raise ValueError('Windows database has no function.')
 
+        # Every pass only visits the string sets and functions whose
+        # neighbourhood changed since the previous pass. The structural and
+        # the fuzzy search look at all remaining functions, so they only run
+        # if the cheaper searches don't find anything anymore.
+        instrumentation = self.instrumentation
         total_count = 0
-        while True:
-            count = self._string_match_search()
-            if count == 0:
-                break
+        while not self._done:
+            while (self._dirty_string_sets or self._dirty_groups or
+                    self._queued_functions):
+                self.iteration += 1
+                instrumentation.start_iteration(self.iteration)
+                count = self._string_match_search()
+                count += self._candidate_group_search()
+                count += self._multiple_xrefs_search()
+                instrumentation.end_iteration(count)
+                total_count += count
+                self._save_checkpoint()
+
+            self.iteration += 1
+            instrumentation.start_iteration(self.iteration)
+            count = self._structural_search()
+            if not count and self.fuzzy_threshold is not None:
+                count = self._fuzzy_match_search()
 
+            instrumentation.end_iteration(count)
             total_count += count
+            if not count:
+                self._done = True
+
+            self._save_checkpoint(self._done)
+
+        instrumentation.record_caches('linux', self.linux_db.set_cache)
+        instrumentation.record_caches('windows', self.windows_db.set_cache)
 
         percentage = 100. / len(self.windows_db.functions) * total_count
         print 'Found {0} ({1:.3}%) functions in total!'.format(
             total_count, percentage)
-        for func in self.windows_db.functions.itervalues():
-            if func.renamed:
-                yield (func.ea, func.symbol)
+        for func in self.windows_db.iter_renamed_functions():
+            yield (func.ea, func.symbol)
 
+    @timed('string_match_search')
     def _string_match_search(self):
         """Discover functions by searching for strings matches.
 
@@ -52,36 +500,159 @@ class Search(object):
         """
         print 'String match search...'
         count = 0
-        for linux_func in self.linux_db.functions.itervalues():
-            if not linux_func.string_eas:
-                # No need to compare functions, which don't contain strings.
-                # We would get tons of multi-matches, but not a single result.
+
+        # Only buckets that changed since the last search can yield new
+        # results. Visit them in the order of the Linux eas. A rename
+        # only changes the bucket of its own functions, so no bucket becomes
+        # dirty again while they are visited.
+        linux_index = self._linux_string_index
+        windows_index = self._windows_string_index
+        linux_matches = self._linux_matches
+        linux_functions = self._linux_graph.functions
+        keys = sorted(
+            self._dirty_string_sets, key=lambda key: linux_index[key][0])
+        self._dirty_string_sets = set()
+        candidates = 0
+        multi_matches = 0
+        for key in keys:
+            windows_funcs = windows_index[key]
+            if not windows_funcs:
                 continue
 
-            result = None
-            for windows_func in self.windows_db.functions.itervalues():
-                # Skip already renamed functions
-                if windows_func.renamed:
-                    continue
+            linux_funcs = [
+                linux_functions[position] for position in linux_index[key]
+                if linux_matches[position] == NO_MATCH]
 
-                # Skip functions that do not have the same strings
-                if linux_func.strings != windows_func.strings:
-                    continue
+            candidates += len(linux_funcs)
+            if not linux_funcs:
+                continue
 
-                if result is not None:
-                    # Multi-match :(
-                    break
+            if len(windows_funcs) > 1 or len(linux_funcs) > 1:
+                # Multi-matches are left to the candidate group search
+                multi_matches += 1
+                self._dirty_groups.add(key)
+                continue
+
+            windows_func, = windows_funcs
+            linux_count = len(linux_index[key])
+            if self._rename(windows_func, linux_funcs[0], Provenance(
+                    'string', self.iteration, None, linux_count,
+                    1.0 / linux_count)):
+                count += 1
+
+        instrumentation = self.instrumentation
+        instrumentation.count('string_buckets', len(keys))
+        instrumentation.count('string_candidates', candidates)
+        instrumentation.count('string_multi_matches', multi_matches)
+        count += self._single_xref_search()
+        print 'Found {0} functions.'.format(count)
+        return count
+
+    @timed('candidate_group_search')
+    def _candidate_group_search(self):
+        """Discover functions by resolving ambiguous string matches with
+        their matched callers and callees.
+
+        Only the candidate groups whose evidence changed since the last
+        search are visited, in the order of the Linux eas. Within a
+        group, a Linux and a Windows function are matched if they share more
+        matched neighbours with each other than with any other candidate.
+
+        :return: Number of discovered functions.
+        :rtype: int
+        """
+        print 'Candidate group search...'
+        linux_index = self._linux_string_index
+        windows_index = self._windows_string_index
+        keys = sorted(self._dirty_groups, key=lambda key: linux_index[key][0])
+        self._dirty_groups = set()
+        count = 0
+        for key in keys:
+            windows_funcs = windows_index[key]
+            if not windows_funcs:
+                continue
 
-                result = windows_func
-            else:
-                # No multi-match! Found a function?
-                if result is not None:
-                    result.rename(linux_func)
-                    count += 1 + self._single_xref_search(linux_func, result)
+            candidates = max(len(windows_funcs), len(linux_index[key]))
+            for windows_func, linux_func, anchor_ea, anchors in (
+                    self._resolve_candidate_group(key)):
+                if self._rename(windows_func, linux_func, Provenance(
+                        'candidate_group', self.iteration, anchor_ea,
+                        candidates, anchor_confidence(anchors))):
+                    count += 1
 
+        count += self._single_xref_search()
+
+        self.instrumentation.count('candidate_groups', len(keys))
         print 'Found {0} functions.'.format(count)
-        return count + self._multiple_xrefs_search()
+        return count
+
+    def _resolve_candidate_group(self, key):
+        """Return the pairs of a candidate group that can be told apart by
+        their matched neighbours.
+
+        The neighbours are compared by the positions of their Linux
+        functions, so a Windows neighbour agrees with a Linux neighbour if
+        they have been matched with each other.
+
+        :param key: The string set of the group.
+        :return: A list of tuples with the Windows function, the Linux
+            function, the ea of an agreeing Windows neighbour and the number
+            of agreeing neighbours, sorted by the Windows eas.
+        :rtype: list
+        """
+        linux_graph = self._linux_graph
+        windows_graph = self._windows_graph
+        linux_matches = self._linux_matches
+        linux_funcs = [
+            position for position in self._linux_string_index[key]
+            if linux_matches[position] == NO_MATCH]
+
+        if not linux_funcs:
+            return []
+
+        # {<anchor>: [<Windows position>, ...], ...}
+        windows_funcs = {}
+        for windows_func in self._windows_string_index[key]:
+            position = windows_graph.get_position(windows_func)
+            for direction, neighbour, match in iter_matched_neighbours(
+                    windows_graph, position, self._windows_matches):
+                windows_funcs.setdefault(
+                    (direction, match), []).append(position)
+
+        # {(<Linux position>, <Windows position>): [<anchor>, ...], ...}
+        shared_anchors = {}
+        for linux_pos in linux_funcs:
+            for direction, neighbour, match in iter_matched_neighbours(
+                    linux_graph, linux_pos, linux_matches):
+                anchor = (direction, neighbour)
+                for windows_pos in windows_funcs.get(anchor, ()):
+                    shared_anchors.setdefault(
+                        (linux_pos, windows_pos), []).append(anchor)
+
+        # {<position>: [<score>, <best candidate or None if tied>], ...}
+        linux_best = {}
+        windows_best = {}
+        for (linux_pos, windows_pos), anchors in shared_anchors.iteritems():
+            _update_best(linux_best, linux_pos, windows_pos, len(anchors))
+            _update_best(windows_best, windows_pos, linux_pos, len(anchors))
+
+        result = []
+        for linux_pos, (score, windows_pos) in linux_best.iteritems():
+            if (windows_pos is None or
+                    windows_best[windows_pos][1] != linux_pos):
+                continue
 
+            anchor_pos = linux_matches[
+                min(shared_anchors[linux_pos, windows_pos])[1]]
+            result.append((
+                windows_graph.functions[windows_pos],
+                linux_graph.functions[linux_pos],
+                windows_graph.functions[anchor_pos].ea, score))
+
+        result.sort(key=lambda pair: pair[0].ea)
+        return result
+
+    @timed('multiple_xrefs_search')
     def _multiple_xrefs_search(self):
         """Search for functions by comparing the caller functions of a not
         renamed function.
@@ -89,24 +660,36 @@ class Search(object):
         :return: Number of discovered functions.
         :rtype: int
         """
-        # TODO: Here is something wrong. It doesn't find a single function...
         print 'Multiple xrefs search...'
         count = 0
 
-        for windows_func in self.windows_db.functions.itervalues():
+        # Functions queued while this search is running are checked during
+        # the next pass.
+        queued_functions = sorted(
+            self._queued_functions, key=lambda func: func.ea)
+        self._queued_functions = set()
+        candidates = 0
+        intersections = 0
+        for windows_func in queued_functions:
             if windows_func.renamed:
                 continue
 
-            usable_xrefs_to = list(self._get_usable_xrefs_to(windows_func))
+            candidates += 1
+            # Sorted, so the result doesn't depend on the set order
+            usable_xrefs_to = sorted(
+                self._get_usable_xrefs_to(windows_func),
+                key=lambda func: func.ea)
             if not usable_xrefs_to:
                 continue
 
-            possible_functions = self.linux_db.get_function_by_symbol(
-                usable_xrefs_to.pop(0).symbol).xrefs_from
-            for win_xref_to in self._get_usable_xrefs_to(windows_func):
-                possible_functions.itersection_update(
+            possible_functions = set(self.linux_db.get_function_by_symbol(
+                usable_xrefs_to[0].symbol).xrefs_from)
+            possible_count = len(possible_functions)
+            for anchors, win_xref_to in enumerate(usable_xrefs_to, 1):
+                possible_functions.intersection_update(
                     self.linux_db.get_function_by_symbol(
                         win_xref_to.symbol).xrefs_from)
+                intersections += 1
 
                 if not possible_functions:
                     break
@@ -115,14 +698,202 @@ class Search(object):
                     continue
 
                 linux_func = possible_functions.pop()
-                windows_func.rename(linux_func)
-                count += 1 + self._single_xref_search(
-                    linux_func, windows_func)
+                if self._rename(windows_func, linux_func, Provenance(
+                        'multiple_xrefs', self.iteration,
+                        usable_xrefs_to[0].ea, possible_count,
+                        anchor_confidence(anchors))):
+                    count += 1
+
                 break
 
+        count += self._single_xref_search()
+
+        self.instrumentation.count('multiple_xrefs_candidates', candidates)
+        self.instrumentation.count(
+            'multiple_xrefs_intersections', intersections)
+        print 'Found {0} functions.'.format(count)
+        return count
+
+    @timed('structural_search')
+    def _structural_search(self):
+        """Discover functions by their position in the call graph.
+
+        Every not renamed function is indexed by the signatures of
+        :class:`graph_signatures.GraphSignatures`. A Windows function is
+        renamed if exactly one Linux and one Windows function share a
+        signature. Unlike :meth:`_multiple_xrefs_search`, this also finds
+        functions that are only called by not renamed functions.
+
+        :return: Number of discovered functions.
+        :rtype: int
+        """
+        print 'Structural search...'
+        known_symbols = set(
+            func.symbol for func in self.windows_db.functions.itervalues()
+            if func.renamed)
+
+        signatures = self._graph_signatures
+        linux_keys = dict(
+            (func, signatures.get_keys(func, known_symbols))
+            for func in self.linux_db.functions.itervalues()
+            if func.symbol not in known_symbols)
+        windows_keys = dict(
+            (func, signatures.get_keys(func, known_symbols))
+            for func in self.windows_db.functions.itervalues()
+            if not func.renamed)
+
+        matches = find_unique_matches(linux_keys, windows_keys)
+        matches.sort(key=lambda match: match[0].ea)
+        count = 0
+        for windows_func, linux_func, level in matches:
+            # The single xref search might have found one of them already
+            if (windows_func.renamed or
+                    self._is_known_symbol(linux_func.symbol)):
+                continue
+
+            if self._rename(windows_func, linux_func, Provenance(
+                    'structural', self.iteration, None, 1,
+                    CONFIDENCES[level])):
+                count += 1
+
+        count += self._single_xref_search()
+
+        self.instrumentation.count(
+            'structural_candidates', len(windows_keys))
+        self.instrumentation.count('structural_matches', len(matches))
+        print 'Found {0} functions.'.format(count)
+        return count
+
+    @timed('fuzzy_match_search')
+    def _fuzzy_match_search(self):
+        """Discover functions with similar, but not equal features.
+
+        The features of a function are its strings and the symbols of its
+        callers and callees that are known in both databases. A Windows
+        function is renamed if its most similar Linux function reaches the
+        threshold, is more similar than every other Linux function and is
+        not the most similar function of another Windows function.
+
+        :return: Number of discovered functions.
+        :rtype: int
+        """
+        print 'Fuzzy match search...'
+        windows_funcs = [
+            func for func in self.windows_db.functions.itervalues()
+            if not func.renamed]
+        known_symbols = set(
+            func.symbol for func in self.windows_db.functions.itervalues()
+            if func.renamed)
+
+        index = LshIndex()
+        linux_features = {}
+        for linux_func in self.linux_db.functions.itervalues():
+            if linux_func.symbol in known_symbols:
+                continue
+
+            features = self._get_features(
+                linux_func, known_symbols, self._get_linux_strings(linux_func))
+            if features:
+                index.add(linux_func, features)
+                linux_features[linux_func] = features
+
+        # {<Linux Function>: [(<Windows Function>, <score>,
+        #     <number of candidates>), ...], ...}
+        proposals = {}
+        threshold = self.fuzzy_threshold
+        compared = 0
+        for windows_func in windows_funcs:
+            features = self._get_features(windows_func, known_symbols)
+            if not features:
+                continue
+
+            candidates = index.candidates(features)
+            compared += len(candidates)
+            best_func = None
+            best_score = second_score = 0.0
+            for linux_func in candidates:
+                score = jaccard(features, linux_features[linux_func])
+                if score > best_score:
+                    best_func = linux_func
+                    second_score = best_score
+                    best_score = score
+                elif score > second_score:
+                    second_score = score
+
+            if best_score >= threshold and best_score > second_score:
+                proposals.setdefault(best_func, []).append(
+                    (windows_func, best_score, len(candidates)))
+
+        matches = sorted(
+            (proposed[0] + (linux_func,)
+                for linux_func, proposed in proposals.iteritems()
+                if len(proposed) == 1),
+            key=lambda match: match[0].ea)
+
+        count = 0
+        for windows_func, score, candidates, linux_func in matches:
+            # The single xref search might have found one of them already
+            if (windows_func.renamed or
+                    self._is_known_symbol(linux_func.symbol)):
+                continue
+
+            if self._rename(windows_func, linux_func, Provenance(
+                    'fuzzy', self.iteration, None, candidates, score)):
+                count += 1
+
+        count += self._single_xref_search()
+
+        self.instrumentation.count('fuzzy_candidates', compared)
+        self.instrumentation.count(
+            'fuzzy_conflicts', len(proposals) - len(matches))
         print 'Found {0} functions.'.format(count)
         return count
 
+    @staticmethod
+    def _get_features(func, known_symbols, strings=None):
+        """Return the features of a function for the fuzzy search.
+
+        :param Function func: The function.
+        :param set known_symbols: Symbols that are used in both databases.
+        :param frozenset strings: The strings of the function. Defaults to
+            :attr:`Function.strings`.
+        :rtype: set
+        """
+        if strings is None:
+            strings = func.strings
+
+        features = set(('string', string) for string in strings)
+        features.update(
+            ('callee', callee.symbol) for callee in func.xrefs_from
+            if callee.symbol in known_symbols)
+        features.update(
+            ('caller', caller.symbol) for caller in func.xrefs_to
+            if caller.symbol in known_symbols)
+        return features
+
+    def _get_linux_strings(self, linux_func):
+        """Return the strings of a Linux function that also exist in the
+        Windows database.
+
+        :param Function linux_func: The Linux function.
+        :rtype: frozenset
+        """
+        strings = linux_func.strings
+        if self._shared_texts is not None:
+            strings = strings & self._shared_texts
+
+        return strings
+
+    def _is_known_symbol(self, symbol):
+        """Return True if a Windows function has been renamed to the given
+        symbol."""
+        try:
+            self.windows_db.get_function_by_symbol(symbol)
+        except ValueError:
+            return False
+
+        return True
+
     @staticmethod
     def _get_usable_xrefs_to(windows_func):
         """Return all renamed functions that call the given function.
@@ -134,69 +905,261 @@ class Search(object):
             if func.renamed:
                 yield func
 
-    def _single_xref_search(self, linux_func, windows_func):
-        """Do an xref search in both directions.
+    @timed('single_xref_search')
+    def _single_xref_search(self):
+        """Do an xref search in both directions for all newly renamed
+        functions.
 
         If there is only one caller/callee left, it can be safely renamed.
+        All pairs that have been renamed since the last call are processed
+        as one batch. The pairs found by a batch form the next batch until
+        nothing is found anymore.
 
-        :param Function linux_func: A Linux function.
-        :param Function windows_func: Equivalent of the Linux function.
         :return: Number of discovered functions.
         :rtype: int
         """
-        xref_to_count = self._single_xref_to_search(linux_func, windows_func)
-        if xref_to_count > 0:
-            print 'Found {0} xref_to functions.'.format(xref_to_count)
+        linux_graph = self._linux_graph
+        windows_graph = self._windows_graph
+        linux_matches = self._linux_matches
+        windows_matches = self._windows_matches
+        count = 0
+        comparisons = 0
+        while self._new_pairs:
+            pairs = self._new_pairs
+            self._new_pairs = []
+            found, compared = find_single_neighbours(
+                linux_graph, windows_graph, linux_matches, windows_matches,
+                pairs)
+            comparisons += compared
+            for linux_pos, windows_pos, anchor_pos, neighbours in found:
+                # Several pairs might have found the same function
+                if (linux_matches[linux_pos] != NO_MATCH or
+                        windows_matches[windows_pos] != NO_MATCH):
+                    continue
 
-        xref_from_count = self._single_xref_from_search(
-            linux_func, windows_func)
-        if xref_from_count > 0:
-            print 'Found {0} xref_from functions.'.format(xref_from_count)
+                self._rename(
+                    windows_graph.functions[windows_pos],
+                    linux_graph.functions[linux_pos],
+                    Provenance(
+                        'single_xref', self.iteration,
+                        windows_graph.functions[anchor_pos].ea, neighbours,
+                        anchor_confidence(neighbours)))
+                count += 1
 
-        return xref_to_count + xref_from_count
+        self.instrumentation.count('single_xref_comparisons', comparisons)
+        if count > 0:
+            print 'Found {0} xref functions.'.format(count)
 
-    def _single_xref_to_search(self, linux_func, windows_func):
-        """.. seealso:: :meth:`_single_xref_search`"""
-        return self._single_xref_attr_search(
-            'xrefs_to', linux_func, windows_func)
+        return count
+
+
+def create_discover_database(
+        cleaned_up_path, discovered_path, instrumentation_path=None,
+        processes=1, fuzzy_threshold=None, match_cache_path=None,
+        known_functions=(), checkpoint_path=None, iteration_log_path=None):
+    """Discover Windows functions and save the result.
 
-    def _single_xref_from_search(self, linux_func, windows_func):
-        """.. seealso:: :meth:`_single_xref_search`"""
-        return self._single_xref_attr_search(
-            'xrefs_from', linux_func, windows_func)
+    :param str cleaned_up_path: Path of the cleaned up databases.
+    :param str discovered_path: Path to save the discovered database at.
+    :param str instrumentation_path: If given, the timers and counters of
+        the search are saved as JSON file at this path.
+    :param int processes: Number of processes that compute the string sets.
+    :param float fuzzy_threshold: Minimum similarity of fuzzy matches. The
+        fuzzy search is disabled if None.
+    :param str match_cache_path: If given, Windows functions that are known
+        from previous builds are renamed before the search starts and the
+        cache is updated with the result afterwards.
+    :param iterable known_functions: Tuples with the ea of a Windows
+        function, its Linux symbol and optionally its
+        :class:`provenance.Provenance`, e.g. the still valid records of a
+        previous run. They are renamed before the search starts and keep
+        their provenance.
+    :param str checkpoint_path: If given, the state of the search is saved
+        to this file after every iteration. If the file contains a
+        checkpoint of an interrupted search of the same databases, that
+        search is resumed from its discovered database instead of starting
+        from scratch. The known functions and the match cache are ignored
+        in that case.
+    :param str iteration_log_path: If given, every finished iteration of
+        the discover loop is written to this file as a single JSON line
+        while the search is running. A resumed search appends to the log.
+    :return: All found Windows functions.
+    :rtype: tuple
+    """
+    print 'Loading cleaned up database...'
+    linux_db, windows_db = open_databases(cleaned_up_path)
+    print 'Database has been loaded!'
 
-    def _single_xref_attr_search(self, attr, linux_func, windows_func):
-        """.. seealso:: :meth:`_single_xref_search`"""
-        length = len(linux_func.xref_to_eas)
-        if length == 0:
-            return 0
+    database_digest = None
+    if checkpoint_path is not None:
+        database_digest = get_database_digest(cleaned_up_path)
 
-        if length != len(windows_func.xref_to_eas):
-            return 0
+    state, records = _load_resume_state(
+        linux_db, windows_db, discovered_path, checkpoint_path,
+        database_digest)
+    log_file = None
+    if iteration_log_path is not None:
+        log_file = open(iteration_log_path, 'w' if state is None else 'a')
 
-        result = None
-        key = lambda func: func.symbol
-        for linux_xref, windows_xref in zip(
-                sorted(getattr(linux_func, attr), key=key),
-                sorted(getattr(windows_func, attr), key=key)):
-            if windows_xref.renamed:
-                if windows_xref.symbol != linux_xref.symbol:
-                    return 0
+    instrumentation = Instrumentation(log_file)
+    match_cache = None
+    if state is not None:
+        rename_known_functions(linux_db, windows_db, records)
+        previous_provenance = _get_known_provenance(records)
+        instrumentation.count('resumed_functions', len(records))
+        print 'Resuming after iteration {0} with {1} functions.'.format(
+            state.iteration, len(records))
+    else:
+        known_functions = tuple(known_functions)
+        count = rename_known_functions(
+            linux_db, windows_db, known_functions)
+        previous_provenance = _get_known_provenance(known_functions)
+        if count:
+            instrumentation.count('known_functions', count)
+            print 'Renamed {0} already known functions.'.format(count)
 
-                continue
+        if match_cache_path is not None:
+            match_cache = MatchCache.load(match_cache_path)
+            hits = match_cache.apply(linux_db, windows_db)
+            previous_provenance.update(hits)
+            instrumentation.count('match_cache_hits', len(hits))
+            print 'Renamed {0} functions from the match cache.'.format(
+                len(hits))
 
-            if result is not None:
-                # Multiple not renamed xrefs
-                return 0
+    checkpoint_writer = None
+    if checkpoint_path is not None:
+        checkpoint_writer = CheckpointWriter(
+            checkpoint_path, len(linux_db.functions),
+            len(windows_db.functions), database_digest, state is not None)
 
-            result = (linux_xref, windows_xref)
+    # The results are streamed to the discovered database while they are
+    # found, so an interrupted search doesn't lose them. A resumed search
+    # appends to the results of the interrupted one instead of writing them
+    # again, so they survive another interruption.
+    try:
+        with ResultWriter(
+                discovered_path, keep=0 if state is None
+                else state.result_count) as writer:
+            search = Search(
+                linux_db, windows_db, instrumentation, processes,
+                fuzzy_threshold, writer, checkpoint_writer=checkpoint_writer,
+                previous_provenance=previous_provenance)
+            if state is not None:
+                search.restore(state)
 
-        if result is not None:
-            linux_xref, windows_xref = result
-            windows_xref.rename(linux_xref)
-            return 1 + self._single_xref_from_search(linux_xref, windows_xref)
+            result = tuple(search.discover())
+    finally:
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()
 
-        return 0
+        if log_file is not None:
+            log_file.close()
+
+    print 'Saved {0} functions to the discovered database!'.format(
+        writer.count)
+    if match_cache is not None:
+        match_cache.update(windows_db, search.provenance)
+        match_cache.save(match_cache_path)
+
+    if instrumentation_path is not None:
+        instrumentation.save(instrumentation_path)
+
+    return result
+
+
+def _load_resume_state(
+        linux_db, windows_db, discovered_path, checkpoint_path,
+        database_digest):
+    """Return the checkpoint of an interrupted search and its results.
+
+    :param Database linux_db: Linux database.
+    :param Database windows_db: Windows database.
+    :param str discovered_path: Path of the discovered database of the
+        interrupted search.
+    :param str checkpoint_path: Path of the checkpoint file or None.
+    :param str database_digest: Digest of the cleaned up database. A
+        checkpoint of another database is ignored.
+    :return: A tuple with the last checkpoint and a list with the results
+        that have been written until then ((<ea>, <symbol>,
+        <provenance.Provenance>), ...). The checkpoint is None if there is
+        nothing to resume.
+    :rtype: tuple
+    """
+    if checkpoint_path is None or not os.path.isfile(discovered_path):
+        return None, []
+
+    state = load_checkpoint(
+        checkpoint_path, len(linux_db.functions), len(windows_db.functions),
+        database_digest)
+    if state is None:
+        return None, []
+
+    records = list(islice(read_records(discovered_path), state.result_count))
+
+    # The discovered database doesn't belong to the checkpoint
+    if len(records) != state.result_count:
+        return None, []
+
+    return state, records
+
+
+def rename_known_functions(linux_db, windows_db, known_functions):
+    """Rename Windows functions whose Linux symbols are already known.
+
+    :param Database linux_db: Linux database.
+    :param Database windows_db: Windows database.
+    :param iterable known_functions: Tuples that start with the ea of a
+        Windows function and its Linux symbol, e.g. the records of a
+        discovered database.
+    :return: Number of renamed functions.
+    :rtype: int
+    """
+    count = 0
+    for known in sorted(known_functions):
+        ea, symbol = known[:2]
+        windows_func = windows_db.functions.get(ea)
+        if windows_func is None or windows_func.renamed:
+            continue
+
+        try:
+            linux_func = linux_db.get_function_by_symbol(symbol)
+        except ValueError:
+            continue
+
+        windows_func.rename(linux_func)
+        count += 1
+
+    return count
+
+
+def _get_known_provenance(known_functions):
+    """Return the provenance of the known functions that have one.
+
+    :param iterable known_functions: Tuples with the ea of a Windows
+        function, its Linux symbol and optionally its
+        :class:`provenance.Provenance` or None.
+    :return: {<Windows function ea>: <provenance.Provenance>, ...}
+    :rtype: dict
+    """
+    return dict(
+        (known[0], known[2]) for known in known_functions
+        if len(known) > 2 and known[2] is not None)
+
+
+def _update_best(best, position, candidate, score):
+    """Remember the candidate with the highest score of a function.
+
+    :param dict best: {<position>: [<score>, <best candidate or None if
+        several candidates have that score>], ...}
+    :param int position: Position of the function.
+    :param int candidate: Position of the candidate.
+    :param int score: Score of the candidate.
+    """
+    current = best.get(position)
+    if current is None or score > current[0]:
+        best[position] = [score, candidate]
+    elif score == current[0]:
+        current[1] = None
 
 
 # =============================================================================
@@ -208,23 +1171,12 @@ def main():
     if cleaned_up_path is None:
         return
 
-    print 'Loading cleaned up database...'
-    with open(cleaned_up_path, 'rb') as f:
-        linux_db, windows_db = pickle.load(f)
-
-    print 'Database has been loaded!'
-
     discovered_path = AskFile(
         1, '*.db', 'Select a destination for the discovered database')
     if discovered_path is None:
         return
 
-    result = tuple(Search(linux_db, windows_db).discover())
-    print 'Saving discovered database...'
-    with open(discovered_path, 'wb') as f:
-        pickle.dump(result, f)
-
-    print 'Database has been saved!'
+    create_discover_database(cleaned_up_path, discovered_path)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -3,30 +3,15 @@
 # =============================================================================
 # Python
 import cPickle as pickle
+import gc
+import mmap
+from bisect import bisect_left
+from collections import Mapping
 
-# IDA
-try:
-    import idaapi
-
-    from idautils import Strings
-    from idautils import Functions
-    from idautils import XrefsTo
-    from idautils import FuncItems
-    from idautils import XrefsFrom
-
-    from idc import GetFunctionName
-    from idc import GetFunctionAttr
-    from idc import GetFuncOffset
-    from idc import FUNCATTR_START
-
-    CALL_JUMP_FLAGS = (
-        idaapi.fl_CF,
-        idaapi.fl_CN,
-        idaapi.fl_JF,
-        idaapi.fl_JN,
-    )
-except ImportError:
-    print 'Script has been called outside of IDA.'
+# discover_win
+import storage
+from backends import IdaBackend
+from set_cache import SetCache
 
 
 # =============================================================================
@@ -35,61 +20,71 @@ except ImportError:
 class Database(object):
     """Create a pickle-able database of the analysed binary."""
 
-    def __init__(self):
-        """Initialize the database."""
-        # {<function ea>: <Function object>, ...}
-        self.functions = {}
+    def __init__(self, backend=None):
+        """Initialize the database by analysing a binary.
 
-        # {<string ea>: <str or None>, ...}
-        self.strings = {}
+        :param backends.Backend backend: The backend that provides the
+            binary. Defaults to the binary that is currently opened in IDA.
+        """
+        if backend is None:
+            backend = IdaBackend()
 
         print 'Creating database...'
-        self._fill_strings()
-        self._fill_functions()
-        self._add_function_strings()
+        self._fill(*backend.extract())
         print 'Database has been created!'
 
-    def _fill_strings(self):
-        """Fill the ``strings`` dict."""
-        strings = self.strings
-        for string in Strings():
-            try:
-                strings[string.ea] = str(string)
-            except TypeError:
-                # I forgot when this can happen...
-                continue
-
-    def _fill_functions(self):
-        """Fill the ``functions`` dict."""
-        functions = self.functions
-        for ea in Functions():
-            if GetFunctionName(ea).startswith('_ZThn'):
-                continue
-
-            functions[ea] = Function(self, ea)
+    def _fill(self, strings, functions):
+        """Fill the database with already analysed data.
 
-    def _add_function_strings(self):
-        """Add the strings to the functions that use them."""
-        for ea in self.strings.keys():
-            references = tuple(XrefsTo(ea))
-            del_count = 0
-            for xref in references:
-                func_ea = GetFunctionAttr(xref.frm, FUNCATTR_START)
+        :param dict strings: {<string ea>: <str>, ...}
+        :param iterable functions: Tuples with the arguments of
+            :class:`Function` except the database.
+        """
+        # {<string ea>: <interned str>, ...}
+        # Equal strings of both databases share a single object.
+        self.strings = dict(
+            (ea, intern(string)) for ea, string in strings.iteritems())
 
-                # Is the reference not a function?
-                # Actually, we should compare func_ea == -1, but this seems to
-                # be buggy. The -1 is probably returned as an unsigned int,
-                # which results in 4294967295.
-                if func_ea == 4294967295:
-                    del_count += 1
-                    continue
+        # {<function ea>: <Function object>, ...}
+        self.functions = dict(
+            (args[0], Function(self, *args)) for args in functions)
+
+        self._build_indexes()
+
+    def __getstate__(self):
+        """Return the state to pickle without the lookup indexes."""
+        state = self.__dict__.copy()
+        del state['_symbols']
+        del state['_string_eas']
+        del state['_string_functions']
+        del state['set_cache']
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state and rebuild the lookup indexes."""
+        self.__dict__.update(state)
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """Build the lookup indexes of the database."""
+        #: Derived sets of the functions
+        self.set_cache = SetCache()
+
+        # {<symbol>: [<Function object>, ...], ...}
+        self._symbols = symbols = {}
+        for function in self.functions.itervalues():
+            symbols.setdefault(function.symbol, []).append(function)
 
-                self.get_function(func_ea).add_string(ea)
+        # {<interned str>: set([<string ea>, ...]), ...}
+        self._string_eas = string_eas = {}
+        for ea, string in self.strings.iteritems():
+            string_eas.setdefault(string, set()).add(ea)
 
-            # No need to keep strings without a reference or without a
-            # reference to a function.
-            if del_count == len(references):
-                del self.strings[ea]
+        # {<string ea>: set([<Function object>, ...]), ...}
+        self._string_functions = string_functions = {}
+        for function in self.functions.itervalues():
+            for ea in function.string_eas:
+                string_functions.setdefault(ea, set()).add(function)
 
     def get_function_by_symbol(self, symbol):
         """Retrieve a function by its symbol.
@@ -98,35 +93,99 @@ class Database(object):
         :rtype: Function
         :raise ValueError: Raised when the symbol was not found.
         """
-        for function in self.functions.itervalues():
-            if function.symbol == symbol:
-                return function
+        try:
+            return self._symbols[symbol][0]
+        except KeyError:
+            raise ValueError('Symbol "{0}" not found.'.format(symbol))
+
+    def _update_symbol(self, function, old_symbol):
+        """Move a function to its new symbol in the symbol index.
+
+        :param Function function: The function that has been renamed.
+        :param str old_symbol: Symbol of the function before renaming it.
+        """
+        symbols = self._symbols
+        functions = symbols[old_symbol]
+        functions.remove(function)
+        if not functions:
+            del symbols[old_symbol]
 
-        raise ValueError('Symbol "{0}" not found.'.format(symbol))
+        symbols.setdefault(function.symbol, []).append(function)
 
     def get_function(self, ea):
         """Retrieve a function by its ea value."""
         return self.functions[ea]
 
+    def iter_renamed_functions(self):
+        """Iterate over the renamed functions in the order of their eas.
+
+        :rtype: generator
+        """
+        functions = self.functions
+        for ea in sorted(functions):
+            function = functions[ea]
+            if function.renamed:
+                yield function
+
+    def iter_string_sets(self):
+        """Iterate over the string sets of the functions that use strings.
+
+        :return: A generator that yields tuples with the position of the
+            function in the sorted list of function eas and the frozenset
+            of its strings in the order of the positions.
+        :rtype: generator
+        """
+        functions = self.functions
+        for position, ea in enumerate(sorted(functions)):
+            function = functions[ea]
+            if function.string_eas:
+                yield position, function.strings
+
     def remove_string(self, ea):
         """Remove a string from the database."""
-        del self.strings[ea]
-        for function in self.functions.itervalues():
+        string = self.strings.pop(ea)
+        eas = self._string_eas[string]
+        eas.discard(ea)
+        if not eas:
+            del self._string_eas[string]
+
+        for function in self._string_functions.pop(ea, ()):
             function.remove_string(ea)
 
+    def _add_string_function(self, function, ea):
+        """Add a function to the functions that use a string.
+
+        :param Function function: The function that uses the string now.
+        :param int ea: Address of the string.
+        """
+        self._string_functions.setdefault(ea, set()).add(function)
+
+    def _remove_string_function(self, function, ea):
+        """Remove a function from the functions that use a string.
+
+        :param Function function: The function that doesn't use the string
+            anymore.
+        :param int ea: Address of the string.
+        """
+        functions = self._string_functions.get(ea)
+        if functions is None:
+            return
+
+        functions.discard(function)
+        if not functions:
+            del self._string_functions[ea]
+
     def get_string(self, ea):
         """Retrieve a string by its ea value."""
         return self.strings[ea]
 
     def save(self, file_path):
-        """Pickle the database and save it to the given path.
+        """Save the database to the given path.
 
         :param str file_path: Path to save the database at.
         """
         print 'Saving database...'
-        with open(file_path, 'wb') as f:
-            pickle.dump(self, f)
-
+        save_databases(file_path, (self,))
         print 'Database has been saved!'
 
     @staticmethod
@@ -134,41 +193,225 @@ class Database(object):
         """Load the database from the given file path.
 
         :param str file_path: Path of the saved database.
+        :rtype: Database
         """
         print 'Loading database...'
-        with open(file_path, 'rb') as f:
-            result = pickle.load(f)
-
+        result, = load_databases(file_path)
         print 'Database has been loaded!'
         return result
 
-    def cleanup(self, other):
+    @classmethod
+    def from_data(cls, strings, functions):
+        """Create a database from already analysed data without IDA.
+
+        :param dict strings: {<string ea>: <str>, ...}
+        :param iterable functions: Tuples with the arguments of
+            :class:`Function` except the database.
+        :rtype: Database
+        """
+        database = cls.__new__(cls)
+        database._fill(strings, functions)
+        return database
+
+    def cleanup(self, other, symmetric=True):
         """Compare this database with the given one and remove all platform
         specific strings.
 
         :param Database other: Database to compare to.
+        :param bool symmetric: If False, only the strings of the other
+            database are removed and this database isn't changed. That
+            allows to compare it with several other databases.
         """
         print 'Cleaning up first database...'
         self._cleanup(other)
-        print 'Cleaning up second database...'
-        other._cleanup(self)
+        if symmetric:
+            print 'Cleaning up second database...'
+            other._cleanup(self)
+
         print 'Databases have been cleaned up!'
 
     def _cleanup(self, other):
-        self_strings = self.strings.values()
-        for ea, string in other.strings.items():
-            if string not in self_strings:
+        """Remove all strings from the other database that this database
+        doesn't have."""
+        self_strings = self._string_eas.viewkeys()
+        other_string_eas = other._string_eas
+        for string in other_string_eas.viewkeys() - self_strings:
+            for ea in tuple(other_string_eas[string]):
                 other.remove_string(ea)
 
+    def update(self, backend=None):
+        """Update the database after the binary has changed.
+
+        Only added functions, functions whose checksum or strings changed
+        and functions that call an added function are extracted again. The
+        xrefs of their neighbours are updated in place.
+
+        :param backends.Backend backend: The backend that provides the
+            binary. Defaults to the binary that is currently opened in IDA.
+        :return: The changes of the database.
+        :rtype: DatabaseChanges
+        """
+        if backend is None:
+            backend = IdaBackend()
+
+        print 'Updating database...'
+        strings, checksums = backend.extract_summary()
+        functions = self.functions
+        removed = functions.viewkeys() - checksums.viewkeys()
+        added = checksums.viewkeys() - functions.viewkeys()
+        changed = set(
+            ea for ea, checksum in checksums.iteritems()
+            if ea in functions and functions[ea].checksum != checksum)
+
+        # Strings that changed or don't exist anymore
+        for ea, string in self.strings.iteritems():
+            if strings.get(ea) != string:
+                changed.update(
+                    function.ea
+                    for function in self._string_functions.get(ea, ()))
+
+        changed -= removed
+        extracted = added | changed
+        if added:
+            extracted.update(backend.find_callers(added))
+            extracted -= removed
+
+        # Results of functions that share a string with a changed function
+        # might depend on it.
+        affected = set(removed) | added | changed
+        shared_string_eas = set()
+        for ea in affected - added:
+            shared_string_eas.update(functions[ea].string_eas)
+
+        stale_symbols = set(functions[ea].symbol for ea in removed | changed)
+        for ea in removed:
+            function = functions.pop(ea)
+            for caller in function.xref_to_eas:
+                if caller in functions:
+                    functions[caller].remove_xref_from(ea)
+                    affected.add(caller)
+
+            for callee in function.xref_from_eas:
+                if callee in functions:
+                    functions[callee].remove_xref_to(ea)
+                    affected.add(callee)
+
+        rows = backend.extract(extracted)[1] if extracted else ()
+        for (ea, symbol, demangled_name, string_eas, xref_to_eas,
+                xref_from_eas, renamed, fingerprint, checksum) in rows:
+            function = functions.get(ea)
+            if function is None:
+                functions[ea] = Function(
+                    self, ea, symbol, demangled_name, string_eas, (),
+                    xref_from_eas, renamed, fingerprint, checksum)
+                continue
+
+            for callee in function.xref_from_eas:
+                if callee in functions:
+                    functions[callee].remove_xref_to(ea)
+                    affected.add(callee)
+
+            function.update(
+                symbol, demangled_name, string_eas, xref_from_eas,
+                fingerprint, checksum)
+
+        # Callers are only known after all functions have been updated
+        for row in rows:
+            ea = row[0]
+            for callee in row[5]:
+                functions[callee].add_xref_to(ea)
+                affected.add(callee)
+
+            affected.add(ea)
+            shared_string_eas.update(row[3])
+
+        referenced = set()
+        for function in functions.itervalues():
+            referenced.update(function.string_eas)
+
+        self.strings = dict(
+            (ea, intern(strings[ea])) for ea in referenced)
+        self._build_indexes()
+
+        for ea in shared_string_eas:
+            affected.update(
+                function.ea
+                for function in self._string_functions.get(ea, ()))
+
+        stale_symbols.update(
+            functions[ea].symbol for ea in affected if ea in functions)
+        changes = DatabaseChanges(
+            added, removed, changed, affected, stale_symbols)
+        print 'Added: {0}, removed: {1}, changed: {2}, stale: {3}'.format(
+            len(added), len(removed), len(changed), len(affected))
+        return changes
+
+
+class DatabaseChanges(object):
+    """The changes of a database found by :meth:`Database.update`."""
+
+    def __init__(self, added, removed, changed, stale_eas, stale_symbols):
+        """Initialize the object.
+
+        :param set added: Eas of the added functions.
+        :param set removed: Eas of the removed functions.
+        :param set changed: Eas of the changed functions.
+        :param set stale_eas: Eas of all functions whose discovery results
+            might have changed, including the removed ones.
+        :param set stale_symbols: Old and new symbols of these functions.
+        """
+        self.added = set(added)
+        self.removed = set(removed)
+        self.changed = set(changed)
+        self.stale_eas = set(stale_eas)
+        self.stale_symbols = set(stale_symbols)
+
+    def __nonzero__(self):
+        """Return True if any function has been added, removed or
+        changed."""
+        return bool(self.added or self.removed or self.changed)
+
 
 class Function(object):
-    """Represents a function."""
+    """Represents a function.
+
+    Hundreds of thousands of functions are loaded at the same time, so they
+    don't have a ``__dict__`` and store their eas in sorted tuples. The sets
+    that are derived from the eas are kept in the
+    :class:`set_cache.SetCache` of the database.
+    """
+
+    __slots__ = (
+        'database',
+        'ea',
+        'symbol',
+        'demangled_name',
+        'string_eas',
+        'xref_to_eas',
+        'xref_from_eas',
+        'renamed',
+        'fingerprint',
+        'checksum',
+    )
 
-    def __init__(self, database, ea):
+    def __init__(
+            self, database, ea, symbol, demangled_name, string_eas=(),
+            xref_to_eas=(), xref_from_eas=(), renamed=False,
+            fingerprint=None, checksum=None):
         """Initialize the object.
 
         :param Database database: Database that stores this function.
         :param int ea: Start address of the function.
+        :param str symbol: Symbol of the function.
+        :param str demangled_name: Demangled name of the function.
+        :param iterable string_eas: Addresses of the used strings.
+        :param iterable xref_to_eas: Addresses of the calling functions.
+        :param iterable xref_from_eas: Addresses of the called functions.
+        :param bool renamed: Whether the function has been renamed.
+        :param str fingerprint: Fingerprint of the function's content. See
+            :func:`extraction.create_fingerprint`.
+        :param str checksum: Checksum that changes whenever the function
+            changes in the binary.
         """
         #: Database that stores this function
         self.database = database
@@ -177,115 +420,552 @@ class Function(object):
         self.ea = ea
 
         #: Symbol of this function
-        self.symbol = GetFunctionName(ea)
+        self.symbol = symbol
 
         #: Demangled name of this function
-        self.demangled_name = GetFuncOffset(ea)
+        self.demangled_name = demangled_name
 
-        #: All strings that are used in this function
-        self.string_eas = set()
-        self._strings = None
+        #: All strings that are used in this function (sorted tuple)
+        self.string_eas = _sorted_eas(string_eas)
 
-        #: All function addresses that call this function
-        self.xref_to_eas = set(self._get_xref_to_calls(ea))
-        self._xrefs_to = None
+        #: All function addresses that call this function (sorted tuple)
+        self.xref_to_eas = _sorted_eas(xref_to_eas)
 
-        #: All function addresses that are called by this function
-        self.xref_from_eas = set(self._get_xref_from_calls(ea))
-        self._xrefs_from = None
+        #: All function addresses that are called by this function (sorted
+        #: tuple)
+        self.xref_from_eas = _sorted_eas(xref_from_eas)
 
         #: Boolean that indicated if the function has been renamed
-        self.renamed = False
+        self.renamed = renamed
+
+        #: Fingerprint of the function's content or None if it is unknown
+        self.fingerprint = fingerprint
+
+        #: Checksum of the function in the binary or None if it is unknown
+        self.checksum = checksum
+
+    def __getstate__(self):
+        """Return the state to pickle."""
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        """Restore the pickled state.
+
+        Functions that have been pickled by older versions stored their eas
+        in sets, cached their derived sets and had no fingerprint and
+        checksum.
+        """
+        self.fingerprint = None
+        self.checksum = None
+        for name, value in state.iteritems():
+            if name in ('_strings', '_xrefs_to', '_xrefs_from'):
+                continue
+
+            if name in ('string_eas', 'xref_to_eas', 'xref_from_eas'):
+                value = _sorted_eas(value)
+
+            setattr(self, name, value)
 
     def add_string(self, ea):
         """Add a string to the function."""
-        self.string_eas.add(ea)
+        self.string_eas = _insert_ea(self.string_eas, ea)
+        self.database._add_string_function(self, ea)
+        self.database.set_cache.invalidate(self, ('strings',))
 
     def remove_string(self, ea):
         """Remove a string from the function."""
-        self.string_eas.discard(ea)
+        self.string_eas = _remove_ea(self.string_eas, ea)
+        self.database._remove_string_function(self, ea)
+        self.database.set_cache.invalidate(self, ('strings',))
+
+    def add_xref_to(self, ea):
+        """Add a calling function."""
+        self.xref_to_eas = _insert_ea(self.xref_to_eas, ea)
+        self.database.set_cache.invalidate(self, ('xrefs_to',))
+
+    def remove_xref_to(self, ea):
+        """Remove a calling function."""
+        self.xref_to_eas = _remove_ea(self.xref_to_eas, ea)
+        self.database.set_cache.invalidate(self, ('xrefs_to',))
+
+    def remove_xref_from(self, ea):
+        """Remove a called function."""
+        self.xref_from_eas = _remove_ea(self.xref_from_eas, ea)
+        self.database.set_cache.invalidate(self, ('xrefs_from',))
+
+    def update(self, symbol, demangled_name, string_eas, xref_from_eas,
+               fingerprint, checksum):
+        """Replace the extracted data of the function after it changed in
+        the binary. The callers are kept, because they are not part of the
+        function itself.
+
+        :param str symbol: Symbol of the function.
+        :param str demangled_name: Demangled name of the function.
+        :param iterable string_eas: Addresses of the used strings.
+        :param iterable xref_from_eas: Addresses of the called functions.
+        :param str fingerprint: Fingerprint of the function's content.
+        :param str checksum: Checksum of the function in the binary.
+        """
+        self.symbol = symbol
+        self.demangled_name = demangled_name
+        self.string_eas = _sorted_eas(string_eas)
+        self.xref_from_eas = _sorted_eas(xref_from_eas)
+        self.database.set_cache.invalidate(self, ('strings', 'xrefs_from'))
+        self.renamed = False
+        self.fingerprint = fingerprint
+        self.checksum = checksum
 
     def rename(self, linux_func):
         """Rename the function to its Linux equivalent.
 
         :param Function linux_func: The Linux equivalent of this function.
         """
+        old_symbol = self.symbol
         self.symbol = linux_func.symbol
         self.demangled_name = linux_func.demangled_name
         self.renamed = True
+        self.database._update_symbol(self, old_symbol)
 
     @property
     def strings(self):
         """Return all strings contained by this function.
 
-        :rtype: set
+        :rtype: frozenset
         """
-        if self._strings is None:
-            database = self.database
-            self._strings = set(
-                database.get_string(ea) for ea in self.string_eas)
+        cache = self.database.set_cache
+        strings = cache.get('strings', self)
+        if strings is None:
+            get_string = self.database.get_string
+            strings = cache.put(
+                'strings', self, (get_string(ea) for ea in self.string_eas))
 
-        return self._strings
+        return strings
 
     @property
     def xrefs_to(self):
         """Return all functions that call this function.
 
-        :rtype: set
+        :rtype: frozenset
         """
-        if self._xrefs_to is None:
-            database = self.database
-            self._xrefs_to = set(
-                database.get_function(ea) for ea in self.xref_to_eas)
+        cache = self.database.set_cache
+        xrefs = cache.get('xrefs_to', self)
+        if xrefs is None:
+            get_function = self.database.get_function
+            xrefs = cache.put(
+                'xrefs_to', self,
+                (get_function(ea) for ea in self.xref_to_eas))
 
-        return self._xrefs_to
+        return xrefs
 
     @property
     def xrefs_from(self):
         """Return all functions that are called by this function.
 
-        :rtype: set
+        :rtype: frozenset
         """
-        if self._xrefs_from is None:
-            database = self.database
-            self._xrefs_from = set(
-                database.get_function(ea) for ea in self.xref_from_eas)
+        cache = self.database.set_cache
+        xrefs = cache.get('xrefs_from', self)
+        if xrefs is None:
+            get_function = self.database.get_function
+            xrefs = cache.put(
+                'xrefs_from', self,
+                (get_function(ea) for ea in self.xref_from_eas))
 
-        return self._xrefs_from
+        return xrefs
 
-    @staticmethod
-    def _get_xref_to_calls(ea):
-        """Return a generator to iterate over all function addresses which
-        call the given function.
 
-        :param int ea: Start address of the function.
+class MappedDatabase(Database):
+    """A read-only database backed by a memory-mapped database file.
+
+    Functions are created on demand and resolve their strings and xrefs
+    straight from the mapped file. Renaming functions is still possible,
+    but the new names only exist in memory.
+    """
+
+    def __init__(self, layout, file_path=None, position=0):
+        """Initialize the database.
+
+        :param storage.DatabaseLayout layout: Layout of the database in the
+            mapped file.
+        :param str file_path: Path of the mapped file.
+        :param int position: Position of the database in the mapped file.
         """
-        for xref in XrefsTo(ea):
-            if xref.type not in CALL_JUMP_FLAGS:
-                continue
+        self._layout = layout
 
-            if GetFunctionName(xref.to).startswith('_ZThn'):
-                continue
+        #: Path of the mapped file, so other processes can map it as well
+        self.file_path = file_path
 
-            yield xref.to
+        #: Position of the database in the mapped file
+        self.position = position
+        self.functions = _MappedFunctions(self)
+        self.strings = _MappedStrings(layout)
 
-    def _get_xref_from_calls(self, ea):
-        """Return a generator to iterate over all function address that are
-        called in the given function address.
+        # {<symbol>: [<function index>, ...], ...}
+        # Created on the first symbol lookup.
+        self._symbols = None
 
-        :param int ea: Start address of the function.
+        #: Derived sets of the functions
+        self.set_cache = SetCache()
+
+    def __getstate__(self):
+        raise TypeError('A mapped database cannot be pickled.')
+
+    @property
+    def layout(self):
+        """Return the layout of the database in the mapped file.
+
+        :rtype: storage.DatabaseLayout
+        """
+        return self._layout
+
+    def _get_symbols(self):
+        """Return the symbol index and create it if necessary."""
+        symbols = self._symbols
+        if symbols is None:
+            self._symbols = symbols = {}
+            functions = self.functions
+            for index, symbol in enumerate(self._layout.unpack_blob('symbol')):
+                # Renamed functions have a different symbol in memory
+                function = functions.get_loaded(index)
+                if function is not None:
+                    symbol = function.symbol
+
+                symbols.setdefault(symbol, []).append(index)
+
+        return symbols
+
+    def get_function_by_symbol(self, symbol):
+        """Retrieve a function by its symbol.
+
+        :param str symbol: Symbol of the function.
+        :rtype: MappedFunction
+        :raise ValueError: Raised when the symbol was not found.
+        """
+        try:
+            index = self._get_symbols()[symbol][0]
+        except KeyError:
+            raise ValueError('Symbol "{0}" not found.'.format(symbol))
+
+        return self.functions.get_by_index(index)
+
+    def _update_symbol(self, function, old_symbol):
+        """Move a function to its new symbol in the symbol index.
+
+        :param MappedFunction function: The function that has been renamed.
+        :param str old_symbol: Symbol of the function before renaming it.
+        """
+        symbols = self._symbols
+        if symbols is None:
+            return
+
+        indexes = symbols[old_symbol]
+        indexes.remove(function.index)
+        if not indexes:
+            del symbols[old_symbol]
+
+        symbols.setdefault(function.symbol, []).append(function.index)
+
+    def iter_renamed_functions(self):
+        """.. seealso:: :meth:`Database.iter_renamed_functions`
+
+        Only the renamed functions are created. The renamed flags are taken
+        from the mapped file, unless the function has been loaded and
+        renamed in memory.
+        """
+        functions = self.functions
+        indexes = set(
+            index for index, renamed in enumerate(
+                self._layout.unpack('function_renamed', '?'))
+            if renamed)
+        indexes.update(
+            index for index, function in functions._loaded.iteritems()
+            if function.renamed)
+        for index in sorted(indexes):
+            yield functions.get_by_index(index)
+
+    def iter_string_sets(self):
+        """.. seealso:: :meth:`Database.iter_string_sets`
+
+        The sets are taken straight from the string references of the
+        mapped file, so no function is created. The positions are the
+        function indexes.
+        """
+        layout = self._layout
+        offsets = layout.unpack('string_ref_offsets', 'I')
+        refs = layout.unpack('string_refs', 'I')
+        string_texts = layout.unpack('string_texts', 'I')
+        texts = layout.unpack_blob('text')
+        for index in xrange(len(offsets) - 1):
+            start = offsets[index]
+            stop = offsets[index + 1]
+            if start != stop:
+                yield index, frozenset(
+                    texts[string_texts[ref]] for ref in refs[start:stop])
+
+    def remove_string(self, ea):
+        """Raise a TypeError, because the database is read-only."""
+        raise TypeError('A mapped database is read-only.')
+
+    def cleanup(self, other, symmetric=True):
+        """Raise a TypeError, because the database is read-only."""
+        raise TypeError('A mapped database is read-only.')
+
+    def update(self, backend=None):
+        """Raise a TypeError, because the database is read-only."""
+        raise TypeError('A mapped database is read-only.')
+
+
+class MappedFunction(Function):
+    """A function of a :class:`MappedDatabase`."""
+
+    __slots__ = ('index',)
+
+    def __init__(self, database, index):
+        """Initialize the object.
+
+        :param MappedDatabase database: Database that stores this function.
+        :param int index: Index of the function in the mapped file.
+        """
+        layout = database._layout
+
+        #: Database that stores this function
+        self.database = database
+
+        #: Index of this function in the mapped file
+        self.index = index
+
+        #: Start address of this function
+        self.ea = layout.item('function_eas', 'Q', index)
+
+        #: Symbol of this function
+        self.symbol = layout.blob_item('symbol', index)
+
+        #: Demangled name of this function
+        self.demangled_name = layout.blob_item('demangled', index)
+
+        #: Boolean that indicated if the function has been renamed
+        self.renamed = layout.item('function_renamed', '?', index)
+
+        #: Fingerprint of the function's content or None if it is unknown
+        self.fingerprint = None
+        if layout.has_section('fingerprint_data'):
+            self.fingerprint = layout.blob_item('fingerprint', index) or None
+
+        #: Checksum of the function in the binary or None if it is unknown
+        self.checksum = None
+        if layout.has_section('checksum_data'):
+            self.checksum = layout.blob_item('checksum', index) or None
+
+    def _get_eas(self, name, offsets_name, eas_name):
+        """Return the eas of a compressed sparse row of this function."""
+        layout = self.database._layout
+        return tuple(
+            layout.item(eas_name, 'Q', index)
+            for index in layout.csr_row(name, offsets_name, self.index))
+
+    @property
+    def string_eas(self):
+        """Return the addresses of all strings used in this function.
+
+        :rtype: tuple
+        """
+        return self._get_eas('string_refs', 'string_ref_offsets', 'string_eas')
+
+    @property
+    def xref_to_eas(self):
+        """Return the addresses of all functions that call this function.
+
+        :rtype: tuple
+        """
+        return self._get_eas('xrefs_to', 'xref_to_offsets', 'function_eas')
+
+    @property
+    def xref_from_eas(self):
+        """Return the addresses of all functions called by this function.
+
+        :rtype: tuple
         """
-        # Code has been taken from here: https://github.com/darx0r/Reef
-        for item in FuncItems(ea):
-            for ref in XrefsFrom(item):
-                if ref.type not in CALL_JUMP_FLAGS:
-                    continue
+        return self._get_eas(
+            'xrefs_from', 'xref_from_offsets', 'function_eas')
+
+    def add_string(self, ea):
+        """Raise a TypeError, because the database is read-only."""
+        raise TypeError('A mapped database is read-only.')
+
+    def remove_string(self, ea):
+        """Raise a TypeError, because the database is read-only."""
+        raise TypeError('A mapped database is read-only.')
+
+
+class _MappedFunctions(Mapping):
+    """{<function ea>: <MappedFunction object>, ...} of a mapped database.
+
+    Functions are created on their first access and kept afterwards, so
+    every function is represented by exactly one object.
+    """
+
+    def __init__(self, database):
+        self._database = database
+        self._layout = database._layout
+
+        # {<function index>: <MappedFunction object>, ...}
+        self._loaded = {}
+
+    def __len__(self):
+        return self._layout.function_count
+
+    def __iter__(self):
+        return iter(self._layout.unpack('function_eas', 'Q'))
+
+    def __contains__(self, ea):
+        return self._layout.find('function_eas', ea) != -1
+
+    def __getitem__(self, ea):
+        index = self._layout.find('function_eas', ea)
+        if index == -1:
+            raise KeyError(ea)
+
+        return self.get_by_index(index)
+
+    def get_by_index(self, index):
+        """Return the function stored at the given index of the file."""
+        function = self._loaded.get(index)
+        if function is None:
+            self._loaded[index] = function = MappedFunction(
+                self._database, index)
+
+        return function
+
+    def get_loaded(self, index):
+        """Return the function at the given index if it has been created."""
+        return self._loaded.get(index)
+
+    def itervalues(self):
+        get_by_index = self.get_by_index
+        for index in xrange(len(self)):
+            yield get_by_index(index)
+
+    def iteritems(self):
+        for function in self.itervalues():
+            yield function.ea, function
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
 
-                if ref.to in FuncItems(ea):
-                    continue
 
-                # call loc_<label name> and other stuff we don't want
-                if ref.to not in self.database.functions:
-                    continue
+class _MappedStrings(Mapping):
+    """{<string ea>: <interned str>, ...} of a mapped database."""
 
-                yield ref.to
+    def __init__(self, layout):
+        self._layout = layout
+
+    def __len__(self):
+        return self._layout.string_count
+
+    def __iter__(self):
+        return iter(self._layout.unpack('string_eas', 'Q'))
+
+    def __contains__(self, ea):
+        return self._layout.find('string_eas', ea) != -1
+
+    def __getitem__(self, ea):
+        layout = self._layout
+        index = layout.find('string_eas', ea)
+        if index == -1:
+            raise KeyError(ea)
+
+        return intern(layout.blob_item(
+            'text', layout.item('string_texts', 'I', index)))
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _sorted_eas(eas):
+    """Return the given eas as a sorted tuple without duplicates.
+
+    :param iterable eas: The eas to sort.
+    :rtype: tuple
+    """
+    return tuple(sorted(set(eas)))
+
+
+def _insert_ea(eas, ea):
+    """Return the sorted tuple of eas with the given ea."""
+    index = bisect_left(eas, ea)
+    if index == len(eas) or eas[index] != ea:
+        return eas[:index] + (ea,) + eas[index:]
+
+    return eas
+
+
+def _remove_ea(eas, ea):
+    """Return the sorted tuple of eas without the given ea."""
+    index = bisect_left(eas, ea)
+    if index != len(eas) and eas[index] == ea:
+        return eas[:index] + eas[index + 1:]
+
+    return eas
+
+
+def save_databases(file_path, databases):
+    """Save one or more databases to a single file.
+
+    :param str file_path: Path to save the databases at.
+    :param iterable databases: The databases to save.
+    """
+    with open(file_path, 'wb') as f:
+        storage.write_databases(f, databases)
+
+
+def load_databases(file_path):
+    """Load all databases that have been saved to the given file path.
+
+    Files that have been pickled by older versions can still be loaded.
+
+    :param str file_path: Path of the saved databases.
+    :rtype: tuple
+    """
+    with open(file_path, 'rb') as f:
+        if not storage.is_database_file(f):
+            result = pickle.load(f)
+            return (result,) if isinstance(result, Database) else result
+
+        buffer = f.read()
+
+    # The cyclic garbage collector would repeatedly scan the new objects,
+    # although none of them can be garbage yet.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return tuple(
+            Database.from_data(
+                layout.read_strings(), layout.read_functions())
+            for layout in storage.read_databases(buffer))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def open_databases(file_path):
+    """Open all databases of the given file path in read-only mode.
+
+    The file is memory-mapped, so several processes share the same pages and
+    only the accessed functions are created. Files that have been pickled by
+    older versions are loaded completely.
+
+    :param str file_path: Path of the saved databases.
+    :rtype: tuple
+    """
+    with open(file_path, 'rb') as f:
+        if not storage.is_database_file(f):
+            return load_databases(file_path)
+
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return tuple(
+        MappedDatabase(layout, file_path, position)
+        for position, layout in enumerate(storage.read_databases(buffer)))
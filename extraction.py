@@ -0,0 +1,440 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import marshal
+import sys
+from bisect import bisect_right
+from hashlib import sha1
+
+# IDA
+try:
+    import idaapi
+
+    from idautils import Chunks
+    from idautils import DecodeInstruction
+    from idautils import Functions
+    from idautils import Heads
+    from idautils import Strings
+    from idautils import XrefsFrom
+    from idautils import XrefsTo
+
+    from idc import GetFlags
+    from idc import GetFunctionName
+    from idc import GetFuncOffset
+    from idc import GetManyBytes
+    from idc import ItemSize
+    from idc import isCode
+
+    CALL_JUMP_FLAGS = (
+        idaapi.fl_CF,
+        idaapi.fl_CN,
+        idaapi.fl_JF,
+        idaapi.fl_JN,
+    )
+
+    # Operands that always contain an address
+    ADDRESS_OPERANDS = (
+        idaapi.o_mem,
+        idaapi.o_near,
+        idaapi.o_far,
+    )
+
+    # Operands that might contain an address
+    VALUE_OPERANDS = (
+        idaapi.o_imm,
+        idaapi.o_displ,
+    )
+except ImportError:
+    # Not part of the output of command line tools like the benchmark
+    print >> sys.stderr, 'Script has been called outside of IDA.'
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Minimum length of an extracted string. Shorter strings are ignored.
+MIN_STRING_LENGTH = 1
+
+#: IDA string types (e.g. ``idaapi.ASCSTR_C``) of the extracted strings or
+#: None to extract strings of every type
+STRING_TYPES = None
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def extract_binary(eas=None):
+    """Extract the strings and functions of the currently opened binary.
+
+    This is the only part of the analysis that requires IDA. The result only
+    consists of built-in types, so it can be pickled and passed to
+    :meth:`database.Database.from_data` in a worker process.
+
+    :param iterable eas: If given, only these functions are extracted. Their
+        xref to eas are incomplete in that case.
+    :return: A tuple with a dict of all referenced strings
+        ({<string ea>: <str>, ...}) and a list of tuples with the ea,
+        symbol, demangled name, string eas, xref to eas, xref from eas,
+        renamed flag, fingerprint and checksum of every function.
+    :rtype: tuple
+    """
+    if eas is not None:
+        eas = set(eas)
+
+    symbols, ranges = _extract_functions()
+    strings = dict(iter_strings(ranges))
+    string_eas, xref_from_eas, code_hashes = _extract_references(
+        symbols, ranges, strings, eas)
+    demangled_names = dict((ea, GetFuncOffset(ea)) for ea in symbols)
+    return assemble(
+        strings, symbols, demangled_names, string_eas, xref_from_eas,
+        code_hashes, _extract_checksums(symbols, ranges, eas), eas)
+
+
+def extract_summary():
+    """Extract what is required to find the functions that changed since
+    the last extraction.
+
+    This is a lot faster than :func:`extract_binary`, because it doesn't
+    need to visit every head.
+
+    :return: A tuple with a dict of all strings that are referenced by a
+        function ({<string ea>: <str>, ...}) and a dict with the checksum of
+        every function ({<function ea>: <str>, ...}).
+    :rtype: tuple
+    """
+    symbols, ranges = _extract_functions()
+    return dict(iter_strings(ranges)), _extract_checksums(symbols, ranges)
+
+
+def iter_strings(
+        ranges, min_length=MIN_STRING_LENGTH, string_types=STRING_TYPES):
+    """Iterate over the strings of the binary that are referenced by a
+    function.
+
+    The strings are filtered while IDA's string list is enumerated, so
+    unreferenced strings are never read or stored. The cheap checks come
+    first: the string type, then the references and only then the content.
+
+    :param FunctionRanges ranges: Item ranges of all functions.
+    :param int min_length: Minimum length of the strings.
+    :param iterable string_types: IDA string types of the strings or None
+        for every type.
+    :return: A generator that yields tuples with the ea and the interned
+        content of every string.
+    :rtype: generator
+    """
+    if string_types is not None:
+        string_types = frozenset(string_types)
+
+    find = ranges.find
+    for item in Strings():
+        if string_types is not None and item.type not in string_types:
+            continue
+
+        ea = item.ea
+        for ref in XrefsTo(ea):
+            if find(ref.frm) is not None:
+                break
+        else:
+            continue
+
+        try:
+            string = str(item)
+        except TypeError:
+            # I forgot when this can happen...
+            continue
+
+        if len(string) >= min_length:
+            yield ea, intern(string)
+
+
+def find_callers(eas):
+    """Return all functions that call or jump to one of the given functions.
+
+    :param iterable eas: Start addresses of the called functions.
+    :rtype: set
+    """
+    symbols, ranges = _extract_functions()
+    callers = set()
+    for ea in eas:
+        for ref in XrefsTo(ea):
+            if ref.type not in CALL_JUMP_FLAGS:
+                continue
+
+            caller = ranges.find(ref.frm)
+            if caller is not None and caller != ea:
+                callers.add(caller)
+
+    return callers
+
+
+def assemble(
+        strings, symbols, demangled_names, string_eas, xref_from_eas,
+        code_hashes=None, checksums=None, eas=None):
+    """Assemble the extracted data to the format returned by
+    :func:`extract_binary`.
+
+    :param dict strings: {<string ea>: <str>, ...}
+    :param dict symbols: {<function ea>: <symbol>, ...}
+    :param dict demangled_names: {<function ea>: <demangled name>, ...}
+    :param dict string_eas: {<function ea>: <iterable of string eas>, ...}
+    :param dict xref_from_eas: {<function ea>: <iterable of called function
+        eas>, ...}
+    :param dict code_hashes: {<function ea>: <hash of the normalized
+        code>, ...}. Functions without a code hash don't get a fingerprint.
+    :param dict checksums: {<function ea>: <checksum>, ...}
+    :param set eas: If given, only these functions are assembled.
+    :rtype: tuple
+    """
+    if code_hashes is None:
+        code_hashes = {}
+
+    if checksums is None:
+        checksums = {}
+
+    # The callers are simply the inverted call graph
+    xref_to_eas = {}
+    for ea, callees in xref_from_eas.iteritems():
+        for callee in callees:
+            xref_to_eas.setdefault(callee, set()).add(ea)
+
+    # No need to keep strings without a reference to a function
+    referenced = set()
+    for function_strings in string_eas.itervalues():
+        referenced.update(function_strings)
+
+    strings = dict(
+        (ea, string) for ea, string in strings.iteritems()
+        if ea in referenced)
+
+    functions = []
+    for ea, symbol in symbols.iteritems():
+        if eas is not None and ea not in eas:
+            continue
+
+        function_strings = string_eas.get(ea, ())
+        callees = xref_from_eas.get(ea, ())
+        fingerprint = None
+        code_hash = code_hashes.get(ea)
+        if code_hash is not None:
+            texts = [strings[string_ea] for string_ea in function_strings]
+            fingerprint = create_fingerprint(code_hash, texts, len(callees))
+
+        functions.append((
+            ea, symbol, demangled_names.get(ea), function_strings,
+            xref_to_eas.get(ea, ()), callees, False, fingerprint,
+            checksums.get(ea)))
+
+    return strings, functions
+
+
+def create_fingerprint(code_hash, texts, callee_count):
+    """Create the fingerprint of a function's content.
+
+    Functions with the same fingerprint have the same normalized code,
+    use the same strings and call the same number of functions. It doesn't
+    depend on addresses, so it stays the same across builds as long as the
+    function doesn't change.
+
+    :param str code_hash: Hash of the normalized code of the function.
+    :param iterable texts: The strings used by the function.
+    :param int callee_count: Number of called functions.
+    :return: A SHA-1 digest.
+    :rtype: str
+    """
+    return _get_digest((code_hash, _sort_texts(texts), callee_count))
+
+
+def get_string_set_digest(texts):
+    """Return the digest of a set of strings.
+
+    Equal sets have equal digests, even across databases and processes.
+
+    :param iterable texts: The contents of the strings. Duplicates don't
+        matter.
+    :return: A SHA-1 digest.
+    :rtype: str
+    """
+    return _get_digest(_sort_texts(texts))
+
+
+def _sort_texts(texts):
+    """Return the unique texts as sorted tuple."""
+    return tuple(sorted(set(texts)))
+
+
+def _get_digest(value):
+    """Return the SHA-1 digest of a marshallable value."""
+    # Version 0 of the marshal format encodes interned and other strings
+    # the same way
+    return sha1(marshal.dumps(value, 0)).digest()
+
+
+def _extract_functions():
+    """Return the symbols and the item ranges of all functions.
+
+    :return: A tuple with a dict ({<function ea>: <symbol>, ...}) and the
+        :class:`FunctionRanges` of all functions.
+    :rtype: tuple
+    """
+    symbols = {}
+    ranges = []
+    for ea in Functions():
+        symbol = GetFunctionName(ea)
+        if symbol.startswith('_ZThn'):
+            continue
+
+        symbols[ea] = symbol
+        for start, end in Chunks(ea):
+            ranges.append((start, end, ea))
+
+    return symbols, FunctionRanges(ranges)
+
+
+def _extract_checksums(symbols, ranges, eas=None):
+    """Return a checksum of the symbol, the chunk ranges and the raw bytes of
+    every function.
+
+    :param dict symbols: {<function ea>: <symbol>, ...}
+    :param FunctionRanges ranges: Item ranges of all functions.
+    :param set eas: If given, only the checksums of these functions are
+        returned.
+    :return: {<function ea>: <SHA-1 digest>, ...}
+    :rtype: dict
+    """
+    checksums = {}
+    for start, end, ea in ranges:
+        if eas is not None and ea not in eas:
+            continue
+
+        checksum = checksums.get(ea)
+        if checksum is None:
+            checksums[ea] = checksum = sha1(symbols[ea])
+
+        checksum.update(marshal.dumps((start, end)))
+        checksum.update(GetManyBytes(start, end - start) or '')
+
+    return dict(
+        (ea, checksum.digest()) for ea, checksum in checksums.iteritems())
+
+
+def _extract_references(symbols, ranges, strings, eas=None):
+    """Collect the string references, the call graph and the code hashes in
+    a single pass over the code heads of all functions.
+
+    :param dict symbols: {<function ea>: <symbol>, ...}
+    :param FunctionRanges ranges: Item ranges of all functions.
+    :param dict strings: {<string ea>: <str>, ...}
+    :param set eas: If given, only the heads of these functions are
+        visited.
+    :return: A tuple with three dicts. The first one contains the string
+        eas ({<function ea>: set([<string ea>, ...]), ...}), the second one
+        the called functions ({<function ea>: set([<function ea>, ...])})
+        and the third one the hash of the normalized code
+        ({<function ea>: <str>, ...}) of every function.
+    :rtype: tuple
+    """
+    string_eas = {}
+    xref_from_eas = {}
+    code_hashes = {}
+    find = ranges.find
+    for start, end, ea in ranges:
+        if eas is not None and ea not in eas:
+            continue
+
+        code_hash = code_hashes.get(ea)
+        if code_hash is None:
+            code_hashes[ea] = code_hash = sha1()
+
+        for head in Heads(start, end):
+            if isCode(GetFlags(head)):
+                code_hash.update(_get_normalized_code(head))
+
+            for ref in XrefsFrom(head):
+                to = ref.to
+                if ref.type in CALL_JUMP_FLAGS:
+                    # call loc_<label name> and other stuff we don't want
+                    if to not in symbols:
+                        continue
+
+                    # Recursive calls and jumps into the function itself
+                    if find(to) == ea:
+                        continue
+
+                    xref_from_eas.setdefault(ea, set()).add(to)
+                elif to in strings:
+                    string_eas.setdefault(ea, set()).add(to)
+
+    return string_eas, xref_from_eas, dict(
+        (ea, code_hash.digest()) for ea, code_hash in code_hashes.iteritems())
+
+
+def _get_normalized_code(ea):
+    """Return the bytes of an instruction without the addresses it contains.
+
+    Addresses change with every build, even if the function doesn't. All
+    bytes from the first operand that contains an address up to the end of
+    the instruction are replaced by zeros.
+
+    :param int ea: Address of the instruction.
+    :rtype: str
+    """
+    size = ItemSize(ea)
+    code = GetManyBytes(ea, size) or ''
+    instruction = DecodeInstruction(ea)
+    if instruction is None:
+        return code
+
+    offset = size
+    for operand in instruction.Operands:
+        if not operand.offb:
+            continue
+
+        if (operand.type in ADDRESS_OPERANDS or
+                operand.type in VALUE_OPERANDS and (
+                    idaapi.getseg(operand.value) is not None or
+                    idaapi.getseg(operand.addr) is not None)):
+            offset = min(offset, operand.offb)
+
+    return code[:offset] + '\0' * (len(code) - offset)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class FunctionRanges(object):
+    """Maps addresses to the functions that contain them."""
+
+    def __init__(self, ranges):
+        """Initialize the object.
+
+        :param iterable ranges: Tuples with the start and end address of a
+            function chunk and the start address of its function.
+        """
+        self._ranges = sorted(ranges)
+        self._starts = [start for start, end, ea in self._ranges]
+
+    def __iter__(self):
+        """Return an iterator over all sorted ranges."""
+        return iter(self._ranges)
+
+    def find(self, ea):
+        """Return the start address of the function that contains the given
+        address.
+
+        :param int ea: The address to look up.
+        :return: The start address of the function or None if the address
+            does not belong to a function.
+        :rtype: int
+        """
+        index = bisect_right(self._starts, ea) - 1
+        if index < 0:
+            return None
+
+        start, end, func_ea = self._ranges[index]
+        if ea >= end:
+            return None
+
+        return func_ea
@@ -0,0 +1,132 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from random import Random
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Number of bands of a signature. Two functions become candidates if all
+#: values of at least one band are equal.
+BANDS = 16
+
+#: Number of MinHash values per band
+ROWS = 4
+
+#: Buckets with more functions are ignored. They belong to very common
+#: features and would make the search quadratic without ever producing a
+#: unique best match.
+MAX_BUCKET_SIZE = 64
+
+# A Mersenne prime that is larger than any hash value
+_PRIME = (1 << 61) - 1
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class LshIndex(object):
+    """Finds items with similar feature sets using MinHash signatures and
+    locality-sensitive hashing.
+
+    Features can be any hashable objects. The signatures only depend on the
+    hash values of the features, so they are reproducible on the same
+    platform.
+    """
+
+    def __init__(self, bands=BANDS, rows=ROWS, seed=0):
+        """Initialize the index.
+
+        :param int bands: Number of bands of a signature.
+        :param int rows: Number of MinHash values per band.
+        :param int seed: Seed of the random hash functions.
+        """
+        self.bands = bands
+        self.rows = rows
+
+        random = Random(seed)
+        self._coefficients = tuple(
+            (random.randrange(1, _PRIME), random.randrange(_PRIME))
+            for x in xrange(bands * rows))
+
+        # {<feature>: <tuple of hash values>, ...}
+        # Most features are shared by several items, so every feature is
+        # only hashed once.
+        self._feature_hashes = {}
+
+        # {(<band>, <tuple of band values>): [<item>, ...], ...}
+        self._buckets = {}
+
+    def signature(self, features):
+        """Return the MinHash signature of a feature set.
+
+        :param iterable features: The features. Must not be empty.
+        :rtype: list
+        """
+        feature_hashes = self._feature_hashes
+        values = []
+        for feature in features:
+            hashes = feature_hashes.get(feature)
+            if hashes is None:
+                value = hash(feature)
+                feature_hashes[feature] = hashes = tuple(
+                    (a * value + b) % _PRIME
+                    for a, b in self._coefficients)
+
+            values.append(hashes)
+
+        return map(min, zip(*values))
+
+    def _band_keys(self, features):
+        """Return the bucket key of every band of a feature set."""
+        signature = self.signature(features)
+        rows = self.rows
+        return [
+            (band, tuple(signature[band * rows:(band + 1) * rows]))
+            for band in xrange(self.bands)]
+
+    def add(self, item, features):
+        """Add an item to the index.
+
+        :param item: The item to add.
+        :param iterable features: The features of the item. Must not be
+            empty.
+        """
+        buckets = self._buckets
+        for key in self._band_keys(features):
+            buckets.setdefault(key, []).append(item)
+
+    def candidates(self, features):
+        """Return all items that share a bucket with a feature set.
+
+        :param iterable features: The features to search for. Must not be
+            empty.
+        :rtype: set
+        """
+        result = set()
+        buckets = self._buckets
+        for key in self._band_keys(features):
+            items = buckets.get(key)
+            if items is not None and len(items) <= MAX_BUCKET_SIZE:
+                result.update(items)
+
+        return result
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def jaccard(features1, features2):
+    """Return the Jaccard similarity of two feature sets.
+
+    :param set features1: The first feature set.
+    :param set features2: The second feature set.
+    :rtype: float
+    """
+    union = len(features1 | features2)
+    if not union:
+        return 0.0
+
+    return float(len(features1 & features2)) / union
@@ -0,0 +1,169 @@
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Names of the signature levels in the order they are matched. Earlier
+#: levels are more specific, so their matches are preferred.
+LEVELS = (
+    'full',
+    'anchors',
+    'two_hop',
+)
+
+#: Confidence of the matches of every level
+CONFIDENCES = (
+    0.9,
+    0.8,
+    0.6,
+)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class GraphSignatures(object):
+    """Computes the structural signatures of functions in the call graph.
+
+    A signature consists of two parts. The degree part only depends on the
+    call graph, so it is computed once per function. The anchor part
+    consists of the symbols of the renamed functions ("anchors") in the
+    neighbourhood of a function and changes whenever a neighbour is renamed.
+
+    Windows functions that aren't renamed yet still have their IDA symbol,
+    so the anchor part of a Linux and a Windows function is only equal if
+    the same neighbours have been discovered on both sides.
+    """
+
+    def __init__(self, degree_signatures=None):
+        """Initialize the object.
+
+        :param dict degree_signatures: Already known degree signatures
+            ({<Function>: <degree signature>, ...}). The dict is copied.
+        """
+        # {<Function>: <degree signature>, ...}
+        self._degree_signatures = dict(degree_signatures or {})
+
+    def get_degree_signature(self, func):
+        """Return the degree signature of a function.
+
+        :param Function func: The function.
+        :return: A tuple with the number of callers, the number of callees
+            and the sorted numbers of callees of the callees.
+        :rtype: tuple
+        """
+        signature = self._degree_signatures.get(func)
+        if signature is None:
+            histogram = sorted(
+                len(callee.xref_from_eas) for callee in func.xrefs_from)
+            self._degree_signatures[func] = signature = (
+                len(func.xref_to_eas), len(func.xref_from_eas),
+                tuple(histogram))
+
+        return signature
+
+    def get_keys(self, func, known_symbols):
+        """Return the index keys of a function for every level of
+        :data:`LEVELS`.
+
+        :param Function func: The function.
+        :param set known_symbols: Symbols that are used in both databases.
+        :return: A tuple with a key or None for every level. A level is None
+            if the function has no anchor in the required neighbourhood.
+        :rtype: tuple
+        """
+        callers = func.xrefs_to
+        callees = func.xrefs_from
+        anchor_callers = frozenset(
+            caller.symbol for caller in callers
+            if caller.symbol in known_symbols)
+        anchor_callees = frozenset(
+            callee.symbol for callee in callees
+            if callee.symbol in known_symbols)
+
+        # Anchors that are two calls away. The direction is part of the
+        # feature, because the callers of a caller have a different meaning
+        # than the callers of a callee.
+        two_hop = set()
+        for caller in callers:
+            two_hop.update(
+                ('caller', other.symbol) for other in caller.xrefs_to
+                if other.symbol in known_symbols)
+            two_hop.update(
+                ('sibling', other.symbol) for other in caller.xrefs_from
+                if other.symbol in known_symbols)
+
+        for callee in callees:
+            two_hop.update(
+                ('callee', other.symbol) for other in callee.xrefs_from
+                if other.symbol in known_symbols)
+
+        two_hop = frozenset(two_hop)
+        degrees = self.get_degree_signature(func)
+        if not anchor_callers and not anchor_callees:
+            return (
+                None,
+                None,
+                (degrees, two_hop) if two_hop else None)
+
+        anchors = (anchor_callers, anchor_callees)
+        return (
+            (degrees, anchors, two_hop),
+            anchors,
+            (degrees, two_hop))
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def find_unique_matches(linux_keys, windows_keys):
+    """Return all pairs of functions that share a key with no other function
+    on both sides.
+
+    The levels are matched in order. A function that has been matched on
+    one level is ignored on all further levels.
+
+    :param dict linux_keys: {<Linux Function>: <keys>, ...} as returned by
+        :meth:`GraphSignatures.get_keys`.
+    :param dict windows_keys: {<Windows Function>: <keys>, ...}
+    :return: A list of tuples with a Windows and a Linux function and the
+        index of the level they have been matched on.
+    :rtype: list
+    """
+    matches = []
+    matched_linux = set()
+    matched_windows = set()
+    for level in xrange(len(LEVELS)):
+        linux_index = _build_index(linux_keys, level)
+        windows_index = _build_index(windows_keys, level)
+        for key, windows_funcs in windows_index.iteritems():
+            linux_funcs = linux_index.get(key)
+            if (linux_funcs is None or len(linux_funcs) != 1 or
+                    len(windows_funcs) != 1):
+                continue
+
+            linux_func = linux_funcs[0]
+            windows_func = windows_funcs[0]
+            if linux_func in matched_linux or windows_func in matched_windows:
+                continue
+
+            matches.append((windows_func, linux_func, level))
+            matched_linux.add(linux_func)
+            matched_windows.add(windows_func)
+
+    return matches
+
+
+def _build_index(keys, level):
+    """Return an index of the functions by their key on the given level.
+
+    :param dict keys: {<Function>: <keys>, ...}
+    :param int level: Index of the level in :data:`LEVELS`.
+    :return: {<key>: [<Function>, ...], ...}
+    :rtype: dict
+    """
+    index = {}
+    for func, func_keys in keys.iteritems():
+        key = func_keys[level]
+        if key is not None:
+            index.setdefault(key, []).append(func)
+
+    return index
@@ -0,0 +1,187 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import json
+import time
+from functools import wraps
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class Instrumentation(object):
+    """Collects timers and counters of a search.
+
+    Every stage adds its time and counters to the current iteration of the
+    discover loop and to the totals. Counters should be summed up locally
+    and added once per stage, so hot loops don't pay for a method call.
+    """
+
+    def __init__(self, log_file=None):
+        """Initialize the object.
+
+        :param file log_file: If given, every finished iteration is written
+            to this file as a single JSON line.
+        """
+        self.log_file = log_file
+
+        #: {<stage name>: {'seconds': <float>, 'calls': <int>}, ...}
+        self.stages = {}
+
+        #: {<counter name>: <int>, ...}
+        self.counters = {}
+
+        #: Finished iterations of the discover loop
+        self.iterations = []
+
+        #: {<database name>: {<property>: {'hits': .., 'misses': ..}}, ...}
+        self.caches = {}
+
+        self._iteration = None
+
+    def start_iteration(self, number=None):
+        """Start a new iteration of the discover loop.
+
+        :param int number: Number of the iteration. Defaults to the number
+            of recorded iterations plus one. A resumed search passes its own
+            number, so the log continues the numbering of the interrupted
+            search.
+        """
+        if number is None:
+            number = len(self.iterations) + 1
+
+        self._iteration = {
+            'iteration': number,
+            'stages': {},
+            'counters': {},
+            'start': time.time(),
+        }
+
+    def end_iteration(self, renamed):
+        """Finish the current iteration of the discover loop.
+
+        :param int renamed: Number of functions renamed in the iteration.
+        :return: The record of the iteration.
+        :rtype: dict
+        """
+        iteration = self._iteration
+        self._iteration = None
+        iteration['seconds'] = time.time() - iteration.pop('start')
+        iteration['renamed'] = renamed
+        self.iterations.append(iteration)
+        if self.log_file is not None:
+            self.log_file.write(json.dumps(iteration, sort_keys=True) + '\n')
+            self.log_file.flush()
+
+        return iteration
+
+    def stage(self, name):
+        """Return a context manager that times a stage.
+
+        :param str name: Name of the stage.
+        :rtype: _StageTimer
+        """
+        return _StageTimer(self, name)
+
+    def count(self, name, value=1):
+        """Add a value to a counter.
+
+        :param str name: Name of the counter.
+        :param int value: The value to add.
+        """
+        counters = self.counters
+        counters[name] = counters.get(name, 0) + value
+        if self._iteration is not None:
+            counters = self._iteration['counters']
+            counters[name] = counters.get(name, 0) + value
+
+    def _add_time(self, name, seconds):
+        """Add the time of a stage call to the totals and the iteration."""
+        _add_stage_time(self.stages, name, seconds)
+        if self._iteration is not None:
+            _add_stage_time(self._iteration['stages'], name, seconds)
+
+    def record_caches(self, name, set_cache):
+        """Record the cache statistics of a database.
+
+        :param str name: Name of the database.
+        :param set_cache.SetCache set_cache: The cache of the database.
+        """
+        caches = set_cache.stats()
+        for stats in caches.itervalues():
+            hits = stats['hits']
+            stats['hit_rate'] = (
+                float(hits) / (hits + stats['misses']) if hits else 0.0)
+
+        caches['size'] = {
+            'sets': len(set_cache),
+            'items': set_cache.items,
+            'max_items': set_cache.max_items,
+        }
+        self.caches[name] = caches
+
+    def to_dict(self):
+        """Return all collected data.
+
+        :rtype: dict
+        """
+        return {
+            'stages': self.stages,
+            'counters': self.counters,
+            'iterations': self.iterations,
+            'caches': self.caches,
+        }
+
+    def save(self, file_path):
+        """Save all collected data to a JSON file.
+
+        :param str file_path: Path to save the data at.
+        """
+        with open(file_path, 'wb') as f:
+            json.dump(self.to_dict(), f, indent=4, sort_keys=True)
+
+
+class _StageTimer(object):
+    """Adds the time of a with block to a stage."""
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation._add_time(self.name, time.time() - self.start)
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def timed(name):
+    """Return a decorator that times every call of a method as a stage.
+
+    The instance of the method must have an ``instrumentation`` attribute.
+
+    :param str name: Name of the stage.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.instrumentation.stage(name):
+                return method(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _add_stage_time(stages, name, seconds):
+    """Add the time of a single call to a stage."""
+    stage = stages.get(name)
+    if stage is None:
+        stages[name] = stage = {'seconds': 0.0, 'calls': 0}
+
+    stage['seconds'] += seconds
+    stage['calls'] += 1
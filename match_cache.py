@@ -0,0 +1,165 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import cPickle as pickle
+import os
+
+# discover_win
+from provenance import Provenance
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Minimum confidence of a match to be remembered. Ambiguous string matches
+#: and matches that are backed by a single renamed function have a
+#: confidence of 0.5 at most.
+MIN_CONFIDENCE = 0.6
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class MatchCache(object):
+    """Remembers the Linux symbols of Windows functions across builds.
+
+    Functions are identified by their fingerprint (see
+    :func:`extraction.create_fingerprint`), so a function that didn't change
+    since a previous build is renamed right away and doesn't need to go
+    through the search again.
+    """
+
+    def __init__(self, symbols=None, confidences=None):
+        """Initialize the cache.
+
+        :param dict symbols: {<fingerprint>: <Linux symbol or None>, ...}
+        :param dict confidences: {<fingerprint>: <confidence>, ...}
+            Fingerprints without a confidence get :data:`MIN_CONFIDENCE`.
+        """
+        #: {<fingerprint>: <Linux symbol>, ...}
+        #: The symbol is None if the fingerprint has been seen with different
+        #: symbols, so it can't be trusted.
+        self.symbols = dict(symbols or {})
+
+        #: {<fingerprint>: <confidence of the remembered match>, ...}
+        self.confidences = dict(
+            (fingerprint, MIN_CONFIDENCE) for fingerprint in self.symbols)
+        self.confidences.update(confidences or {})
+
+    @classmethod
+    def load(cls, file_path):
+        """Load a cache from a file.
+
+        :param str file_path: Path of the cache. An empty cache is returned
+            if the file doesn't exist yet.
+        :rtype: MatchCache
+        """
+        if not os.path.isfile(file_path):
+            return cls()
+
+        with open(file_path, 'rb') as f:
+            data = pickle.load(f)
+
+        # Older caches only contain the symbols
+        if isinstance(data, dict):
+            return cls(data)
+
+        return cls(*data)
+
+    def save(self, file_path):
+        """Save the cache to a file.
+
+        :param str file_path: Path to save the cache at.
+        """
+        with open(file_path, 'wb') as f:
+            pickle.dump((self.symbols, self.confidences), f)
+
+    def update(self, windows_db, provenance, min_confidence=MIN_CONFIDENCE):
+        """Remember the symbols of the renamed Windows functions that have
+        been matched with enough confidence.
+
+        :param Database windows_db: Windows database.
+        :param dict provenance: {<Windows function ea>:
+            <provenance.Provenance>, ...} as collected by
+            :attr:`create_discover_database.Search.provenance`. Renamed
+            functions without a provenance are skipped.
+        :param float min_confidence: Minimum confidence of a match.
+        :return: Number of added fingerprints.
+        :rtype: int
+        """
+        symbols = self.symbols
+        count = len(symbols)
+        for func in windows_db.functions.itervalues():
+            fingerprint = func.fingerprint
+            if not func.renamed or fingerprint is None:
+                continue
+
+            match = provenance.get(func.ea)
+            if match is None or match.confidence < min_confidence:
+                continue
+
+            if symbols.get(fingerprint, func.symbol) != func.symbol:
+                # Same content, but different symbols
+                symbols[fingerprint] = None
+            else:
+                symbols[fingerprint] = func.symbol
+
+            self.confidences[fingerprint] = match.confidence
+
+        return len(symbols) - count
+
+    def apply(self, linux_db, windows_db):
+        """Rename all Windows functions with a known fingerprint.
+
+        Fingerprints that are used by several Windows functions are skipped,
+        because they can't tell the functions apart.
+
+        :param Database linux_db: Linux database.
+        :param Database windows_db: Windows database.
+        :return: The provenance of the renamed functions. It has the
+            confidence of the remembered match, so uncertain matches don't
+            become more certain by being cached.
+            {<Windows function ea>: <provenance.Provenance>, ...}
+        :rtype: dict
+        """
+        # {<fingerprint>: [<Windows Function>, ...], ...}
+        candidates = {}
+        for func in windows_db.functions.itervalues():
+            if func.fingerprint is not None:
+                candidates.setdefault(func.fingerprint, []).append(func)
+
+        hits = {}
+        for fingerprint, funcs in sorted(
+                candidates.iteritems(), key=lambda item: item[1][0].ea):
+            symbol = self.symbols.get(fingerprint)
+            if symbol is None or len(funcs) != 1 or funcs[0].renamed:
+                continue
+
+            try:
+                linux_func = linux_db.get_function_by_symbol(symbol)
+            except ValueError:
+                # The function has been removed or renamed on Linux
+                continue
+
+            if _has_symbol(windows_db, symbol):
+                continue
+
+            funcs[0].rename(linux_func)
+            hits[funcs[0].ea] = Provenance(
+                'match_cache', 0, None, 1, self.confidences[fingerprint])
+
+        return hits
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _has_symbol(database, symbol):
+    """Return True if a function of the database has the given symbol."""
+    try:
+        database.get_function_by_symbol(symbol)
+    except ValueError:
+        return False
+
+    return True
@@ -0,0 +1,240 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+# discover_win
+from call_graph import CallGraph
+from create_discover_database import Search
+from database import Database
+from graph_signatures import GraphSignatures
+from instrumentation import Instrumentation
+from results import ResultWriter
+
+
+# =============================================================================
+# >> GLOBAL VARIABLES
+# =============================================================================
+# The reference of the current worker process. Forked workers inherit it
+# from the main process.
+_reference = None
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class LinuxReference(object):
+    """The Linux side of the search, built once and shared by the searches
+    of several Windows databases.
+
+    The Linux database is never cleaned up or changed by the searches, so
+    it can be compared with any number of Windows databases.
+    """
+
+    def __init__(self, linux_db):
+        """Build the indexes of a Linux database.
+
+        :param Database linux_db: The Linux database.
+        """
+        #: The Linux database
+        self.database = linux_db
+
+        #: Call graph of the Linux database
+        self.graph = CallGraph(linux_db)
+
+        #: Tuples with the string set and every Linux function with strings
+        #: in the order of their eas
+        self.string_funcs = [
+            (linux_func.strings, linux_func)
+            for linux_func in self.graph.functions
+            if linux_func.string_eas]
+
+        #: {<Linux Function>: <degree signature>, ...}
+        signatures = GraphSignatures()
+        self.degree_signatures = dict(
+            (linux_func, signatures.get_degree_signature(linux_func))
+            for linux_func in self.graph.functions)
+
+    @classmethod
+    def load(cls, linux_db_path):
+        """Load a Linux database and build its indexes.
+
+        :param str linux_db_path: Path of the Linux database.
+        :rtype: LinuxReference
+        """
+        return cls(Database.load(linux_db_path))
+
+    def discover(
+            self, windows_db, discovered_path, instrumentation_path=None,
+            fuzzy_threshold=None, iteration_log_path=None):
+        """Clean up a Windows database and discover its functions.
+
+        :param Database windows_db: The Windows database. Its platform
+            specific strings are removed.
+        :param str discovered_path: Path to save the discovered database at.
+        :param str instrumentation_path: If given, the timers and counters
+            of the search are saved as JSON file at this path.
+        :param float fuzzy_threshold: Minimum similarity of fuzzy matches.
+            The fuzzy search is disabled if None.
+        :param str iteration_log_path: If given, every finished iteration
+            of the discover loop is written to this file as a single JSON
+            line while the search is running.
+        :return: All found Windows functions.
+        :rtype: tuple
+        """
+        self.database.cleanup(windows_db, symmetric=False)
+        log_file = None
+        if iteration_log_path is not None:
+            log_file = open(iteration_log_path, 'w')
+
+        instrumentation = Instrumentation(log_file)
+        try:
+            with ResultWriter(discovered_path) as writer:
+                search = Search(
+                    self.database, windows_db, instrumentation,
+                    fuzzy_threshold=fuzzy_threshold, result_writer=writer,
+                    linux_reference=self)
+                result = tuple(search.discover())
+        finally:
+            if log_file is not None:
+                log_file.close()
+
+        if instrumentation_path is not None:
+            instrumentation.save(instrumentation_path)
+
+        return result
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def discover_targets(
+        linux_db_path, windows_db_paths, output_dir, processes=1,
+        fuzzy_threshold=None, log_iterations=False):
+    """Discover the functions of several Windows databases with a single
+    Linux reference.
+
+    The Linux database is loaded and indexed only once. Every Windows
+    database gets its own discovered database and instrumentation file in
+    the output directory, named after the Windows database.
+
+    :param str linux_db_path: Path of the Linux database.
+    :param iterable windows_db_paths: Paths of the Windows databases.
+    :param str output_dir: Directory to save the results in.
+    :param int processes: Number of Windows databases that are searched in
+        parallel.
+    :param float fuzzy_threshold: Minimum similarity of fuzzy matches. The
+        fuzzy search is disabled if None.
+    :param bool log_iterations: If True, the iterations of every search are
+        also written to an iterations file in the output directory while
+        it is running.
+    :return: {<Windows database path>: <number of found functions>, ...}
+    :rtype: dict
+    """
+    global _reference
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    tasks = []
+    names = set()
+    for windows_db_path in windows_db_paths:
+        name = os.path.splitext(os.path.basename(windows_db_path))[0]
+        if name in names:
+            raise ValueError(
+                'Two Windows databases are named "{0}".'.format(name))
+
+        names.add(name)
+        iteration_log_path = None
+        if log_iterations:
+            iteration_log_path = os.path.join(
+                output_dir, name + '.iterations.jsonl')
+
+        tasks.append((
+            windows_db_path,
+            os.path.join(output_dir, name + '.discovered.db'),
+            os.path.join(output_dir, name + '.instrumentation.json'),
+            fuzzy_threshold, iteration_log_path))
+
+    print 'Building Linux reference...'
+    _reference = LinuxReference.load(linux_db_path)
+    try:
+        if processes > 1 and len(tasks) > 1:
+            pool = Pool(
+                min(processes, len(tasks)), _init_worker, (linux_db_path,))
+            try:
+                counts = pool.map(_discover_target, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            counts = map(_discover_target, tasks)
+    finally:
+        _reference = None
+
+    return dict(
+        (task[0], count) for task, count in zip(tasks, counts))
+
+
+def _init_worker(linux_db_path):
+    """Build the reference in a worker process that didn't inherit it."""
+    global _reference
+    if _reference is None:
+        _reference = LinuxReference.load(linux_db_path)
+
+
+def _discover_target(task):
+    """Discover the functions of a single Windows database.
+
+    :param tuple task: Path of the Windows database, path of its discovered
+        database, path of its instrumentation file or None, the fuzzy
+        threshold and path of its iteration log or None.
+    :return: Number of found functions.
+    :rtype: int
+    """
+    (windows_db_path, discovered_path, instrumentation_path,
+        fuzzy_threshold, iteration_log_path) = task
+    print 'Discovering {0}...'.format(windows_db_path)
+    windows_db = Database.load(windows_db_path)
+    return len(_reference.discover(
+        windows_db, discovered_path, instrumentation_path, fuzzy_threshold,
+        iteration_log_path))
+
+
+# =============================================================================
+# >> MAIN
+# =============================================================================
+def main(args=None):
+    """Discover the functions of several Windows databases."""
+    parser = ArgumentParser(
+        description='Discover the functions of several Windows databases '
+                    'with a single Linux database.')
+    parser.add_argument('linux', help='Linux database.')
+    parser.add_argument(
+        'output_dir', help='Directory to save the discovered databases in.')
+    parser.add_argument('windows', nargs='+', help='Windows databases.')
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help='Number of Windows databases that are searched in parallel.')
+    parser.add_argument(
+        '--fuzzy-threshold', type=float,
+        help='Minimum Jaccard similarity of fuzzy matches. Fuzzy matching '
+             'is disabled if not given.')
+    parser.add_argument(
+        '--log-iterations', action='store_true',
+        help='Write the iterations of every search to an iterations file in '
+             'the output directory while it is running.')
+    namespace = parser.parse_args(args)
+    counts = discover_targets(
+        namespace.linux, namespace.windows, namespace.output_dir,
+        namespace.processes, namespace.fuzzy_threshold,
+        namespace.log_iterations)
+    for windows_db_path in namespace.windows:
+        print '{0}: {1} functions'.format(
+            windows_db_path, counts[windows_db_path])
+
+
+if __name__ == '__main__':
+    main()
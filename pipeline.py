@@ -0,0 +1,178 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+from argparse import ArgumentParser
+
+# discover_win
+from analyse_binary import analyse_binary
+from analyse_binary import split_stale_results
+from analyse_binary import update_binary
+from backends import StandInBackend
+from cleanup_databases import cleanup_databases
+from create_discover_database import create_discover_database
+from read_discover_database import load_discovered_database
+from read_discover_database import load_discovered_records
+from read_discover_database import rename_functions
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def run_pipeline(
+        linux_path, windows_path, output_dir, processes=1,
+        fuzzy_threshold=None, match_cache_path=None, incremental=False,
+        min_confidence=None, resume=False, log_iterations=False):
+    """Run all stages of the pipeline without any user interaction.
+
+    The binaries are given as stand-in JSON files (see
+    :class:`backends.StandInBackend`) or as already analysed databases.
+
+    :param str linux_path: Path of the Linux binary or database.
+    :param str windows_path: Path of the Windows binary or database.
+    :param str output_dir: Directory to save all created files in.
+    :param int processes: Number of processes that compute the string sets
+        of the functions.
+    :param float fuzzy_threshold: Minimum similarity of fuzzy matches. The
+        fuzzy search is disabled if None.
+    :param str match_cache_path: Path of the match cache that is shared
+        between the runs of different builds. Not used if None.
+    :param bool incremental: If True, the databases and results of a
+        previous run in the output directory are updated instead of being
+        created from scratch. Only the stale results are searched again.
+    :param float min_confidence: If given, only results with at least this
+        confidence are reused by an incremental run and renamed in the
+        Windows binary.
+    :param bool resume: If True, an interrupted search of a previous run in
+        the output directory is resumed from its last checkpoint.
+    :param bool log_iterations: If True, every finished iteration of the
+        discover loop is written to "iterations.jsonl" in the output
+        directory while the search is running.
+    :return: All found Windows functions.
+    :rtype: tuple
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    # Step 1 - Analyse both binaries
+    linux_db_path, linux_backend, linux_changes = _analyse(
+        linux_path, output_dir, 'linux', incremental)
+    windows_db_path, windows_backend, windows_changes = _analyse(
+        windows_path, output_dir, 'windows', incremental)
+
+    # Step 2 - Cleanup both databases
+    cleaned_up_path = os.path.join(output_dir, 'cleaned_up.db')
+    cleanup_databases(linux_db_path, windows_db_path, cleaned_up_path)
+
+    # Step 3 - Discover Windows functions
+    discovered_path = os.path.join(output_dir, 'discovered.db')
+    checkpoint_path = os.path.join(output_dir, 'discovered.checkpoint')
+    if not resume and os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    iteration_log_path = None
+    if log_iterations:
+        iteration_log_path = os.path.join(output_dir, 'iterations.jsonl')
+
+    known_functions = ()
+    if incremental and os.path.isfile(discovered_path):
+        known_functions, stale = split_stale_results(
+            load_discovered_records(discovered_path, min_confidence),
+            linux_changes, windows_changes)
+
+        print '{0} previous results are stale.'.format(len(stale))
+
+    functions = create_discover_database(
+        cleaned_up_path, discovered_path,
+        os.path.join(output_dir, 'instrumentation.json'), processes,
+        fuzzy_threshold, match_cache_path, known_functions, checkpoint_path,
+        iteration_log_path)
+    if min_confidence is not None:
+        functions = load_discovered_database(discovered_path, min_confidence)
+        print '{0} functions have at least the minimum confidence.'.format(
+            len(functions))
+
+    # Step 4 - Rename the Windows functions
+    if windows_backend is None:
+        print 'Skipped renaming, because the Windows binary is a database.'
+    else:
+        rename_functions(functions, windows_backend)
+        windows_backend.to_json(
+            os.path.join(output_dir, 'windows_renamed.json'))
+
+    return functions
+
+
+def _analyse(file_path, output_dir, name, incremental):
+    """Analyse a binary given as stand-in JSON file.
+
+    :return: A tuple with the path of the database, the backend and the
+        :class:`database.DatabaseChanges`. The backend is None if the file
+        is already a database. The changes are None if the database has been
+        created from scratch.
+    :rtype: tuple
+    """
+    if not file_path.lower().endswith('.json'):
+        return file_path, None, None
+
+    backend = StandInBackend.from_json(file_path)
+    db_path = os.path.join(output_dir, name + '.db')
+    if incremental and os.path.isfile(db_path):
+        database, changes = update_binary(db_path, backend)
+        return db_path, backend, changes
+
+    analyse_binary(db_path, backend)
+    return db_path, backend, None
+
+
+# =============================================================================
+# >> MAIN
+# =============================================================================
+def main(args=None):
+    """Run the pipeline with the given command line arguments."""
+    parser = ArgumentParser(
+        description='Discover Windows functions without IDA.')
+    parser.add_argument(
+        'linux', help='Linux binary as stand-in JSON file or database.')
+    parser.add_argument(
+        'windows', help='Windows binary as stand-in JSON file or database.')
+    parser.add_argument(
+        'output_dir', help='Directory to save all created files in.')
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help='Number of processes that compute the string sets.')
+    parser.add_argument(
+        '--fuzzy-threshold', type=float,
+        help='Minimum Jaccard similarity of fuzzy matches. Fuzzy matching '
+             'is disabled if not given.')
+    parser.add_argument(
+        '--match-cache',
+        help='Path of a match cache to reuse the results of previous '
+             'builds. It is created if it doesn\'t exist.')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='Update the databases and results of a previous run in the '
+             'output directory.')
+    parser.add_argument(
+        '--min-confidence', type=float,
+        help='Only reuse and rename results with at least this confidence '
+             '(0 to 1).')
+    parser.add_argument(
+        '--resume', action='store_true',
+        help='Resume an interrupted search in the output directory.')
+    parser.add_argument(
+        '--log-iterations', action='store_true',
+        help='Write every iteration of the search to iterations.jsonl in '
+             'the output directory while it is running.')
+    namespace = parser.parse_args(args)
+    run_pipeline(
+        namespace.linux, namespace.windows, namespace.output_dir,
+        namespace.processes, namespace.fuzzy_threshold,
+        namespace.match_cache, namespace.incremental,
+        namespace.min_confidence, namespace.resume,
+        namespace.log_iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from collections import namedtuple
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Stages that can produce a match. "previous" is used for functions that
+#: have been renamed before the search started and "match_cache" for
+#: functions that have been renamed by the match cache.
+STAGES = (
+    'previous',
+    'match_cache',
+    'string',
+    'candidate_group',
+    'multiple_xrefs',
+    'structural',
+    'fuzzy',
+    'single_xref',
+)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+#: How a Windows function has been matched.
+#:
+#: - stage: One of :data:`STAGES`.
+#: - iteration: Iteration of the discover loop. 0 for previous and match
+#:   cache matches.
+#: - anchor_ea: Ea of the renamed Windows function the match has been
+#:   derived from or None.
+#: - candidates: Number of candidates the match has been chosen from.
+#: - confidence: Strength of the evidence between 0 and 1.
+Provenance = namedtuple(
+    'Provenance', 'stage iteration anchor_ea candidates confidence')
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def anchor_confidence(anchors):
+    """Return the confidence of a match that is backed by the given number
+    of agreeing renamed functions.
+
+    :param int anchors: Number of agreeing renamed functions.
+    :rtype: float
+    """
+    return anchors / (anchors + 1.0)
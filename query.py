@@ -0,0 +1,462 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import mmap
+import os
+import struct
+import time
+from argparse import ArgumentParser
+
+# discover_win
+import storage
+from database import MappedDatabase
+from database import open_databases
+from extraction import get_string_set_digest
+from results import read_records
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: First bytes of every index file
+MAGIC = 'DWIX'
+
+#: Version of the index layout. Increase it whenever the layout changes.
+VERSION = 1
+
+#: Suffix of index files
+INDEX_SUFFIX = '.index'
+
+# Magic, version and the size and modification time of the database file
+# and of the discovered database (zeros if there is none)
+_HEADER = struct.Struct('<4sIQdQd')
+
+# All sections of an index in the order they are stored. F is the number of
+# functions, T the number of distinct string texts and K the number of
+# distinct string sets.
+SECTIONS = (
+    # I[F + 1] and the data of the sorted current symbols of all functions
+    'symbol_offsets',
+    'symbol_data',
+    # I[F]: Function index of every sorted symbol
+    'symbol_functions',
+    # I[T + 1] and the data of the sorted string texts
+    'text_offsets',
+    'text_data',
+    # CSR arrays: I[T + 1] offsets into the I[...] indexes of the functions
+    # that use a text
+    'text_function_offsets',
+    'text_functions',
+    # I[K + 1] and the data of the sorted digests of the string sets
+    'string_set_offsets',
+    'string_set_data',
+    # CSR arrays: I[K + 1] offsets into the I[...] indexes of the functions
+    # with a string set
+    'string_set_function_offsets',
+    'string_set_functions',
+    # ?[F]: Matched flag of every function
+    'function_matched',
+    # I[F + 1] and the data of the discovered symbols. Empty if not found.
+    'discovered_offsets',
+    'discovered_data',
+)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class QueryIndex(object):
+    """Persistent secondary indexes of a saved database for interactive
+    lookups.
+
+    The index is saved next to the database file and memory-mapped like the
+    database itself, so a lookup only touches a few pages. It is rebuilt
+    if the database file or the discovered database changed.
+
+    A function is matched if it had been renamed before the search or has
+    been found by it. Its current symbol is the discovered symbol or the
+    symbol stored in the database.
+
+    All lookups return a list of tuples with the ea and the current symbol
+    of every function, sorted by the eas. The ``matched`` argument of the
+    lookups restricts them to matched (True) or not matched (False)
+    functions.
+    """
+
+    def __init__(self, database, layout):
+        """Initialize the object.
+
+        :param database.MappedDatabase database: The indexed database.
+        :param storage.SectionLayout layout: Layout of the index file.
+        """
+        #: The indexed database
+        self.database = database
+
+        self._layout = layout
+
+    @classmethod
+    def open(cls, database_path, position=0, discovered_path=None):
+        """Open the index of a database and build it if it doesn't exist or
+        is out of date.
+
+        :param str database_path: Path of a database file that has been
+            written by :func:`database.save_databases`.
+        :param int position: Position of the database in the file. The
+            Windows database of a cleaned up database is at position 1.
+        :param str discovered_path: If given, the functions of this
+            discovered database are matched.
+        :rtype: QueryIndex
+        :raise ValueError: Raised when the database file has been pickled by
+            an older version.
+        """
+        database = open_databases(database_path)[position]
+        if not isinstance(database, MappedDatabase):
+            raise ValueError(
+                'Queries require a database file that has been written by '
+                'save_databases().')
+
+        index_path = get_index_path(database_path, position)
+        sources = _get_sources(database_path, discovered_path)
+        layout = _map_index(index_path, sources)
+        if layout is None:
+            print 'Building index...'
+            build_index(database, index_path, sources, discovered_path)
+            layout = _map_index(index_path, sources)
+            print 'Index has been built!'
+
+        return cls(database, layout)
+
+    def find_symbols(self, prefix, matched=None):
+        """Return the functions whose current symbol starts with a prefix.
+
+        :param str prefix: Prefix of the symbols. An empty prefix returns
+            all functions.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        layout = self._layout
+        count = layout.sections['symbol_functions'][1] // 4
+        indexes = []
+        position = layout.bisect_blob('symbol', prefix)
+        while (position < count and
+                layout.blob_item('symbol', position).startswith(prefix)):
+            indexes.append(layout.item('symbol_functions', 'I', position))
+            position += 1
+
+        return self._describe(indexes, matched)
+
+    def find_string(self, text, matched=None):
+        """Return the functions that reference a string.
+
+        :param str text: The content of the string.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        return self._describe(
+            self._find_row('text', 'text_function', text), matched)
+
+    def find_string_set(self, texts, matched=None):
+        """Return the functions that reference exactly the given strings.
+
+        :param iterable texts: The contents of the strings.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        return self._describe(self._find_row(
+            'string_set', 'string_set_function', get_string_set_digest(texts)),
+            matched)
+
+    def find_callers(self, symbol, matched=None):
+        """Return the functions that call a function.
+
+        :param str symbol: Current symbol of the called function.
+        :param bool matched: Restricts the result to (not) matched callers.
+        :rtype: list
+        """
+        return self._find_neighbours(
+            symbol, 'xrefs_to', 'xref_to_offsets', matched)
+
+    def find_callees(self, symbol, matched=None):
+        """Return the functions that are called by a function.
+
+        :param str symbol: Current symbol of the calling function.
+        :param bool matched: Restricts the result to (not) matched callees.
+        :rtype: list
+        """
+        return self._find_neighbours(
+            symbol, 'xrefs_from', 'xref_from_offsets', matched)
+
+    def _find_neighbours(self, symbol, name, offsets_name, matched):
+        """Return the callers or callees of all functions with a symbol.
+
+        :param str symbol: Current symbol of the functions.
+        :param str name: Name of the database section with the xrefs.
+        :param str offsets_name: Name of the section with the row offsets.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        database_layout = self.database.layout
+        indexes = []
+        for ea, current_symbol in self.find_symbols(symbol):
+            if current_symbol == symbol:
+                indexes.extend(database_layout.csr_row(
+                    name, offsets_name,
+                    database_layout.find('function_eas', ea)))
+
+        return self._describe(indexes, matched)
+
+    def _find_row(self, name, rows_name, key):
+        """Return the function indexes of a key of a sorted blob section.
+
+        :param str name: Name of the blob section with the keys.
+        :param str rows_name: Name of the compressed sparse rows without
+            their suffixes.
+        :param str key: The key to look up.
+        :rtype: tuple
+        """
+        layout = self._layout
+        position = layout.bisect_blob(name, key)
+        count = layout.sections[name + '_offsets'][1] // 4 - 1
+        if position == count or layout.blob_item(name, position) != key:
+            return ()
+
+        return layout.csr_row(
+            rows_name + 's', rows_name + '_offsets', position)
+
+    def _describe(self, indexes, matched=None):
+        """Return the ea and the current symbol of functions.
+
+        :param iterable indexes: Indexes of the functions in the database.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        layout = self._layout
+        database_layout = self.database.layout
+        result = []
+        for index in sorted(set(indexes)):
+            if (matched is not None and
+                    layout.item('function_matched', '?', index) != matched):
+                continue
+
+            symbol = (
+                layout.blob_item('discovered', index) or
+                database_layout.blob_item('symbol', index))
+            result.append(
+                (database_layout.item('function_eas', 'Q', index), symbol))
+
+        return result
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def get_index_path(database_path, position=0):
+    """Return the path of the index file of a database.
+
+    :param str database_path: Path of the database file.
+    :param int position: Position of the database in the file.
+    :rtype: str
+    """
+    return '{0}.{1}{2}'.format(database_path, position, INDEX_SUFFIX)
+
+
+def build_index(database, index_path, sources, discovered_path=None):
+    """Build the index file of a database.
+
+    :param database.MappedDatabase database: The database.
+    :param str index_path: Path to save the index at.
+    :param tuple sources: Sizes and modification times of the database file
+        and the discovered database.
+    :param str discovered_path: Path of the discovered database or None.
+    """
+    layout = database.layout
+    count = layout.function_count
+    symbols = layout.unpack_blob('symbol')
+    matched = list(layout.unpack('function_renamed', '?'))
+    discovered = [''] * count
+    if discovered_path is not None:
+        for ea, symbol, provenance in read_records(discovered_path):
+            index = layout.find('function_eas', ea)
+            if index != -1:
+                symbols[index] = discovered[index] = symbol
+                matched[index] = True
+
+    texts = layout.unpack_blob('text')
+    string_texts = layout.unpack('string_texts', 'I')
+    offsets = layout.unpack('string_ref_offsets', 'I')
+    refs = layout.unpack('string_refs', 'I')
+
+    # {<text>: [<function index>, ...], ...}
+    text_functions = {}
+
+    # {<string set digest>: [<function index>, ...], ...}
+    string_set_functions = {}
+    for index in xrange(count):
+        function_texts = set(
+            texts[string_texts[ref]]
+            for ref in refs[offsets[index]:offsets[index + 1]])
+        if not function_texts:
+            continue
+
+        for text in function_texts:
+            text_functions.setdefault(text, []).append(index)
+
+        string_set_functions.setdefault(
+            get_string_set_digest(function_texts), []).append(index)
+
+    symbol_order = sorted(xrange(count), key=symbols.__getitem__)
+    sorted_texts = sorted(text_functions)
+    sorted_digests = sorted(string_set_functions)
+    sections = (
+        storage.pack_blob(symbols[index] for index in symbol_order) +
+        (storage.pack('I', symbol_order),) +
+        storage.pack_blob(sorted_texts) +
+        _pack_rows(text_functions[text] for text in sorted_texts) +
+        storage.pack_blob(sorted_digests) +
+        _pack_rows(
+            string_set_functions[digest] for digest in sorted_digests) +
+        (storage.pack('?', matched),) +
+        storage.pack_blob(discovered))
+
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, *sources))
+        for data in sections:
+            storage.write_section(f, data)
+
+    # Never leave a half written index behind
+    if os.path.isfile(index_path):
+        os.remove(index_path)
+
+    os.rename(temp_path, index_path)
+
+
+def _pack_rows(rows):
+    """Pack rows of function indexes as compressed sparse rows.
+
+    :param iterable rows: Lists of sorted function indexes.
+    :return: The packed I[N + 1] offsets and I[...] indexes.
+    :rtype: tuple
+    """
+    offsets = [0]
+    values = []
+    for row in rows:
+        values.extend(row)
+        offsets.append(len(values))
+
+    return storage.pack('I', offsets), storage.pack('I', values)
+
+
+def _get_sources(database_path, discovered_path=None):
+    """Return the sizes and modification times of the indexed files.
+
+    :param str database_path: Path of the database file.
+    :param str discovered_path: Path of the discovered database or None.
+    :rtype: tuple
+    """
+    sources = []
+    for path in (database_path, discovered_path):
+        if path is None:
+            sources.extend((0, 0.0))
+        else:
+            stat = os.stat(path)
+            sources.extend((stat.st_size, stat.st_mtime))
+
+    return tuple(sources)
+
+
+def _map_index(index_path, sources):
+    """Map an index file.
+
+    :param str index_path: Path of the index file.
+    :param tuple sources: Sizes and modification times of the indexed files.
+    :return: The layout of the index or None if the file doesn't exist or
+        is out of date.
+    :rtype: storage.SectionLayout
+    """
+    if not os.path.isfile(index_path):
+        return None
+
+    with open(index_path, 'rb') as f:
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+
+        magic, version = _HEADER.unpack(header)[:2]
+        if (magic != MAGIC or version != VERSION or
+                _HEADER.unpack(header)[2:] != sources):
+            return None
+
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return storage.SectionLayout(buffer, _HEADER.size, SECTIONS)
+
+
+# =============================================================================
+# >> MAIN
+# =============================================================================
+def main(args=None):
+    """Look up functions of a saved database."""
+    parser = ArgumentParser(
+        description='Look up functions of a saved database.')
+    parser.add_argument(
+        'database', help='Database file, e.g. the cleaned up database.')
+    parser.add_argument(
+        '--position', type=int, default=0,
+        help='Position of the database in the file. The Windows database of '
+             'a cleaned up database is at position 1.')
+    parser.add_argument(
+        '--discovered',
+        help='Discovered database whose functions are matched.')
+    state = parser.add_mutually_exclusive_group()
+    state.add_argument(
+        '--matched', dest='matched', action='store_const', const=True,
+        help='Only list matched functions.')
+    state.add_argument(
+        '--unmatched', dest='matched', action='store_const', const=False,
+        help='Only list functions that are not matched.')
+    queries = parser.add_subparsers(dest='query')
+    queries.add_parser(
+        'symbol', help='Functions whose symbol starts with a prefix.'
+    ).add_argument('argument', metavar='prefix')
+    queries.add_parser(
+        'string', help='Functions that reference a string.'
+    ).add_argument('argument', metavar='text')
+    queries.add_parser(
+        'strings', help='Functions that reference exactly these strings.'
+    ).add_argument('argument', metavar='text', nargs='+')
+    queries.add_parser(
+        'callers', help='Functions that call a function.'
+    ).add_argument('argument', metavar='symbol')
+    queries.add_parser(
+        'callees', help='Functions that are called by a function.'
+    ).add_argument('argument', metavar='symbol')
+    namespace = parser.parse_args(args)
+
+    index = QueryIndex.open(
+        namespace.database, namespace.position, namespace.discovered)
+    query = {
+        'symbol': index.find_symbols,
+        'string': index.find_string,
+        'strings': index.find_string_set,
+        'callers': index.find_callers,
+        'callees': index.find_callees,
+    }[namespace.query]
+
+    start = time.time()
+    result = query(namespace.argument, namespace.matched)
+    duration = time.time() - start
+    for ea, symbol in result:
+        print '{0:x}\t{1}'.format(ea, symbol)
+
+    print '{0} functions ({1:.1f} ms)'.format(len(result), duration * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,28 +2,165 @@
 # >> IMPORTS
 # =============================================================================
 # Python
-import cPickle as pickle
+import os
+
+# discover_win
+from backends import IdaBackend
+from results import read_records
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Number of functions that are renamed between two progress updates
+BATCH_SIZE = 1000
+
+#: Suffix of the file that stores the progress of :func:`rename_functions`
+PROGRESS_SUFFIX = '.progress'
 
 
 # =============================================================================
 # >> FUNCTIONS
 # =============================================================================
-def rename_functions(functions):
-    """Rename unnamed functions in the binary using the given functions."""
+def load_discovered_database(discovered_path, min_confidence=None):
+    """Load the functions of a discovered database.
+
+    :param str discovered_path: Path of the discovered database. It might
+        be incomplete if the search has been interrupted.
+    :param float min_confidence: If given, only functions whose provenance
+        has at least this confidence are loaded. Functions without a
+        provenance (from databases of older versions) are always loaded.
+    :return: Tuples with the ea and the symbol of every found function.
+    :rtype: tuple
+    """
+    return tuple(
+        (ea, symbol) for ea, symbol, provenance
+        in load_discovered_records(discovered_path, min_confidence))
+
+
+def load_discovered_records(discovered_path, min_confidence=None):
+    """Load the functions of a discovered database including their
+    provenance.
+
+    :param str discovered_path: Path of the discovered database.
+    :param float min_confidence: See :func:`load_discovered_database`.
+    :return: Tuples with the ea, the symbol and the
+        :class:`provenance.Provenance` or None of every found function.
+    :rtype: tuple
+    """
+    return tuple(
+        (ea, symbol, provenance) for ea, symbol, provenance
+        in read_records(discovered_path)
+        if (min_confidence is None or provenance is None or
+            provenance.confidence >= min_confidence))
+
+
+def rename_functions(
+        functions, backend=None, progress_path=None, batch_size=BATCH_SIZE):
+    """Rename unnamed functions in the binary using the given functions.
+
+    The functions are renamed in batches while the updates of the backend
+    are suspended.
+
+    :param iterable functions: Tuples with the ea and the symbol of every
+        found function.
+    :param backends.Backend backend: The backend that provides the binary.
+        Defaults to the binary that is currently opened in IDA.
+    :param str progress_path: If given, the progress is saved to this file
+        after every batch and a previous call that has been interrupted is
+        resumed. The file is removed once all functions are processed.
+    :param int batch_size: Number of functions per batch.
+    :return: Number of renamed functions.
+    :rtype: int
+    """
+    if backend is None:
+        backend = IdaBackend()
+
+    functions = list(functions)
+    start = 0
+    if progress_path is not None:
+        start = _load_progress(progress_path, functions)
+        if start:
+            print 'Resuming after {0} processed functions.'.format(start)
+
     count = 0
-    for ea, symbol in functions:
-        # Skip functions with an auto-generated name
-        if symbol.startswith('sub_'):
-            continue
-        
-        # Skip names that have been renamed already (or already had a name)
-        if not GetFunctionName(ea).startswith('sub_'):
-            continue
-
-        MakeName(ea, symbol)
-        count += 1
+    with backend.suspend_updates():
+        for batch_start in xrange(start, len(functions), batch_size):
+            batch_stop = min(batch_start + batch_size, len(functions))
+            for ea, symbol in functions[batch_start:batch_stop]:
+                # Skip functions with an auto-generated name
+                if symbol.startswith('sub_'):
+                    continue
+
+                # Skip names that have been renamed already (or already had
+                # a name)
+                if not backend.get_function_name(ea).startswith('sub_'):
+                    continue
+
+                backend.set_function_name(ea, symbol)
+                count += 1
+
+            if progress_path is not None:
+                _save_progress(progress_path, functions, batch_stop)
+
+    if progress_path is not None and os.path.isfile(progress_path):
+        os.remove(progress_path)
 
     print 'Renamed {0} of {1} found functions'.format(count, len(functions))
+    return count
+
+
+def _load_progress(progress_path, functions):
+    """Return the number of functions that have already been processed.
+
+    The progress is only used if the last processed function is still at
+    the same position, so a changed discovered database starts from the
+    beginning.
+
+    :param str progress_path: Path of the progress file.
+    :param list functions: All functions that are going to be renamed.
+    :rtype: int
+    """
+    if not os.path.isfile(progress_path):
+        return 0
+
+    with open(progress_path, 'rb') as f:
+        try:
+            processed, ea, symbol = f.read().split('\t', 2)
+            processed = int(processed)
+            ea = int(ea, 16)
+        except ValueError:
+            return 0
+
+    if not 0 < processed <= len(functions):
+        return 0
+
+    if functions[processed - 1] != (ea, symbol):
+        return 0
+
+    return processed
+
+
+def _save_progress(progress_path, functions, processed):
+    """Save the number of processed functions and the last one of them.
+
+    :param str progress_path: Path of the progress file.
+    :param list functions: All functions that are going to be renamed.
+    :param int processed: Number of processed functions.
+    """
+    if not processed:
+        return
+
+    ea, symbol = functions[processed - 1]
+    temp_path = progress_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write('{0}\t{1:x}\t{2}'.format(processed, ea, symbol))
+
+    # Never leave a half written progress file behind
+    if os.path.isfile(progress_path):
+        os.remove(progress_path)
+
+    os.rename(temp_path, progress_path)
 
 
 # =============================================================================
@@ -35,10 +172,9 @@ def main():
     if discovered_path is None:
         return
 
-    with open(discovered_path, 'rb') as f:
-        functions = pickle.load(f)
-
-    rename_functions(functions)
+    rename_functions(
+        load_discovered_database(discovered_path), None,
+        discovered_path + PROGRESS_SUFFIX)
 
 if __name__ == '__main__':
     main()
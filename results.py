@@ -0,0 +1,179 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import cPickle as pickle
+
+# discover_win
+from provenance import Provenance
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: First line of every result file
+MAGIC = 'discover_win results 2\n'
+
+# First line of result files without provenance records
+_MAGIC_1 = 'discover_win results 1\n'
+
+# Format of a result line
+_LINE = '{0:x}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6:.3f}\n'
+
+#: Number of results that are buffered before they are written to the file
+CHUNK_SIZE = 1024
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class ResultWriter(object):
+    """Writes discovered functions to a file while they are found.
+
+    Every result is a line with the hexadecimal ea of the Windows function,
+    its Linux symbol and the fields of its :class:`provenance.Provenance`
+    separated by tabs. Results are written in chunks, so a crashed search
+    still leaves all completed chunks behind.
+    :func:`read_results` ignores an incomplete last line.
+    """
+
+    def __init__(self, file_path, chunk_size=CHUNK_SIZE, keep=0):
+        """Create the file.
+
+        :param str file_path: Path of the result file.
+        :param int chunk_size: Number of results that are written at once.
+        :param int keep: If not 0, the first results of an existing file
+            are kept and the new results are appended to them. Results of
+            the kept functions are not written again. This is used to
+            resume an interrupted search without losing its results if it
+            is interrupted again.
+        :raise ValueError: Raised if the file contains less results than
+            should be kept.
+        """
+        self.chunk_size = chunk_size
+
+        #: Number of written results
+        self.count = keep
+
+        # Eas of the kept results, which haven't been written again yet
+        self._kept_eas = set()
+
+        if keep:
+            self._file = open(file_path, 'r+b')
+            if self._file.readline() != MAGIC:
+                self._file.close()
+                raise ValueError('Not a result file: {0}'.format(file_path))
+
+            for index in xrange(keep):
+                line = self._file.readline()
+                if not line.endswith('\n'):
+                    self._file.close()
+                    raise ValueError(
+                        'Result file contains less than {0} results.'.format(
+                            keep))
+
+                self._kept_eas.add(int(line[:line.index('\t')], 16))
+
+            # Drop the results after the kept ones
+            self._file.truncate(self._file.tell())
+            self._file.seek(0, 2)
+        else:
+            self._file = open(file_path, 'wb')
+            self._file.write(MAGIC)
+
+        self._chunk = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, ea, symbol, provenance):
+        """Add a result.
+
+        :param int ea: Address of the Windows function.
+        :param str symbol: Its Linux symbol.
+        :param provenance.Provenance provenance: How the function has been
+            matched.
+        """
+        if ea in self._kept_eas:
+            self._kept_eas.discard(ea)
+            return
+
+        stage, iteration, anchor_ea, candidates, confidence = provenance
+        self._chunk.append(_LINE.format(
+            ea, symbol, stage, iteration,
+            '-' if anchor_ea is None else '{0:x}'.format(anchor_ea),
+            candidates, confidence))
+        self.count += 1
+        if len(self._chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered results to the file."""
+        if self._chunk:
+            self._file.write(''.join(self._chunk))
+            self._chunk = []
+
+        self._file.flush()
+
+    def close(self):
+        """Write all buffered results and close the file."""
+        if self._file.closed:
+            return
+
+        self.flush()
+        self._file.close()
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def read_results(file_path):
+    """Read the results of a result file.
+
+    :param str file_path: Path of the result file.
+    :return: Tuples with the ea of a Windows function and its Linux symbol.
+    :rtype: generator
+    """
+    for ea, symbol, provenance in read_records(file_path):
+        yield ea, symbol
+
+
+def read_records(file_path):
+    """Read the results of a result file including their provenance.
+
+    Files that have been written by an older version are supported as
+    well. Their results don't have a provenance.
+
+    :param str file_path: Path of the result file.
+    :return: Tuples with the ea of a Windows function, its Linux symbol and
+        its :class:`provenance.Provenance` or None.
+    :rtype: generator
+    """
+    with open(file_path, 'rb') as f:
+        magic = f.readline()
+        if magic not in (MAGIC, _MAGIC_1):
+            f.seek(0)
+            for ea, symbol in pickle.load(f):
+                yield ea, symbol, None
+
+            return
+
+        for line in f:
+            # The last line is incomplete if the search has been interrupted
+            if not line.endswith('\n'):
+                break
+
+            fields = line[:-1].split('\t')
+            ea = int(fields[0], 16)
+            if magic == _MAGIC_1:
+                yield ea, fields[1], None
+                continue
+
+            stage, iteration, anchor_ea, candidates, confidence = fields[2:]
+            yield ea, fields[1], Provenance(
+                stage, int(iteration),
+                None if anchor_ea == '-' else int(anchor_ea, 16),
+                int(candidates), float(confidence))
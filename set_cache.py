@@ -0,0 +1,146 @@
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Kinds of derived sets of a function
+KINDS = (
+    'strings',
+    'xrefs_to',
+    'xrefs_from',
+)
+
+#: Default limit of the number of items of all cached sets. Every set also
+#: counts as one item, so empty sets aren't free.
+MAX_ITEMS = 2000000
+
+#: Fraction of the limit the cache is reduced to once it is exceeded.
+#: Evicting in batches keeps the cost of the bookkeeping of a cache hit
+#: down to a single counter update.
+EVICTION_TARGET = 0.75
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SetCache(object):
+    """A bounded cache for the derived sets of the functions of a database.
+
+    Every database has a single cache for all its functions. If the cached
+    sets contain more than :attr:`max_items` items, the least recently used
+    sets are evicted until the cache is down to :data:`EVICTION_TARGET` of
+    the limit.
+
+    Cached sets are frozensets, because they are shared by all callers.
+    """
+
+    def __init__(self, max_items=MAX_ITEMS):
+        """Initialize the cache.
+
+        :param int max_items: Maximum number of items of all cached sets.
+        """
+        #: Maximum number of items of all cached sets
+        self.max_items = max_items
+
+        #: Current number of items of all cached sets
+        self.items = 0
+
+        # {(<kind>, <Function>): [<frozenset>, <time of the last use>], ...}
+        self._entries = {}
+        self._clock = 0
+
+        # {<kind>: [<hits>, <misses>, <evictions>, <invalidations>], ...}
+        self._stats = dict((kind, [0, 0, 0, 0]) for kind in KINDS)
+
+    def __len__(self):
+        """Return the number of cached sets."""
+        return len(self._entries)
+
+    def get(self, kind, function):
+        """Return a cached set.
+
+        :param str kind: One of :data:`KINDS`.
+        :param Function function: The function the set belongs to.
+        :return: The cached set or None if it isn't cached.
+        :rtype: frozenset
+        """
+        entry = self._entries.get((kind, function))
+        if entry is None:
+            self._stats[kind][1] += 1
+            return None
+
+        self._stats[kind][0] += 1
+        self._clock += 1
+        entry[1] = self._clock
+        return entry[0]
+
+    def put(self, kind, function, items):
+        """Cache a set.
+
+        :param str kind: One of :data:`KINDS`.
+        :param Function function: The function the set belongs to.
+        :param iterable items: Items of the set.
+        :return: The cached set.
+        :rtype: frozenset
+        """
+        value = frozenset(items)
+        key = (kind, function)
+        old_entry = self._entries.get(key)
+        if old_entry is not None:
+            self.items -= len(old_entry[0]) + 1
+
+        self._clock += 1
+        self._entries[key] = [value, self._clock]
+        self.items += len(value) + 1
+        if self.items > self.max_items:
+            self._evict()
+
+        return value
+
+    def invalidate(self, function, kinds=KINDS):
+        """Remove the cached sets of a function.
+
+        :param Function function: The function whose sets changed.
+        :param iterable kinds: Kinds of the sets to remove.
+        """
+        entries = self._entries
+        for kind in kinds:
+            entry = entries.pop((kind, function), None)
+            if entry is not None:
+                self.items -= len(entry[0]) + 1
+                self._stats[kind][3] += 1
+
+    def clear(self):
+        """Remove all cached sets."""
+        self._entries.clear()
+        self.items = 0
+
+    def _evict(self):
+        """Evict the least recently used sets until the cache is down to
+        :data:`EVICTION_TARGET` of its limit."""
+        target = int(self.max_items * EVICTION_TARGET)
+        entries = self._entries
+        stats = self._stats
+        for key, entry in sorted(
+                entries.iteritems(), key=lambda item: item[1][1]):
+            if self.items <= target:
+                break
+
+            del entries[key]
+            self.items -= len(entry[0]) + 1
+            stats[key[0]][2] += 1
+
+    def stats(self):
+        """Return the statistics of the cache.
+
+        :return: {<kind>: {'hits': <int>, 'misses': <int>, 'evictions':
+            <int>, 'invalidations': <int>}, ...}
+        :rtype: dict
+        """
+        return dict(
+            (kind, {
+                'hits': hits,
+                'misses': misses,
+                'evictions': evictions,
+                'invalidations': invalidations,
+            })
+            for kind, (hits, misses, evictions, invalidations)
+            in self._stats.iteritems())
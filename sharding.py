@@ -0,0 +1,139 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import mmap
+from multiprocessing import Pool
+
+# discover_win
+import storage
+from extraction import get_string_set_digest
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: Number of shards every worker process gets on average. More shards than
+#: processes balance the load if some shards use a lot more strings.
+SHARDS_PER_PROCESS = 4
+
+
+# =============================================================================
+# >> GLOBAL VARIABLES
+# =============================================================================
+# Layouts of the databases mapped by the current worker process
+_layouts = None
+
+# {<database position>: (<string ref offsets>, <string refs>,
+#     <text index of every string>, <texts>), ...}
+_sections = {}
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def compute_string_buckets(databases, processes):
+    """Bucket the functions of several databases by their string sets in
+    parallel.
+
+    The functions are split into shards of consecutive indexes. Every worker
+    process maps the database file on its own, so all processes share the
+    same read-only pages, and returns the buckets of its shard. The buckets
+    are merged in the order of the shards, so the result doesn't depend on
+    the scheduling of the workers. Two functions get the same key if, and
+    only if, they use the same set of string texts, even across databases.
+
+    The main process only has to merge the buckets and doesn't need to
+    create the objects of functions, whose strings are never compared.
+
+    :param iterable databases: :class:`database.MappedDatabase` objects that
+        have been opened from the same file.
+    :param int processes: Number of worker processes.
+    :return: A dict for every database that maps every key to the indexes
+        of its functions in ascending order ({<key>: [<index>, ...], ...}).
+        Functions without strings are not part of any bucket.
+    :rtype: list
+    :raise ValueError: Raised when the databases have not been opened from
+        the same database file.
+    """
+    databases = tuple(databases)
+    file_paths = set(
+        getattr(database, 'file_path', None) for database in databases)
+    if len(file_paths) != 1 or None in file_paths:
+        raise ValueError(
+            'Sharding requires databases that have been opened from the '
+            'same file with open_databases().')
+
+    tasks = []
+    for database in databases:
+        count = len(database.functions)
+        size = max(1, -(-count // (processes * SHARDS_PER_PROCESS)))
+        tasks.extend(
+            (database.position, start, min(start + size, count))
+            for start in xrange(0, count, size))
+
+    pool = Pool(processes, _init_worker, (file_paths.pop(),))
+    try:
+        shards = pool.map(_compute_shard_buckets, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    # The shards of a database are ordered by their indexes, so appending
+    # them in the order of the tasks keeps every bucket sorted.
+    result = dict((database.position, {}) for database in databases)
+    for (position, start, stop), buckets in zip(tasks, shards):
+        merged = result[position]
+        for key, indexes in buckets.iteritems():
+            merged.setdefault(key, []).extend(indexes)
+
+    return [result[database.position] for database in databases]
+
+
+def _init_worker(file_path):
+    """Map the database file in a worker process."""
+    global _layouts
+    with open(file_path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    _layouts = storage.read_databases(buffer)
+
+
+def _get_sections(position):
+    """Return the sections of a database that are required to compute the
+    string keys. They are only unpacked once per worker process."""
+    sections = _sections.get(position)
+    if sections is None:
+        layout = _layouts[position]
+        _sections[position] = sections = (
+            layout.unpack('string_ref_offsets', 'I'),
+            layout.unpack('string_refs', 'I'),
+            layout.unpack('string_texts', 'I'),
+            layout.unpack_blob('text'))
+
+    return sections
+
+
+def _compute_shard_buckets(task):
+    """Bucket the functions of a shard by their string sets.
+
+    :param tuple task: Position of the database, first and last index
+        (exclusive) of the functions of the shard.
+    :return: {<key>: [<index>, ...], ...}
+    :rtype: dict
+    """
+    position, start, stop = task
+    offsets, refs, string_texts, texts = _get_sections(position)
+    buckets = {}
+    for index in xrange(start, stop):
+        row = refs[offsets[index]:offsets[index + 1]]
+        if not row:
+            continue
+
+        # Text indexes are unique per database, but not across databases,
+        # so the key is created from the texts themselves.
+        text_indexes = set(string_texts[string] for string in row)
+        key = get_string_set_digest(texts[text] for text in text_indexes)
+        buckets.setdefault(key, []).append(index)
+
+    return buckets
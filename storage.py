@@ -0,0 +1,475 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import struct
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+#: First bytes of every database file
+MAGIC = 'DWDB'
+
+#: Version of the file layout. Increase it whenever the layout changes.
+VERSION = 3
+
+# Magic, version and number of databases
+_FILE_HEADER = struct.Struct('<4sII')
+
+# Number of functions, strings and distinct string texts
+_DATABASE_HEADER = struct.Struct('<III')
+
+# Size of the following section in bytes
+_SECTION_HEADER = struct.Struct('<Q')
+
+# {<struct type>: <Struct of a single item>, ...}
+_ITEMS = dict((typecode, struct.Struct('<' + typecode)) for typecode in 'QI?')
+
+# All sections of a database in the order they are stored. F is the number
+# of functions, S the number of strings and T the number of string texts.
+SECTIONS = (
+    # Q[S]: Sorted string eas
+    'string_eas',
+    # I[S]: Text index of every string
+    'string_texts',
+    # I[T + 1] and the data of all distinct string texts
+    'text_offsets',
+    'text_data',
+    # Q[F]: Sorted function eas
+    'function_eas',
+    # ?[F]: Renamed flag of every function
+    'function_renamed',
+    # I[F + 1] and the data of all symbols
+    'symbol_offsets',
+    'symbol_data',
+    # I[F + 1] and the data of all demangled names
+    'demangled_offsets',
+    'demangled_data',
+    # CSR arrays: I[F + 1] offsets into the I[...] string indexes
+    'string_ref_offsets',
+    'string_refs',
+    # CSR arrays: I[F + 1] offsets into the I[...] function indexes
+    'xref_to_offsets',
+    'xrefs_to',
+    'xref_from_offsets',
+    'xrefs_from',
+    # I[F + 1] and the data of all fingerprints. Empty if unknown.
+    'fingerprint_offsets',
+    'fingerprint_data',
+    # I[F + 1] and the data of all checksums. Empty if unknown.
+    'checksum_offsets',
+    'checksum_data',
+)
+
+# {<version>: (<name of a section added in this version>, ...), ...}
+# Files of older versions are still readable without these sections.
+_ADDED_SECTIONS = {
+    2: ('fingerprint_offsets', 'fingerprint_data'),
+    3: ('checksum_offsets', 'checksum_data'),
+}
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def is_database_file(f):
+    """Return True if the given file has been written by this module.
+
+    The file position is restored afterwards.
+
+    :param file f: A file opened in binary mode.
+    :rtype: bool
+    """
+    position = f.tell()
+    try:
+        return f.read(len(MAGIC)) == MAGIC
+    finally:
+        f.seek(position)
+
+
+def write_databases(f, databases):
+    """Write the given databases to a file.
+
+    Only the analysed data is written. Lazily created caches and references
+    to other objects are not part of the file.
+
+    :param file f: A file opened in binary mode.
+    :param iterable databases: The databases to write.
+    """
+    databases = tuple(databases)
+    f.write(_FILE_HEADER.pack(MAGIC, VERSION, len(databases)))
+    for database in databases:
+        _write_database(f, database)
+
+
+def _write_database(f, database):
+    """Write a single database. See :func:`write_databases`."""
+    strings = database.strings
+    string_eas = sorted(strings)
+    string_index = dict((ea, index) for index, ea in enumerate(string_eas))
+
+    # {<str>: <text index>, ...}
+    text_index = {}
+    string_texts = [
+        text_index.setdefault(strings[ea], len(text_index))
+        for ea in string_eas]
+    texts = sorted(text_index, key=text_index.__getitem__)
+
+    functions = database.functions
+    function_eas = sorted(functions)
+    function_index = dict(
+        (ea, index) for index, ea in enumerate(function_eas))
+    functions = [functions[ea] for ea in function_eas]
+
+    text_offsets, text_data = pack_blob(texts)
+    symbol_offsets, symbol_data = pack_blob(
+        function.symbol for function in functions)
+    demangled_offsets, demangled_data = pack_blob(
+        function.demangled_name or '' for function in functions)
+    string_ref_offsets, string_refs = pack_csr(
+        (function.string_eas for function in functions), string_index)
+    xref_to_offsets, xrefs_to = pack_csr(
+        (function.xref_to_eas for function in functions), function_index)
+    xref_from_offsets, xrefs_from = pack_csr(
+        (function.xref_from_eas for function in functions), function_index)
+    fingerprint_offsets, fingerprint_data = pack_blob(
+        function.fingerprint or '' for function in functions)
+    checksum_offsets, checksum_data = pack_blob(
+        function.checksum or '' for function in functions)
+
+    f.write(_DATABASE_HEADER.pack(
+        len(function_eas), len(string_eas), len(texts)))
+    for data in (
+            pack('Q', string_eas),
+            pack('I', string_texts),
+            text_offsets,
+            text_data,
+            pack('Q', function_eas),
+            pack('?', [function.renamed for function in functions]),
+            symbol_offsets,
+            symbol_data,
+            demangled_offsets,
+            demangled_data,
+            string_ref_offsets,
+            string_refs,
+            xref_to_offsets,
+            xrefs_to,
+            xref_from_offsets,
+            xrefs_from,
+            fingerprint_offsets,
+            fingerprint_data,
+            checksum_offsets,
+            checksum_data):
+        write_section(f, data)
+
+
+def write_section(f, data):
+    """Write a section with its header.
+
+    :param file f: A file opened in binary mode.
+    :param str data: The packed content of the section.
+    """
+    f.write(_SECTION_HEADER.pack(len(data)))
+    f.write(data)
+
+
+def read_databases(buffer):
+    """Read the layouts of all databases stored in the given buffer.
+
+    :param buffer: A string or memory map with the content of a database
+        file.
+    :return: A layout for every database in the buffer.
+    :rtype: tuple
+    :raise ValueError: Raised when the buffer is not a database file or has
+        been written by an incompatible version.
+    """
+    magic, version, count = _FILE_HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('Not a database file.')
+
+    if not 1 <= version <= VERSION:
+        raise ValueError(
+            'Unsupported database version {0} (expected {1}).'.format(
+                version, VERSION))
+
+    layouts = []
+    offset = _FILE_HEADER.size
+    for index in xrange(count):
+        layout = DatabaseLayout(buffer, offset, version)
+        layouts.append(layout)
+        offset = layout.end
+
+    return tuple(layouts)
+
+
+def pack(typecode, values):
+    """Pack the values as little-endian array of the given struct type."""
+    values = tuple(values)
+    return struct.pack('<{0}{1}'.format(len(values), typecode), *values)
+
+
+def pack_blob(strings):
+    """Pack the strings as an I[N + 1] offset array and their data.
+
+    :rtype: tuple
+    """
+    offsets = [0]
+    data = []
+    end = 0
+    for string in strings:
+        data.append(string)
+        end += len(string)
+        offsets.append(end)
+
+    return pack('I', offsets), ''.join(data)
+
+
+def pack_csr(rows, index):
+    """Pack the rows of eas as compressed sparse rows of indexes.
+
+    :param iterable rows: An iterable of ea collections.
+    :param dict index: {<ea>: <index>, ...}
+    :return: The packed I[N + 1] offsets and I[...] indexes.
+    :rtype: tuple
+    """
+    offsets = [0]
+    values = []
+    for eas in rows:
+        values.extend(sorted(index[ea] for ea in eas))
+        offsets.append(len(values))
+
+    return pack('I', offsets), pack('I', values)
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SectionLayout(object):
+    """Locates consecutive sections inside a buffer."""
+
+    def __init__(self, buffer, offset, names):
+        """Initialize the object.
+
+        :param buffer: A string or memory map with the content of a file.
+        :param int offset: Offset of the first section header in the buffer.
+        :param iterable names: Names of the sections in the order they are
+            stored.
+        """
+        self.buffer = buffer
+
+        # {<section name>: (<offset>, <size>), ...}
+        self.sections = {}
+        for name in names:
+            size, = _SECTION_HEADER.unpack_from(buffer, offset)
+            offset += _SECTION_HEADER.size
+            self.sections[name] = (offset, size)
+            offset += size
+
+        #: Offset right after the last section
+        self.end = offset
+
+    def has_section(self, name):
+        """Return True if the file contains the given section.
+
+        Files written by older versions don't contain all sections.
+
+        :param str name: Name of the section.
+        :rtype: bool
+        """
+        return name in self.sections
+
+    def unpack(self, name, typecode):
+        """Unpack a whole section.
+
+        :param str name: Name of the section.
+        :param str typecode: The struct type of the section's items.
+        :rtype: tuple
+        """
+        offset, size = self.sections[name]
+        count = size // struct.calcsize(typecode)
+        return struct.unpack_from(
+            '<{0}{1}'.format(count, typecode), self.buffer, offset)
+
+    def item(self, name, typecode, index):
+        """Unpack a single item of a section.
+
+        :param str name: Name of the section.
+        :param str typecode: The struct type of the section's items.
+        :param int index: Index of the item.
+        """
+        item = _ITEMS[typecode]
+        return item.unpack_from(
+            self.buffer, self.sections[name][0] + index * item.size)[0]
+
+    def find(self, name, value):
+        """Find a value in a sorted Q section using a binary search.
+
+        :param str name: Name of the section.
+        :param int value: The value to search for.
+        :return: Index of the value or -1 if it has not been found.
+        :rtype: int
+        """
+        offset, size = self.sections[name]
+        unpack_from = _ITEMS['Q'].unpack_from
+        buffer = self.buffer
+        count = size // 8
+        low = 0
+        high = count
+        while low < high:
+            middle = (low + high) // 2
+            if unpack_from(buffer, offset + middle * 8)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low < count and unpack_from(buffer, offset + low * 8)[0] == value:
+            return low
+
+        return -1
+
+    def bisect_blob(self, name, value):
+        """Find the position of a string in a sorted blob section using a
+        binary search.
+
+        :param str name: Name of the section without its suffix.
+        :param str value: The string to search for.
+        :return: Index of the first string that is not less than the value.
+            It is the number of strings if there is none.
+        :rtype: int
+        """
+        low = 0
+        high = self.sections[name + '_offsets'][1] // 4 - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.blob_item(name, middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def blob_item(self, name, index):
+        """Unpack a single string of a blob section.
+
+        :param str name: Name of the section without its suffix.
+        :param int index: Index of the string.
+        :rtype: str
+        """
+        offsets_name = name + '_offsets'
+        start = self.sections[name + '_data'][0]
+        return self.buffer[
+            start + self.item(offsets_name, 'I', index):
+            start + self.item(offsets_name, 'I', index + 1)]
+
+    def csr_row(self, name, offsets_name, index):
+        """Unpack a single row of compressed sparse rows.
+
+        :param str name: Name of the section with the indexes.
+        :param str offsets_name: Name of the section with the row offsets.
+        :param int index: Index of the row.
+        :return: The indexes stored in the row.
+        :rtype: tuple
+        """
+        start = self.item(offsets_name, 'I', index)
+        end = self.item(offsets_name, 'I', index + 1)
+        return struct.unpack_from(
+            '<{0}I'.format(end - start), self.buffer,
+            self.sections[name][0] + start * 4)
+
+    def unpack_blob(self, name):
+        """Unpack all strings of a blob section.
+
+        :param str name: Name of the section without its suffix.
+        :rtype: list
+        """
+        offsets = self.unpack(name + '_offsets', 'I')
+        start, size = self.sections[name + '_data']
+        data = self.buffer[start:start + size]
+        return [
+            data[offsets[index]:offsets[index + 1]]
+            for index in xrange(len(offsets) - 1)]
+
+    def unpack_csr(self, name, offsets_name, eas):
+        """Unpack compressed sparse rows and map their indexes to eas.
+
+        :param str name: Name of the section with the indexes.
+        :param str offsets_name: Name of the section with the row offsets.
+        :param tuple eas: Eas to map the indexes to.
+        :return: A list of eas for every row.
+        :rtype: list
+        """
+        offsets = self.unpack(offsets_name, 'I')
+        values = map(eas.__getitem__, self.unpack(name, 'I'))
+        return [
+            values[offsets[index]:offsets[index + 1]]
+            for index in xrange(len(offsets) - 1)]
+
+
+class DatabaseLayout(SectionLayout):
+    """Locates the sections of a single database inside a buffer."""
+
+    def __init__(self, buffer, offset, version=VERSION):
+        """Initialize the object.
+
+        :param buffer: A string or memory map with the content of a database
+            file.
+        :param int offset: Offset of the database header in the buffer.
+        :param int version: Version of the file layout.
+        """
+        self.version = version
+        (self.function_count, self.string_count,
+            self.text_count) = _DATABASE_HEADER.unpack_from(buffer, offset)
+
+        missing = set()
+        for added_version, names in _ADDED_SECTIONS.iteritems():
+            if version < added_version:
+                missing.update(names)
+
+        super(DatabaseLayout, self).__init__(
+            buffer, offset + _DATABASE_HEADER.size,
+            [name for name in SECTIONS if name not in missing])
+
+    def read_strings(self):
+        """Return all strings of the database.
+
+        :return: {<string ea>: <str>, ...}
+        :rtype: dict
+        """
+        texts = self.unpack_blob('text')
+        return dict(
+            (ea, texts[text]) for ea, text in zip(
+                self.unpack('string_eas', 'Q'),
+                self.unpack('string_texts', 'I')))
+
+    def read_functions(self):
+        """Return the data of all functions of the database.
+
+        :return: A tuple with the ea, symbol, demangled name, string eas,
+            xref to eas, xref from eas, the renamed flag, the fingerprint and
+            the checksum of every function.
+        :rtype: list
+        """
+        string_eas = self.unpack('string_eas', 'Q')
+        function_eas = self.unpack('function_eas', 'Q')
+
+        return zip(
+            function_eas,
+            self.unpack_blob('symbol'),
+            self.unpack_blob('demangled'),
+            self.unpack_csr(
+                'string_refs', 'string_ref_offsets', string_eas),
+            self.unpack_csr('xrefs_to', 'xref_to_offsets', function_eas),
+            self.unpack_csr(
+                'xrefs_from', 'xref_from_offsets', function_eas),
+            self.unpack('function_renamed', '?'),
+            self._unpack_optional_blob('fingerprint'),
+            self._unpack_optional_blob('checksum'))
+
+    def _unpack_optional_blob(self, name):
+        """Unpack a blob section with a string for every function. Empty
+        strings and missing sections are returned as None."""
+        if not self.has_section(name + '_data'):
+            return [None] * self.function_count
+
+        return [string or None for string in self.unpack_blob(name)]
@@ -0,0 +1,147 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+from random import Random
+
+# discover_win
+from backends import StandInBackend
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+# First ea of the functions and strings of the generated binaries
+LINUX_FUNCTION_BASE = 0x08048000
+LINUX_STRING_BASE = 0x09000000
+WINDOWS_FUNCTION_BASE = 0x10001000
+WINDOWS_STRING_BASE = 0x11000000
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def generate_pair(
+        function_count=10000, string_density=1.0, xref_degree=3.0,
+        inlining_noise=0.05, platform_strings=0.1, seed=0):
+    """Generate a Linux and a Windows binary of the same code base.
+
+    The Linux binary has its symbols. The Windows binary has the same
+    functions in a different order with ``sub_`` names. MSVC inlines a part
+    of the called functions, which removes the call and moves the strings of
+    the called function into the caller.
+
+    :param int function_count: Number of functions of each binary.
+    :param float string_density: Average number of strings per function.
+    :param float xref_degree: Average number of called functions per
+        function.
+    :param float inlining_noise: Probability that a call is inlined in the
+        Windows binary.
+    :param float platform_strings: Probability that a function uses an
+        additional string that only exists on its platform.
+    :param int seed: Seed of the random number generator.
+    :return: A tuple with the Linux :class:`backends.StandInBackend`, the
+        Windows :class:`backends.StandInBackend` and a dict that maps every
+        Windows function ea to its Linux symbol.
+    :rtype: tuple
+    """
+    random = Random(seed)
+    text_count = max(1, int(function_count * string_density))
+
+    # [(<symbol>, [<string text>, ...], [<called index>, ...]), ...]
+    functions = []
+    for index in xrange(function_count):
+        texts = set(
+            'string {0}'.format(random.randrange(text_count))
+            for x in xrange(_random_count(random, string_density)))
+        calls = set(
+            random.randrange(function_count)
+            for x in xrange(_random_count(random, xref_degree)))
+        calls.discard(index)
+        functions.append(
+            ('_Z{0}func{1}v'.format(len(str(index)) + 4, index),
+                texts, calls))
+
+    order = range(function_count)
+    random.shuffle(order)
+    linux_eas = [LINUX_FUNCTION_BASE + index * 16 for index in xrange(
+        function_count)]
+    windows_eas = [WINDOWS_FUNCTION_BASE + order[index] * 16 for index in
+                   xrange(function_count)]
+
+    linux = _Binary(LINUX_STRING_BASE)
+    windows = _Binary(WINDOWS_STRING_BASE)
+    truth = {}
+    for index, (symbol, texts, calls) in enumerate(functions):
+        linux_texts = set(texts)
+        windows_texts = set(texts)
+        windows_calls = set()
+        for call in calls:
+            if random.random() < inlining_noise:
+                windows_texts.update(functions[call][1])
+            else:
+                windows_calls.add(call)
+
+        if random.random() < platform_strings:
+            linux_texts.add('linux {0}'.format(index))
+
+        if random.random() < platform_strings:
+            windows_texts.add('windows {0}'.format(index))
+
+        linux.add_function(
+            linux_eas[index], symbol, linux_texts,
+            (linux_eas[call] for call in calls))
+
+        windows_ea = windows_eas[index]
+        windows.add_function(
+            windows_ea, 'sub_{0:X}'.format(windows_ea), windows_texts,
+            (windows_eas[call] for call in windows_calls))
+        truth[windows_ea] = symbol
+
+    return linux.create_backend(), windows.create_backend(), truth
+
+
+def _random_count(random, mean):
+    """Return a random count with roughly the given mean.
+
+    The counts are exponentially distributed, so most functions use only a
+    few strings or calls and some use a lot.
+    """
+    if mean <= 0:
+        return 0
+
+    return int(random.expovariate(1.0 / (mean + 0.5)))
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class _Binary(object):
+    """Collects the functions and strings of a generated binary."""
+
+    def __init__(self, string_base):
+        self.string_base = string_base
+
+        # {<string text>: <string ea>, ...}
+        self.string_eas = {}
+
+        # [(<ea>, <symbol>, <demangled name>, <string eas>, <calls>), ...]
+        self.functions = []
+
+    def add_function(self, ea, symbol, texts, calls):
+        string_eas = self.string_eas
+        eas = []
+        for text in texts:
+            string_ea = string_eas.get(text)
+            if string_ea is None:
+                string_eas[text] = string_ea = (
+                    self.string_base + len(string_eas) * 16)
+
+            eas.append(string_ea)
+
+        self.functions.append((ea, symbol, symbol, eas, tuple(calls)))
+
+    def create_backend(self):
+        return StandInBackend(
+            ((ea, text) for text, ea in self.string_eas.iteritems()),
+            self.functions)
@@ -0,0 +1,94 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import sys
+from cStringIO import StringIO
+
+# discover_win
+from create_discover_database import Search
+from database import Database
+from database import save_databases
+from synthetic import generate_pair
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def create_pair(function_count=1500, seed=0, fingerprints=False):
+    """Generate a binary pair and clean up its databases.
+
+    :param int function_count: Number of functions of each binary.
+    :param int seed: Seed of the random number generator.
+    :param bool fingerprints: If True, the Windows functions get a
+        fingerprint that only depends on their Linux symbol, as if their
+        code didn't change between two builds.
+    :return: A tuple with the Linux database, the Windows database and a
+        dict that maps every Windows function ea to its Linux symbol.
+    :rtype: tuple
+    """
+    linux_backend, windows_backend, truth = generate_pair(
+        function_count, seed=seed)
+    if fingerprints:
+        add_code(windows_backend, truth)
+
+    linux_db, windows_db = quietly(
+        lambda: (Database(linux_backend), Database(windows_backend)))
+    quietly(linux_db.cleanup, windows_db)
+    return linux_db, windows_db, truth
+
+
+def generate_windows_backend(function_count=1500, seed=0):
+    """Generate the Windows binary of :func:`create_pair` with code.
+
+    :return: A tuple with the Windows backend and a dict that maps every
+        Windows function ea to its Linux symbol.
+    :rtype: tuple
+    """
+    linux_backend, windows_backend, truth = generate_pair(
+        function_count, seed=seed)
+    add_code(windows_backend, truth)
+    return windows_backend, truth
+
+
+def add_code(backend, truth):
+    """Give every function of a stand-in backend the code of its Linux
+    symbol.
+
+    :param backends.StandInBackend backend: The backend.
+    :param dict truth: {<function ea>: <Linux symbol>, ...}
+    """
+    for ea, (demangled_name, string_eas, calls, code) in (
+            backend.functions.items()):
+        backend.functions[ea] = (
+            demangled_name, string_eas, calls, 'code of ' + truth[ea])
+
+
+def save_pair(directory, linux_db, windows_db, name='cleaned_up.db'):
+    """Save a database pair to a directory and return the path of the
+    file."""
+    file_path = os.path.join(directory, name)
+    save_databases(file_path, (linux_db, windows_db))
+    return file_path
+
+
+def discover(linux_db, windows_db, **options):
+    """Run a search without printing its progress.
+
+    :param options: Further options for :class:`Search`.
+    :return: A tuple with the search and the sorted list of its results.
+    :rtype: tuple
+    """
+    search = quietly(Search, linux_db, windows_db, **options)
+    return search, sorted(quietly(lambda: list(search.discover())))
+
+
+def quietly(function, *args, **kwargs):
+    """Call a function and swallow everything it prints."""
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        sys.stdout = stdout
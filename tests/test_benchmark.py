@@ -0,0 +1,38 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import json
+import sys
+import unittest
+from cStringIO import StringIO
+
+# discover_win
+from benchmark import main
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class BenchmarkTest(unittest.TestCase):
+    """The command line interface of the benchmark."""
+
+    def test_report_on_stdout(self):
+        """Without an output file, stdout only contains the report."""
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        try:
+            main(['--functions', '300'])
+            output = sys.stdout.getvalue()
+            progress = sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+
+        report, = json.loads(output)
+        self.assertEqual(report['parameters']['function_count'], 300)
+        self.assertGreater(report['results']['found'], 0)
+        self.assertTrue(progress)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from create_discover_database import Search
+from create_discover_database import create_discover_database
+from results import read_records
+from tests.common import create_pair
+from tests.common import quietly
+from tests.common import save_pair
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class _Interrupt(Exception):
+    """Raised to interrupt a search after a checkpoint."""
+
+
+class CheckpointTest(unittest.TestCase):
+    """Resuming an interrupted search from its last checkpoint."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.linux_db, self.windows_db, truth = create_pair(1500)
+        self.cleaned_up_path = save_pair(
+            self.directory, self.linux_db, self.windows_db)
+        self.expected_path = os.path.join(self.directory, 'expected.db')
+        self.expected = quietly(
+            create_discover_database, self.cleaned_up_path,
+            self.expected_path)
+        self.discovered_path = os.path.join(self.directory, 'discovered.db')
+        self.checkpoint_path = os.path.join(self.directory, 'checkpoint')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume_after_first_iteration(self):
+        self._check_resume(1)
+
+    def test_resume_after_last_iteration(self):
+        self._check_resume(None)
+
+    def test_interrupt_resumed_search(self):
+        """A resumed search that is interrupted before its first checkpoint
+        keeps the results of the interrupted search."""
+        self._interrupt(1)
+        records = list(read_records(self.discovered_path))
+        self._interrupt(0)
+        self.assertEqual(
+            list(read_records(self.discovered_path))[:len(records)],
+            records)
+        self._check_result()
+
+    def test_changed_database(self):
+        """The checkpoint of another database with the same number of
+        functions is ignored."""
+        self._interrupt(None)
+        for string_ea in sorted(self.windows_db.strings)[::10]:
+            self.windows_db.remove_string(string_ea)
+
+        save_pair(self.directory, self.linux_db, self.windows_db)
+        self.expected = quietly(
+            create_discover_database, self.cleaned_up_path,
+            self.expected_path)
+        self.assertNotEqual(sorted(self.expected), sorted(self.result))
+        self._check_result()
+
+    def test_iteration_log(self):
+        """The log of a resumed search continues the numbering of the
+        interrupted search."""
+        log_path = os.path.join(self.directory, 'iterations.jsonl')
+        self._interrupt(2, iteration_log_path=log_path)
+        self._check_result(iteration_log_path=log_path)
+        with open(log_path) as f:
+            numbers = [json.loads(line)['iteration'] for line in f]
+
+        self.assertEqual(numbers, range(1, len(numbers) + 1))
+
+    def _check_resume(self, iteration):
+        """Interrupt a search after the checkpoint of an iteration, resume
+        it and compare it with an uninterrupted search.
+
+        :param int iteration: The iteration to interrupt the search after.
+            If None, the search is completed before it is resumed.
+        """
+        self._interrupt(iteration)
+        self._check_result()
+
+    def _interrupt(self, iteration, **options):
+        """Run a search that is interrupted after the checkpoint of an
+        iteration.
+
+        :param int iteration: The iteration to interrupt the search after.
+            If 0, the search is interrupted before its first checkpoint. If
+            None, the search is completed.
+        :param options: Further options for
+            :func:`create_discover_database`.
+        """
+        save_checkpoint = Search._save_checkpoint
+
+        def interrupt(search, done=False):
+            if iteration == 0:
+                raise _Interrupt
+
+            save_checkpoint(search, done)
+            if search.iteration == iteration:
+                raise _Interrupt
+
+        Search._save_checkpoint = interrupt
+        try:
+            if iteration is None:
+                self.result = quietly(
+                    create_discover_database, self.cleaned_up_path,
+                    self.discovered_path,
+                    checkpoint_path=self.checkpoint_path, **options)
+            else:
+                self.assertRaises(
+                    _Interrupt, quietly, create_discover_database,
+                    self.cleaned_up_path, self.discovered_path,
+                    checkpoint_path=self.checkpoint_path, **options)
+        finally:
+            Search._save_checkpoint = save_checkpoint
+
+    def _check_result(self, **options):
+        """Resume the search and compare it with an uninterrupted
+        search.
+
+        :param options: Further options for
+            :func:`create_discover_database`.
+        """
+        result = quietly(
+            create_discover_database, self.cleaned_up_path,
+            self.discovered_path, checkpoint_path=self.checkpoint_path,
+            **options)
+        self.assertEqual(sorted(result), sorted(self.expected))
+        self.assertEqual(
+            sorted(read_records(self.discovered_path)),
+            sorted(read_records(self.expected_path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
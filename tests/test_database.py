@@ -0,0 +1,134 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import unittest
+from random import Random
+
+# discover_win
+from database import Database
+from tests.common import generate_windows_backend
+from tests.common import quietly
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class UpdateTest(unittest.TestCase):
+    """Incremental updates of a database after the binary changed."""
+
+    def setUp(self):
+        self.backend, truth = generate_windows_backend(1000)
+        self.database = quietly(Database, self.backend)
+
+    def test_unchanged(self):
+        """An unchanged binary gives no changes."""
+        changes = quietly(self.database.update, self.backend)
+        self.assertFalse(changes)
+
+    def test_update_equals_new_database(self):
+        """An updated database equals a database created from scratch."""
+        backend = self.backend
+        random = Random(1)
+        eas = sorted(backend.functions)
+        removed = random.sample(eas, 20)
+        for ea in removed:
+            del backend.functions[ea]
+            del backend.names[ea]
+
+        # Their callers changed as well
+        for ea, (demangled_name, strings, calls, code) in (
+                backend.functions.items()):
+            if not set(removed).isdisjoint(calls):
+                backend.functions[ea] = (
+                    demangled_name, strings,
+                    tuple(call for call in calls if call not in removed),
+                    code)
+
+        # Changed strings and calls
+        eas = sorted(backend.functions)
+        string_eas = sorted(backend.strings)
+        changed = random.sample(eas, 40)
+        for ea in changed:
+            demangled_name, strings, calls, code = backend.functions[ea]
+            backend.functions[ea] = (
+                demangled_name, strings + (random.choice(string_eas),),
+                calls + (random.choice(eas),), code)
+
+        # Added functions that are called by existing functions
+        added = []
+        for index in xrange(10):
+            ea = 0x20000000 + index * 16
+            backend.names[ea] = 'sub_{0:X}'.format(ea)
+            backend.functions[ea] = (
+                None, (random.choice(string_eas),), (random.choice(eas),),
+                'new code {0}'.format(index))
+            caller = random.choice(eas)
+            demangled_name, strings, calls, code = backend.functions[caller]
+            backend.functions[caller] = (
+                demangled_name, strings, calls + (ea,), code)
+            added.append(ea)
+
+        # Changed texts of existing strings
+        for ea in random.sample(string_eas, 10):
+            backend.strings[ea] = 'changed {0}'.format(ea)
+
+        changes = quietly(self.database.update, backend)
+        self.assertEqual(set(changes.removed), set(removed))
+        self.assertEqual(set(changes.added), set(added))
+        expected = quietly(Database, backend)
+        self.assertEqual(
+            dict(self.database.strings), dict(expected.strings))
+        self.assertEqual(_describe(self.database), _describe(expected))
+        for ea in expected.functions:
+            function = self.database.get_function(ea)
+            self.assertIs(
+                self.database.get_function_by_symbol(function.symbol),
+                function)
+
+
+class StringTest(unittest.TestCase):
+    """Adding and removing strings of functions."""
+
+    def setUp(self):
+        self.database = Database.from_data(
+            {1: 'a', 2: 'b'}, ((16, 'f', None, (1,)), (32, 'g', None, ())))
+        self.function = self.database.get_function(16)
+
+    def test_remove_added_string(self):
+        """A string that has been added to a function can be removed from
+        the database."""
+        self.function.add_string(2)
+        self.database.remove_string(2)
+        self.assertEqual(self.function.strings, frozenset(['a']))
+
+    def test_add_removed_string(self):
+        """A string that has been removed from a function isn't removed
+        from it again."""
+        self.function.remove_string(1)
+        self.database.get_function(32).add_string(1)
+        self.database.remove_string(1)
+        self.assertEqual(self.function.strings, frozenset())
+        self.assertEqual(
+            self.database.get_function(32).strings, frozenset())
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _describe(database):
+    """Return the extracted data of every function of a database.
+
+    :rtype: dict
+    """
+    return dict(
+        (function.ea, (
+            function.symbol, tuple(function.string_eas),
+            tuple(sorted(function.xref_to_eas)),
+            tuple(sorted(function.xref_from_eas)), function.fingerprint,
+            function.checksum))
+        for function in database.functions.itervalues())
+
+
+if __name__ == '__main__':
+    unittest.main()
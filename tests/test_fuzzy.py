@@ -0,0 +1,70 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import unittest
+
+# discover_win
+from fuzzy import LshIndex
+from fuzzy import jaccard
+from tests.common import create_pair
+from tests.common import discover
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class LshIndexTest(unittest.TestCase):
+    """Candidates of the MinHash index."""
+
+    def test_jaccard(self):
+        self.assertEqual(jaccard(set('abc'), set('bcd')), 0.5)
+        self.assertEqual(jaccard(set(), set()), 0.0)
+
+    def test_candidates(self):
+        """Equal and similar feature sets are candidates, disjoint ones are
+        not."""
+        index = LshIndex()
+        features = set(range(20))
+        index.add('equal', features)
+        index.add('similar', features - set([0]))
+        index.add('disjoint', set(range(100, 120)))
+        self.assertEqual(
+            index.candidates(features), set(['equal', 'similar']))
+
+
+class FuzzySearchTest(unittest.TestCase):
+    """The fuzzy search after all other searches."""
+
+    THRESHOLD = 0.5
+
+    @classmethod
+    def setUpClass(cls):
+        linux_db, windows_db, cls.truth = create_pair(3000)
+        cls.search, cls.result = discover(
+            linux_db, windows_db, fuzzy_threshold=cls.THRESHOLD)
+        linux_db, windows_db, truth = create_pair(3000)
+        cls.exact_search, cls.exact_result = discover(linux_db, windows_db)
+
+    def test_finds_more_functions(self):
+        """The fuzzy search only adds results."""
+        self.assertLess(set(self.exact_result), set(self.result))
+
+    def test_fuzzy_matches(self):
+        """Fuzzy matches reach the threshold and are right."""
+        fuzzy = [
+            (ea, symbol) for ea, symbol in self.result
+            if self.search.provenance[ea].stage == 'fuzzy']
+        self.assertTrue(fuzzy)
+        for ea, symbol in fuzzy:
+            self.assertGreaterEqual(
+                self.search.provenance[ea].confidence, self.THRESHOLD)
+            self.assertEqual(symbol, self.truth[ea])
+
+    def test_no_duplicate_symbols(self):
+        symbols = [symbol for ea, symbol in self.result]
+        self.assertEqual(len(symbols), len(set(symbols)))
+
+
+if __name__ == '__main__':
+    unittest.main()
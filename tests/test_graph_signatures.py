@@ -0,0 +1,88 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import unittest
+
+# discover_win
+from database import Database
+from graph_signatures import CONFIDENCES
+from graph_signatures import GraphSignatures
+from graph_signatures import find_unique_matches
+from tests.common import create_pair
+from tests.common import discover
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class FindUniqueMatchesTest(unittest.TestCase):
+    """Matching functions by their signatures."""
+
+    def test_levels(self):
+        """Ambiguous keys are resolved on later levels."""
+        linux_keys = {
+            'a': (1, None, None),
+            'b': (2, 'x', None),
+            'c': (2, 'y', None),
+        }
+        windows_keys = {
+            'A': (1, None, None),
+            'B': (2, 'x', None),
+            'C': (2, 'y', None),
+        }
+        self.assertEqual(
+            sorted(find_unique_matches(linux_keys, windows_keys)),
+            [('A', 'a', 0), ('B', 'b', 1), ('C', 'c', 1)])
+
+    def test_matched_once(self):
+        """A function matched on one level is ignored on later levels."""
+        linux_keys = {'a': (1, 'x', None), 'b': (2, 'x', None)}
+        windows_keys = {'A': (1, None, None), 'B': (3, 'x', None)}
+        self.assertEqual(
+            find_unique_matches(linux_keys, windows_keys), [('A', 'a', 0)])
+
+
+class GraphSignaturesTest(unittest.TestCase):
+    """Signatures of the functions of a small call graph."""
+
+    def setUp(self):
+        # f calls g and h, g calls h
+        self.database = Database.from_data({}, (
+            (16, 'f', None, (), (), (32, 48)),
+            (32, 'g', None, (), (16,), (48,)),
+            (48, 'h', None, (), (16, 32), ())))
+
+    def test_degree_signature(self):
+        signatures = GraphSignatures()
+        self.assertEqual(
+            signatures.get_degree_signature(self.database.get_function(16)),
+            (0, 2, (0, 1)))
+
+    def test_keys(self):
+        """Only functions with anchors nearby have keys."""
+        keys = GraphSignatures().get_keys(
+            self.database.get_function(32), set(['f']))
+        self.assertNotIn(None, keys)
+        keys = GraphSignatures().get_keys(
+            self.database.get_function(16), set())
+        self.assertEqual(keys, (None, None, None))
+
+
+class StructuralSearchTest(unittest.TestCase):
+    """The structural search on a synthetic binary pair."""
+
+    def test_structural_matches(self):
+        linux_db, windows_db, truth = create_pair(3000)
+        search, result = discover(linux_db, windows_db)
+        structural = [
+            (ea, symbol) for ea, symbol in result
+            if search.provenance[ea].stage == 'structural']
+        self.assertTrue(structural)
+        for ea, symbol in structural:
+            self.assertIn(search.provenance[ea].confidence, CONFIDENCES)
+            self.assertEqual(symbol, truth[ea])
+
+
+if __name__ == '__main__':
+    unittest.main()
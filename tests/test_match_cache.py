@@ -0,0 +1,76 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from match_cache import MIN_CONFIDENCE
+from match_cache import MatchCache
+from provenance import Provenance
+from tests.common import create_pair
+from tests.common import discover
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class MatchCacheTest(unittest.TestCase):
+    """Reusing the results of a previous build."""
+
+    @classmethod
+    def setUpClass(cls):
+        linux_db, cls.windows_db, truth = create_pair(1500, fingerprints=True)
+        cls.search, cls.result = discover(linux_db, cls.windows_db)
+
+    def test_update_skips_uncertain_matches(self):
+        """Only matches with enough confidence are remembered."""
+        cache = MatchCache()
+        cache.update(self.windows_db, self.search.provenance)
+        self.assertTrue(cache.symbols)
+        for ea, symbol in self.result:
+            fingerprint = self.windows_db.get_function(ea).fingerprint
+            if self.search.provenance[ea].confidence >= MIN_CONFIDENCE:
+                self.assertEqual(cache.symbols[fingerprint], symbol)
+            else:
+                self.assertNotIn(fingerprint, cache.symbols)
+
+    def test_update_threshold(self):
+        """The threshold is taken from the provenance."""
+        ea, symbol = self.result[0]
+        fingerprint = self.windows_db.get_function(ea).fingerprint
+        for confidence, expected in ((0.5, False), (0.9, True)):
+            cache = MatchCache()
+            cache.update(self.windows_db, {
+                ea: Provenance('string', 1, None, 2, confidence)})
+            self.assertEqual(fingerprint in cache.symbols, expected)
+
+    def test_apply_to_next_build(self):
+        """The cached functions of an unchanged build are renamed."""
+        directory = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(directory, 'cache.pkl')
+            cache = MatchCache()
+            cache.update(self.windows_db, self.search.provenance)
+            cache.save(file_path)
+            cache = MatchCache.load(file_path)
+        finally:
+            shutil.rmtree(directory)
+
+        linux_db, windows_db, truth = create_pair(1500, fingerprints=True)
+        hits = cache.apply(linux_db, windows_db)
+        self.assertEqual(len(hits), len(cache.symbols))
+        found = dict(self.result)
+        for function in windows_db.functions.itervalues():
+            if function.renamed:
+                self.assertEqual(function.symbol, found[function.ea])
+                self.assertEqual(hits[function.ea], Provenance(
+                    'match_cache', 0, None, 1,
+                    self.search.provenance[function.ea].confidence))
+
+
+if __name__ == '__main__':
+    unittest.main()
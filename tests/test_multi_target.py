@@ -0,0 +1,81 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from database import Database
+from multi_target import discover_targets
+from results import read_results
+from synthetic import generate_pair
+from tests.common import discover
+from tests.common import quietly
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class MultiTargetTest(unittest.TestCase):
+    """Searching several Windows databases with one Linux reference."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        linux_backend, windows_backend, truth = generate_pair(1500)
+        linux_db, windows_db = quietly(
+            lambda: (Database(linux_backend), Database(windows_backend)))
+        cls.linux_path = os.path.join(cls.directory, 'linux.db')
+        quietly(linux_db.save, cls.linux_path)
+        cls.windows_paths = []
+        for name in ('first', 'second'):
+            file_path = os.path.join(cls.directory, name + '.db')
+            quietly(windows_db.save, file_path)
+            cls.windows_paths.append(file_path)
+
+        quietly(linux_db.cleanup, windows_db)
+        search, cls.expected = discover(linux_db, windows_db)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_single_process(self):
+        self._check_targets(1)
+
+    def test_several_processes(self):
+        self._check_targets(2)
+
+    def test_duplicate_names(self):
+        """The discovered databases of two targets can't have the same
+        name."""
+        self.assertRaises(
+            ValueError, discover_targets, self.linux_path,
+            self.windows_paths[:1] * 2,
+            os.path.join(self.directory, 'duplicates'))
+
+    def _check_targets(self, processes):
+        """Every target gives the result of a search of its own.
+
+        :param int processes: Number of parallel searches.
+        """
+        output_dir = os.path.join(
+            self.directory, 'output{0}'.format(processes))
+        counts = quietly(
+            discover_targets, self.linux_path, self.windows_paths,
+            output_dir, processes)
+        self.assertEqual(
+            counts,
+            dict((path, len(self.expected)) for path in self.windows_paths))
+        for name in ('first', 'second'):
+            self.assertEqual(
+                sorted(read_results(
+                    os.path.join(output_dir, name + '.discovered.db'))),
+                self.expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
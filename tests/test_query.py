@@ -0,0 +1,122 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from create_discover_database import create_discover_database
+from extraction import get_string_set_digest
+from query import QueryIndex
+from query import get_index_path
+from tests.common import create_pair
+from tests.common import quietly
+from tests.common import save_pair
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class QueryIndexTest(unittest.TestCase):
+    """Lookups of the query index compared with a scan of the database."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        linux_db, cls.windows_db, truth = create_pair(1000)
+        cls.database_path = save_pair(
+            cls.directory, linux_db, cls.windows_db)
+        cls.discovered_path = os.path.join(cls.directory, 'discovered.db')
+        cls.discovered = dict(quietly(
+            create_discover_database, cls.database_path,
+            cls.discovered_path))
+        cls.index = quietly(
+            QueryIndex.open, cls.database_path, 1, cls.discovered_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_index_file(self):
+        self.assertTrue(
+            os.path.isfile(get_index_path(self.database_path, 1)))
+
+    def test_find_symbols(self):
+        self.assertEqual(self.index.find_symbols(''), self._scan())
+        ea, symbol = sorted(self.discovered.iteritems())[0]
+        self.assertIn((ea, symbol), self.index.find_symbols(symbol))
+
+    def test_find_symbols_matched(self):
+        self.assertEqual(
+            self.index.find_symbols('', True),
+            self._scan(lambda function: True, True))
+        self.assertEqual(
+            self.index.find_symbols('', False),
+            self._scan(lambda function: True, False))
+
+    def test_find_string(self):
+        for text in sorted(set(self.windows_db.strings.itervalues()))[:20]:
+            self.assertEqual(
+                self.index.find_string(text),
+                self._scan(lambda function: text in function.strings))
+
+    def test_find_string_set(self):
+        for function in self._functions_with_strings()[:20]:
+            texts = function.strings
+            self.assertEqual(
+                self.index.find_string_set(texts, False),
+                self._scan(
+                    lambda function: function.strings == texts, False))
+
+    def test_find_callers_and_callees(self):
+        for ea, symbol in sorted(self.discovered.iteritems())[:20]:
+            function = self.windows_db.get_function(ea)
+            callers = set(caller.ea for caller in function.xrefs_to)
+            callees = set(callee.ea for callee in function.xrefs_from)
+            self.assertEqual(
+                self.index.find_callers(symbol),
+                self._scan(lambda function: function.ea in callers))
+            self.assertEqual(
+                self.index.find_callees(symbol),
+                self._scan(lambda function: function.ea in callees))
+
+    def test_string_set_digest(self):
+        """The digest doesn't depend on the interning of the strings."""
+        text = ''.join(('string', ' set'))
+        self.assertEqual(
+            get_string_set_digest((text, 'b')),
+            get_string_set_digest(('b', intern(text), 'b')))
+
+    def _functions_with_strings(self):
+        """Return all Windows functions with strings sorted by their
+        eas."""
+        return sorted(
+            (function for function in self.windows_db.functions.itervalues()
+                if function.string_eas),
+            key=lambda function: function.ea)
+
+    def _scan(self, predicate=lambda function: True, matched=None):
+        """Return the expected result of a lookup by scanning all Windows
+        functions.
+
+        :param predicate: Returns True for the functions of the result.
+        :param bool matched: Restricts the result to (not) matched
+            functions.
+        :rtype: list
+        """
+        result = []
+        for ea in sorted(self.windows_db.functions):
+            function = self.windows_db.get_function(ea)
+            is_matched = function.renamed or ea in self.discovered
+            if ((matched is None or is_matched == matched) and
+                    predicate(function)):
+                result.append((ea, self.discovered.get(ea, function.symbol)))
+
+        return result
+
+
+if __name__ == '__main__':
+    unittest.main()
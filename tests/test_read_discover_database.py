@@ -0,0 +1,133 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from backends import StandInBackend
+from read_discover_database import rename_functions
+from tests.common import quietly
+
+
+# =============================================================================
+# >> CONSTANTS
+# =============================================================================
+# Number of functions of the test binary
+FUNCTION_COUNT = 100
+
+# Number of functions per batch
+BATCH_SIZE = 16
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class _Interrupt(Exception):
+    """Raised to interrupt the renaming."""
+
+
+class _InterruptingBackend(StandInBackend):
+    """A backend that is interrupted after a number of renamed
+    functions."""
+
+    def __init__(self, strings, functions, limit):
+        super(_InterruptingBackend, self).__init__(strings, functions)
+        self.limit = limit
+
+        # Eas of all functions whose name has been looked up
+        self.visited = []
+
+    def get_function_name(self, ea):
+        self.visited.append(ea)
+        return super(_InterruptingBackend, self).get_function_name(ea)
+
+    def set_function_name(self, ea, name):
+        if not self.limit:
+            raise _Interrupt
+
+        self.limit -= 1
+        super(_InterruptingBackend, self).set_function_name(ea, name)
+
+
+class RenameFunctionsTest(unittest.TestCase):
+    """Renaming the discovered functions in batches."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.progress_path = os.path.join(self.directory, 'progress')
+        self.eas = [0x1000 + index * 16 for index in xrange(FUNCTION_COUNT)]
+        self.functions = [
+            (ea, '_Z4func{0}v'.format(ea)) for ea in self.eas]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _create_backend(self, limit=None):
+        """Create a binary whose functions have auto-generated names except
+        the first one.
+
+        :param int limit: If given, the backend is interrupted after this
+            number of renamed functions.
+        """
+        functions = [
+            (ea, 'sub_{0:X}'.format(ea), None, (), ()) for ea in self.eas]
+        functions[0] = (self.eas[0], 'named', None, (), ())
+        if limit is None:
+            return StandInBackend({}, functions)
+
+        return _InterruptingBackend({}, functions, limit)
+
+    def test_rename(self):
+        """Only functions with auto-generated names are renamed."""
+        backend = self._create_backend()
+        functions = self.functions + [(0x2000, 'sub_2000')]
+        backend.names[0x2000] = 'sub_2000'
+        count = quietly(
+            rename_functions, functions, backend, batch_size=BATCH_SIZE)
+        self.assertEqual(count, FUNCTION_COUNT - 1)
+        self.assertEqual(backend.names[self.eas[0]], 'named')
+        for ea, symbol in self.functions[1:]:
+            self.assertEqual(backend.names[ea], symbol)
+
+    def test_resume(self):
+        """An interrupted renaming continues after the last batch."""
+        backend = self._create_backend(40)
+        self.assertRaises(
+            _Interrupt, quietly, rename_functions, self.functions, backend,
+            self.progress_path, BATCH_SIZE)
+        self.assertTrue(os.path.isfile(self.progress_path))
+
+        # The interrupted batch is processed again, but its already renamed
+        # functions are skipped.
+        backend.limit = FUNCTION_COUNT
+        backend.visited = []
+        count = quietly(
+            rename_functions, self.functions, backend, self.progress_path,
+            BATCH_SIZE)
+        self.assertEqual(count, FUNCTION_COUNT - 41)
+        self.assertEqual(backend.visited, self.eas[2 * BATCH_SIZE:])
+        for ea, symbol in self.functions[1:]:
+            self.assertEqual(backend.names[ea], symbol)
+
+        self.assertFalse(os.path.isfile(self.progress_path))
+
+    def test_changed_functions(self):
+        """The progress of other functions is ignored."""
+        backend = self._create_backend(40)
+        self.assertRaises(
+            _Interrupt, quietly, rename_functions, self.functions, backend,
+            self.progress_path, BATCH_SIZE)
+
+        backend = self._create_backend()
+        count = quietly(
+            rename_functions, self.functions[1:], backend,
+            self.progress_path, BATCH_SIZE)
+        self.assertEqual(count, FUNCTION_COUNT - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
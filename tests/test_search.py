@@ -0,0 +1,123 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+from call_graph import NO_MATCH
+from create_discover_database import Search
+from create_discover_database import create_discover_database
+from database import open_databases
+from results import read_records
+from tests.common import create_pair
+from tests.common import discover
+from tests.common import quietly
+from tests.common import save_pair
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SearchTest(unittest.TestCase):
+    """Regression tests of the search on a synthetic binary pair."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        linux_db, windows_db, cls.truth = create_pair(3000)
+        cls.file_path = save_pair(cls.directory, linux_db, windows_db)
+        cls.search, cls.result = discover(*open_databases(cls.file_path))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_result(self):
+        """Nearly all functions are found and nearly all of them are
+        right."""
+        wrong = sum(
+            1 for ea, symbol in self.result if self.truth[ea] != symbol)
+        self.assertGreater(len(self.result), len(self.truth) * 0.95)
+        self.assertLess(wrong, len(self.result) * 0.01)
+
+    def test_no_duplicate_symbols(self):
+        """No Linux symbol is given to two Windows functions."""
+        symbols = [symbol for ea, symbol in self.result]
+        self.assertEqual(len(symbols), len(set(symbols)))
+
+    def test_correspondence_is_one_to_one(self):
+        """The correspondence vectors are inverse to each other."""
+        linux_matches = self.search._linux_matches
+        windows_matches = self.search._windows_matches
+        for windows_pos, linux_pos in enumerate(windows_matches):
+            if linux_pos != NO_MATCH:
+                self.assertEqual(linux_matches[linux_pos], windows_pos)
+
+        self.assertEqual(
+            sum(1 for pos in linux_matches if pos != NO_MATCH),
+            sum(1 for pos in windows_matches if pos != NO_MATCH))
+
+    def test_no_second_full_string_pass(self):
+        """Only the buckets that became unique are visited again."""
+        first, second = self.search.instrumentation.iterations[:2]
+        self.assertLess(
+            second['counters']['string_buckets'],
+            first['counters']['string_buckets'] // 4)
+
+    def test_provenance(self):
+        """Every result has a provenance."""
+        for ea, symbol in self.result:
+            self.assertIn(ea, self.search.provenance)
+
+    def test_sharded_equals_serial(self):
+        """Several processes give the same result as a single one."""
+        search, result = discover(
+            *open_databases(self.file_path), processes=2)
+        self.assertEqual(result, self.result)
+        self.assertEqual(search.provenance, self.search.provenance)
+
+    def test_sharding_requires_own_index(self):
+        """Sharding can't be combined with a shared Linux index."""
+        self.assertRaises(
+            ValueError, Search, self.search.linux_db, self.search.windows_db,
+            processes=2, linux_reference=object())
+
+    def test_lazy_index(self):
+        """Building the index only creates the Windows functions of shared
+        string sets."""
+        linux_db, windows_db = open_databases(self.file_path)
+        search = quietly(Search, linux_db, windows_db)
+        self.assertFalse(linux_db.functions._loaded)
+        self.assertEqual(
+            set(windows_db.functions._loaded.itervalues()),
+            set(search._windows_string_keys) |
+            set(windows_db.iter_renamed_functions()))
+
+    def test_independent_of_load_order(self):
+        """Databases in memory give the same result as mapped ones."""
+        linux_db, windows_db, truth = create_pair(3000)
+        search, result = discover(linux_db, windows_db)
+        self.assertEqual(result, self.result)
+        self.assertEqual(search.provenance, self.search.provenance)
+
+    def test_known_functions_keep_provenance(self):
+        """Known functions keep the provenance of their previous match."""
+        previous_path = os.path.join(self.directory, 'previous.db')
+        quietly(create_discover_database, self.file_path, previous_path)
+        known = dict(
+            (record[0], record) for record in read_records(previous_path))
+        discovered_path = os.path.join(self.directory, 'known.db')
+        quietly(
+            create_discover_database, self.file_path, discovered_path,
+            known_functions=known.values())
+        for ea, symbol, provenance in read_records(discovered_path):
+            if ea in known:
+                self.assertEqual((ea, symbol, provenance), known[ea])
+
+
+if __name__ == '__main__':
+    unittest.main()
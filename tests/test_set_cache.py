@@ -0,0 +1,77 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import unittest
+
+# discover_win
+from database import Database
+from set_cache import SetCache
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class SetCacheTest(unittest.TestCase):
+    """Bookkeeping of the bounded set cache."""
+
+    def test_get_and_put(self):
+        cache = SetCache()
+        self.assertIsNone(cache.get('strings', 'f'))
+        self.assertEqual(cache.put('strings', 'f', 'ab'), frozenset('ab'))
+        self.assertEqual(cache.get('strings', 'f'), frozenset('ab'))
+        self.assertEqual(cache.items, 3)
+        stats = cache.stats()['strings']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_replace(self):
+        """Replacing a set doesn't count the old set anymore."""
+        cache = SetCache()
+        cache.put('strings', 'f', 'abc')
+        cache.put('strings', 'f', 'a')
+        self.assertEqual(cache.items, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_eviction(self):
+        """The least recently used sets are evicted down to the target."""
+        cache = SetCache(20)
+        for name in 'abcd':
+            cache.put('xrefs_to', name, range(4))
+
+        self.assertEqual(cache.items, 20)
+        cache.get('xrefs_to', 'a')
+        cache.put('xrefs_to', 'e', range(4))
+        self.assertEqual(cache.items, 15)
+        for name, cached in zip('abcde', (True, False, False, True, True)):
+            self.assertEqual(
+                cache.get('xrefs_to', name) is not None, cached)
+
+        self.assertEqual(cache.stats()['xrefs_to']['evictions'], 2)
+
+    def test_max_items(self):
+        """The cache never holds more items than its limit."""
+        cache = SetCache(100)
+        for index in xrange(1000):
+            cache.put('strings', index, range(index % 7))
+            self.assertLessEqual(cache.items, cache.max_items)
+
+        self.assertEqual(
+            cache.items,
+            sum(len(cache.get('strings', index)) + 1
+                for index in xrange(1000)
+                if cache.get('strings', index) is not None))
+
+    def test_invalidate(self):
+        """Changing a function invalidates its cached sets."""
+        database = Database.from_data(
+            {1: 'a', 2: 'b'}, ((16, 'f', None, (1,)),))
+        function = database.get_function(16)
+        self.assertEqual(function.strings, frozenset(['a']))
+        function.add_string(2)
+        self.assertEqual(function.strings, frozenset(['a', 'b']))
+        self.assertEqual(
+            database.set_cache.stats()['strings']['invalidations'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
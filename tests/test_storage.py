@@ -0,0 +1,121 @@
+# =============================================================================
+# >> IMPORTS
+# =============================================================================
+# Python
+import os
+import shutil
+import tempfile
+import unittest
+
+# discover_win
+import storage
+from database import load_databases
+from database import open_databases
+from tests.common import create_pair
+from tests.common import save_pair
+
+
+# =============================================================================
+# >> CLASSES
+# =============================================================================
+class StorageTest(unittest.TestCase):
+    """Round trips of database files of all supported versions."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        linux_db, windows_db, truth = create_pair(300, fingerprints=True)
+
+        # Renamed flags are part of the file
+        for ea in sorted(truth)[::10]:
+            windows_db.get_function(ea).rename(
+                linux_db.get_function_by_symbol(truth[ea]))
+
+        cls.databases = (linux_db, windows_db)
+        cls.file_path = save_pair(cls.directory, linux_db, windows_db)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_version_1(self):
+        self._check_version(1)
+
+    def test_version_2(self):
+        self._check_version(2)
+
+    def test_version_3(self):
+        self._check_version(3)
+
+    def test_unsupported_version(self):
+        file_path = self._write_version(storage.VERSION + 1)
+        self.assertRaises(ValueError, load_databases, file_path)
+
+    def _check_version(self, version):
+        """Load and open a file of the given version and compare it with
+        the saved databases."""
+        file_path = self._write_version(version)
+        for load in (load_databases, open_databases):
+            databases = load(file_path)
+            self.assertEqual(len(databases), len(self.databases))
+            for expected, database in zip(self.databases, databases):
+                self.assertEqual(dict(database.strings), expected.strings)
+                self.assertEqual(
+                    _describe(database), _describe(expected, version))
+
+    def _write_version(self, version):
+        """Convert the saved file to the given version and return its
+        path."""
+        with open(self.file_path, 'rb') as f:
+            buffer = f.read()
+
+        layouts = storage.read_databases(buffer)
+        missing = set()
+        for added_version, names in storage._ADDED_SECTIONS.iteritems():
+            if version < added_version:
+                missing.update(names)
+
+        file_path = os.path.join(
+            self.directory, 'version_{0}.db'.format(version))
+        with open(file_path, 'wb') as f:
+            f.write(storage._FILE_HEADER.pack(
+                storage.MAGIC, version, len(layouts)))
+            for layout in layouts:
+                f.write(storage._DATABASE_HEADER.pack(
+                    layout.function_count, layout.string_count,
+                    layout.text_count))
+                for name in storage.SECTIONS:
+                    if name not in missing:
+                        offset, size = layout.sections[name]
+                        storage.write_section(
+                            f, buffer[offset:offset + size])
+
+        return file_path
+
+
+# =============================================================================
+# >> FUNCTIONS
+# =============================================================================
+def _describe(database, version=storage.VERSION):
+    """Return the stored data of every function of a database as it is
+    expected in a file of the given version.
+
+    :rtype: dict
+    """
+    result = {}
+    for function in database.functions.itervalues():
+        result[function.ea] = (
+            function.symbol,
+            function.demangled_name or None,
+            tuple(function.string_eas),
+            tuple(function.xref_to_eas),
+            tuple(function.xref_from_eas),
+            function.renamed,
+            function.fingerprint if version >= 2 else None,
+            function.checksum if version >= 3 else None)
+
+    return result
+
+
+if __name__ == '__main__':
+    unittest.main()